@@ -1,15 +1,87 @@
 from django.contrib import admin
 
-from .models import Room, Booking
+from .models import Room, Booking, Job, JobRun, SlowQuery
+from .purge import retire_room
 
 
 @admin.register(Room)
 class RoomAdmin(admin.ModelAdmin):
-    list_display = ("name", "floor", "capacity")
+    list_display = ("name", "floor", "capacity", "is_active")
+    list_filter = ("is_active",)
     search_fields = ("name",)
 
+    def delete_model(self, request, obj):
+        retire_room(obj)
+
+    def delete_queryset(self, request, queryset):
+        for room in queryset:
+            retire_room(room)
+
 
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
     list_display = ("room", "date", "start_time", "end_time", "user")
     list_filter = ("date", "room")
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = (
+        "fingerprint",
+        "view",
+        "alias",
+        "calls",
+        "avg_ms",
+        "max_ms",
+        "total_ms",
+        "last_seen",
+    )
+    list_filter = ("alias", "view")
+    search_fields = ("sql", "view")
+    readonly_fields = [field.name for field in SlowQuery._meta.fields]
+
+    @admin.display(description="avg ms")
+    def avg_ms(self, obj):
+        return round(obj.avg_ms, 1)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class JobRunInline(admin.TabularInline):
+    model = JobRun
+    fields = (
+        "attempt",
+        "worker",
+        "started_at",
+        "finished_at",
+        "duration",
+        "outcome",
+        "error",
+    )
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        "name",
+        "status",
+        "attempts",
+        "created_at",
+        "started_at",
+        "finished_at",
+        "duration",
+        "worker",
+    )
+    list_filter = ("status", "name")
+    readonly_fields = ("started_at", "finished_at", "worker", "last_error")
+    inlines = [JobRunInline]
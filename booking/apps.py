@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class BookingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "booking"
+
+    def ready(self):
+        # регистрирует задачи фоновой очереди (booking.jobs), сигналы
+        # копирования комнат в БД площадок (booking.sharding), удаления
+        # броней пользователя (booking.purge) и журнала медленных запросов,
+        # проверок booking.E001 (booking.sharding) и booking.W001 (booking.passwords)
+        from . import (  # noqa: F401
+            cron,
+            passwords,
+            purge,
+            sharding,
+            slow_queries,
+            usage,
+        )
@@ -0,0 +1,116 @@
+"""
+Автоматический подбор комнаты (/api/bookings/auto/).
+
+Пользователю важны вместимость и этаж, а не конкретная комната. Из свободных
+подходящих комнат (тот же поиск, что /api/rooms/free/batch/, без чужих
+удержаний booking.holds) выбирается наименьшая достаточная (best fit), при
+равной вместимости — та, где бронь меньше дробит свободное время дня:
+сначала меньше новых свободных отрезков, затем более тесный отрезок.
+
+Бронь создаётся обычной записью booking.services; если кандидата заняли
+между поиском и записью, сервер сам пробует следующего — до
+BOOKING_AUTO_ASSIGN_ATTEMPTS записей за запрос.
+"""
+
+from collections import defaultdict
+
+from django.conf import settings
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+
+from .availability import free_rooms_batch
+from .compact_time import end_minute, start_minute
+from .holds import SlotHeld, ensure_not_held, held_rooms
+from .models import Booking
+from .services import ROOM_CONFLICT_MESSAGE, BookingLockTimeout, create_booking
+from .sharding import db_for_room
+
+DAY_MINUTES = 24 * 60
+
+
+class NoRoomAvailable(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "No free room matches the requested slot."
+    default_code = "no_room_available"
+
+
+def _busy_by_room(rooms, date):
+    """Занятые интервалы дня в минутах: {room_id: [(начало, конец), ...]}."""
+    by_db = defaultdict(list)
+    for room in rooms:
+        by_db[db_for_room(room.id)].append(room.id)
+    busy = defaultdict(list)
+    for alias, room_ids in by_db.items():
+        rows = (
+            Booking.objects.using(alias)
+            .filter(room_id__in=room_ids, date=date)
+            .values_list("room_id", "start_time", "end_time")
+        )
+        for room_id, start, end in rows:
+            busy[room_id].append((start_minute(start), end_minute(end)))
+    return busy
+
+
+def fragmentation(busy, start, end):
+    """
+    (новых свободных отрезков, длина отрезка) при брони [start, end) в
+    минутах: бронь вплотную к краю отрезка его не дробит, меньший отрезок —
+    более тесное попадание.
+    """
+    gap_start, gap_end = 0, DAY_MINUTES
+    for busy_start, busy_end in busy:
+        if busy_end <= start:
+            gap_start = max(gap_start, busy_end)
+        elif busy_start >= end:
+            gap_end = min(gap_end, busy_start)
+    pieces = (start > gap_start) + (end < gap_end)
+    return pieces - 1, gap_end - gap_start
+
+
+def rank_rooms(rooms, date, start_time, end_time):
+    """Кандидаты по порядку: вместимость, дробление, этаж и имя."""
+    start, end = start_minute(start_time), end_minute(end_time)
+    busy = _busy_by_room(rooms, date)
+    return sorted(
+        rooms,
+        key=lambda room: (
+            room.capacity,
+            *fragmentation(busy[room.id], start, end),
+            room.floor,
+            room.name,
+        ),
+    )
+
+
+def _room_taken(exc):
+    # комнату заняли или выключили после поиска; пересечение по пользователю
+    # другая комната не исправит
+    detail = exc.detail if isinstance(exc.detail, dict) else {}
+    return "room" in detail or ROOM_CONFLICT_MESSAGE in detail.get(
+        api_settings.NON_FIELD_ERRORS_KEY, []
+    )
+
+
+def assign_room(user, date, start_time, end_time, floor=None, capacity=None):
+    """Бронирует наиболее подходящую свободную комнату; NoRoomAvailable — нет такой."""
+    slot = {
+        "date": date,
+        "start_time": start_time,
+        "end_time": end_time,
+        "floor": floor,
+        "capacity": capacity,
+    }
+    held = held_rooms(date, start_time, end_time, user)
+    rooms = [room for room in free_rooms_batch([slot])[0] if room.id not in held]
+    ranked = rank_rooms(rooms, date, start_time, end_time)
+    for room in ranked[: settings.BOOKING_AUTO_ASSIGN_ATTEMPTS]:
+        try:
+            ensure_not_held(room.id, date, start_time, end_time, user)
+            return create_booking(user, room.id, date, start_time, end_time)
+        except (SlotHeld, BookingLockTimeout):
+            continue
+        except serializers.ValidationError as exc:
+            if not _room_taken(exc):
+                raise
+    raise NoRoomAvailable()
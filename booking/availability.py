@@ -0,0 +1,109 @@
+"""
+Пакетный поиск свободных комнат (/api/rooms/free/batch/): десятки слотов
+(date, start_time, end_time, floor, capacity) одним SQL-запросом вместо
+запроса free_rooms на каждый слот.
+
+При шардировании (booking.sharding) запрос выполняется в каждой БД с бронями
+по комнатам её площадок, результаты сливаются.
+"""
+
+from django.conf import settings
+
+from .compact_time import end_minute, minutes_sql, start_minute
+from .failover import read_db
+from .models import Booking, Room
+from .sharding import booking_databases, fan_out, is_sharded
+
+# Слоты передаются списком VALUES; для каждого слота подходящие комнаты
+# без пересекающихся броней (тот же предикат, что в free_rooms).
+FREE_ROOMS_BATCH_SQL = """
+    WITH slot (
+        idx, date, start_time, end_time, start_minute, end_minute, floor, capacity
+    ) AS (
+        VALUES {values}
+    )
+    SELECT slot.idx, r.id, r.name, r.capacity, r.floor, r.site, r.is_active
+    FROM slot
+    JOIN {room_table} r
+      ON (slot.floor IS NULL OR r.floor = slot.floor)
+     AND (slot.capacity IS NULL OR r.capacity >= slot.capacity)
+     AND r.is_active
+     {site_filter}
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM {booking_table} b
+        WHERE b.room_id = r.id
+          AND b.date = slot.date
+          AND b.start_time < slot.end_time
+          AND b.end_time > slot.start_time
+          {minutes}
+    )
+    ORDER BY slot.idx, r.floor, r.name
+"""
+SLOT_VALUES = (
+    "(%s::int, %s::date, %s::time, %s::time, %s::smallint, %s::smallint, "
+    "%s::int, %s::int)"
+)
+
+
+def _site_filter(alias):
+    """Комнаты, брони которых хранятся в alias."""
+    if not is_sharded():
+        return "", []
+    shard_sites = {
+        db: [
+            site
+            for site, site_db in settings.BOOKING_SITE_DATABASES.items()
+            if site_db == db
+        ]
+        for db in booking_databases()[1:]
+    }
+    if alias in shard_sites:
+        return "AND r.site = ANY(%s)", [shard_sites[alias]]
+    return "AND NOT r.site = ANY(%s)", [list(settings.BOOKING_SITE_DATABASES)]
+
+
+def _free_rooms_batch(alias, slots):
+    site_filter, site_params = _site_filter(alias)
+    sql = FREE_ROOMS_BATCH_SQL.format(
+        values=", ".join([SLOT_VALUES] * len(slots)),
+        room_table=Room._meta.db_table,
+        booking_table=Booking._meta.db_table,
+        site_filter=site_filter,
+        minutes=minutes_sql("slot.start_minute", "slot.end_minute", prefix="b."),
+    )
+    params = []
+    for idx, slot in enumerate(slots):
+        params += [
+            idx,
+            slot["date"],
+            slot["start_time"],
+            slot["end_time"],
+            start_minute(slot["start_time"]),
+            end_minute(slot["end_time"]),
+            slot.get("floor"),
+            slot.get("capacity"),
+        ]
+    results = [[] for _ in slots]
+    # как и free_rooms, основную БД читаем из мастера, пока он доступен
+    db = read_db() if alias == "default" else alias
+    for room in Room.objects.using(db).raw(sql, params + site_params):
+        results[room.idx].append(room)
+    return results
+
+
+def free_rooms_batch(slots):
+    """
+    slots — список словарей date/start_time/end_time[/floor/capacity].
+    Возвращает списки свободных Room в порядке слотов.
+    """
+    per_db = fan_out(lambda alias: _free_rooms_batch(alias, slots), booking_databases())
+    if len(per_db) == 1:
+        return per_db[0]
+    return [
+        sorted(
+            (room for rooms in found for room in rooms),
+            key=lambda room: (room.floor, room.name),
+        )
+        for found in zip(*per_db)
+    ]
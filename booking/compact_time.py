@@ -0,0 +1,54 @@
+"""
+Компактное время броней: минуты от начала суток (smallint).
+
+Booking.start_minute/end_minute заполняет триггер booking_booking_minutes
+(миграция 0012) из start_time/end_time; секунды округляются наружу (начало
+вниз, конец вверх), поэтому пересечение по минутам — надмножество
+пересечения по времени. API и сериализаторы по-прежнему работают с
+start_time/end_time.
+
+При BOOKING_COMPACT_TIME проверки пересечений добавляют условие по минутам:
+индексы горячих партиций строятся по (…, date, start_minute, end_minute) —
+вдвое уже индексов по time, — а точное условие по времени перепроверяет
+найденные строки.
+"""
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Q
+
+
+def _as_time(value):
+    # free_rooms передаёт время строкой из query params
+    return models.TimeField().to_python(value)
+
+
+def start_minute(value):
+    value = _as_time(value)
+    return value.hour * 60 + value.minute
+
+
+def end_minute(value):
+    value = _as_time(value)
+    return value.hour * 60 + value.minute + bool(value.second or value.microsecond)
+
+
+def overlap_q(start_time, end_time):
+    """Брони, пересекающиеся с [start_time, end_time)."""
+    q = Q(start_time__lt=end_time, end_time__gt=start_time)
+    if settings.BOOKING_COMPACT_TIME:
+        q &= Q(
+            start_minute__lt=end_minute(end_time),
+            end_minute__gt=start_minute(start_time),
+        )
+    return q
+
+
+def minutes_sql(start, end, prefix=""):
+    """
+    Условие по минутам для сырого SQL (пустое без BOOKING_COMPACT_TIME);
+    start и end — выражения минут интервала.
+    """
+    if not settings.BOOKING_COMPACT_TIME:
+        return ""
+    return f"AND {prefix}start_minute < {end} AND {prefix}end_minute > {start}"
@@ -1,22 +1,168 @@
 # booking/cron.py
 
+import datetime
+
+from django.conf import settings
 from django.core.management import call_command
-from django.db import connection
+from django.db import connection, connections, transaction
+from django.utils import timezone
 
+from .jobs import advisory_key, enqueue, job
+from .models import (
+    BookingEvent,
+    BookingTombstone,
+    IdempotencyKey,
+    Job,
+    SlotHold,
+    SlowQuery,
+)
+from .partitioning.indexes import (
+    HOT,
+    apply_index_profiles,
+    booking_partitions,
+    cluster_suffix,
+    index_name,
+)
+from .sharding import booking_databases
 
-def run_partition_manager():
+
+@job("partition_manager", exclusive=True)
+def partition_manager():
     """
-    Запускает команду pgpartition (psqlextra) для создания/поддержки партиций.
+    Запускает команду pgpartition (psqlextra) для создания/поддержки партиций
+    во всех БД с бронями (booking.sharding) и переводит индексы закрывшихся
+    партиций на профиль closed (booking.partitioning.indexes).
     """
-    call_command("pgpartition", verbosity=0)
+    for alias in booking_databases():
+        call_command("pgpartition", using=alias, yes=True, verbosity=0)
+        apply_index_profiles(using=alias)
 
 
-def db_maintenance():
+@job("db_maintenance", exclusive=True)
+def maintain_db():
+    """
+    Выполняет VACUUM ANALYZE и CLUSTER горячих партиций по их индексу
+    date_start_end_room (date_minutes_room при BOOKING_COMPACT_TIME) для
+    ускорения выборок.
+    """
+    for alias in booking_databases():
+        conn = connections[alias]
+        with conn.cursor() as cursor:
+            # VACUUM ANALYZE всей таблицы
+            cursor.execute("VACUUM ANALYZE booking_booking;")
+            # CLUSTER по индексу для улучшения физической упорядоченности;
+            # закрытые партиции уже упорядочены и несут только BRIN
+            for partition, _, profile in booking_partitions(using=alias):
+                if profile == HOT:
+                    cursor.execute(
+                        "CLUSTER {} USING {}".format(
+                            conn.ops.quote_name(partition),
+                            conn.ops.quote_name(
+                                index_name(partition, cluster_suffix())
+                            ),
+                        )
+                    )
+
+
+@job("events.prune", exclusive=True)
+def prune_events():
+    """Удаляет события журнала старше BOOKING_EVENTS_RETENTION_DAYS."""
+    cutoff = timezone.now() - datetime.timedelta(
+        days=settings.BOOKING_EVENTS_RETENTION_DAYS
+    )
+    BookingEvent.objects.filter(created_at__lt=cutoff).delete()
+
+
+@job("sync.prune_tombstones", exclusive=True)
+def prune_tombstones():
+    """
+    Удаляет tombstone старше BOOKING_SYNC_RETENTION_DAYS: токены синхронизации
+    такого возраста уже отвергаются (booking.sync).
+    """
+    cutoff = timezone.now() - datetime.timedelta(
+        days=settings.BOOKING_SYNC_RETENTION_DAYS
+    )
+    BookingTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+
+
+@job("slow_queries.prune", exclusive=True)
+def prune_slow_queries():
+    """Удаляет медленные запросы, не повторявшиеся SLOW_QUERY_RETENTION_DAYS."""
+    cutoff = timezone.now() - datetime.timedelta(
+        days=settings.SLOW_QUERY_RETENTION_DAYS
+    )
+    SlowQuery.objects.filter(last_seen__lt=cutoff).delete()
+
+
+@job("idempotency.prune", exclusive=True)
+def prune_idempotency_keys():
+    """Удаляет ключи идемпотентности старше BOOKING_IDEMPOTENCY_TTL_SECONDS."""
+    cutoff = timezone.now() - datetime.timedelta(
+        seconds=settings.BOOKING_IDEMPOTENCY_TTL_SECONDS
+    )
+    IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+
+
+@job("holds.prune", exclusive=True)
+def prune_expired_holds():
+    """Удаляет истёкшие удержания слотов (booking.holds)."""
+    SlotHold.objects.filter(expires_at__lte=timezone.now()).delete()
+
+
+# Точки входа django_crontab: только ставят задачу в очередь, выполняет её
+# воркер (manage.py run_jobs) с повторами и историей запусков в JobRun.
+# cron запущен в каждом контейнере web, поэтому задача ставится один раз на
+# кластер (schedule), а выполняется эксклюзивно (job(..., exclusive=True)).
+
+
+def schedule(name):
     """
-    Выполняет VACUUM ANALYZE и CLUSTER по индексу idx_date_start_end_room для ускорения выборок.
+    Ставит задачу cron в очередь, если за последние
+    CRON_SINGLE_RUN_WINDOW_SECONDS её ещё не ставил другой контейнер.
+    Проверка и INSERT идут под advisory-блокировкой транзакции, поэтому
+    одновременные вызовы из разных контейнеров не создают дублей.
+    Возвращает Job или None.
     """
-    with connection.cursor() as cursor:
-        # VACUUM ANALYZE всей таблицы
-        cursor.execute("VACUUM ANALYZE booking_booking;")
-        # CLUSTER по индексу для улучшения физической упорядоченности
-        cursor.execute("CLUSTER booking_booking USING idx_date_start_end_room;")
+    since = timezone.now() - datetime.timedelta(
+        seconds=settings.CRON_SINGLE_RUN_WINDOW_SECONDS
+    )
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(%s)", [advisory_key(f"cron:{name}")]
+            )
+        if Job.objects.filter(name=name, created_at__gte=since).exists():
+            return None
+        return enqueue(name)
+
+
+def run_partition_manager():
+    schedule("partition_manager")
+
+
+def db_maintenance():
+    schedule("db_maintenance")
+
+
+def refresh_closed_usage():
+    schedule("usage.refresh_closed_month")
+
+
+def prune_booking_events():
+    schedule("events.prune")
+
+
+def prune_booking_tombstones():
+    schedule("sync.prune_tombstones")
+
+
+def prune_slow_queries_log():
+    schedule("slow_queries.prune")
+
+
+def prune_idempotency_store():
+    schedule("idempotency.prune")
+
+
+def prune_slot_holds():
+    schedule("holds.prune")
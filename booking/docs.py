@@ -0,0 +1,86 @@
+"""
+Описание API для drf_yasg без его импорта там, где документация не нужна.
+
+Декораторам views.py нужны только drf_yasg.openapi и drf_yasg.utils — они
+лёгкие (зависимости — DRF, который уже загружен). Тяжёлая часть drf_yasg
+(генератор, инспекторы, рендереры с jsonschema и swagger_spec_validator)
+импортируется при первом открытии документации (project.urls.docs_view).
+При API_DOCS_ENABLED=False представления получают заглушки:
+swagger_auto_schema ничего не делает, а конструкторы openapi.* возвращают
+None, поэтому декораторы в views.py остаются без изменений.
+"""
+
+from django.conf import settings
+
+
+class _OpenAPIStub:
+    def __getattr__(self, name):
+        return self
+
+    def __call__(self, *args, **kwargs):
+        return None
+
+
+if settings.API_DOCS_ENABLED:
+    from drf_yasg import openapi
+    from drf_yasg.utils import swagger_auto_schema
+else:
+    openapi = _OpenAPIStub()
+
+    def swagger_auto_schema(**kwargs):
+        return lambda view: view
+
+
+API_VERSION = "v1"
+SCHEMA_ARTIFACT = "openapi/booking-api-{version}.{format}"
+
+
+def api_info():
+    return openapi.Info(
+        title="Booking API",
+        default_version=API_VERSION,
+        description="API для бронирования переговорных комнат",
+        contact=openapi.Contact(email="support@example.com"),
+    )
+
+
+def schema_artifact(format="json"):
+    """Имя собранной схемы в статике (manage.py export_openapi + collectstatic)."""
+    return SCHEMA_ARTIFACT.format(version=API_VERSION, format=format)
+
+
+def schema_artifact_url():
+    """URL собранной схемы или None, если она ещё не попала в статику."""
+    from django.contrib.staticfiles.storage import staticfiles_storage
+
+    name = schema_artifact()
+    if not staticfiles_storage.exists(name):
+        return None
+    try:
+        # ManifestStaticFilesStorage отдаёт имя с хэшем содержимого
+        return staticfiles_storage.url(name)
+    except ValueError:
+        return None
+
+
+def static_ui_page(renderer, spec_url):
+    """
+    (шаблон, контекст) страницы Swagger UI или ReDoc из drf_yasg, которая
+    загружает схему по spec_url: страница рендерится без SchemaView, то есть
+    без генерации схемы.
+    """
+    from drf_yasg.renderers import ReDocRenderer, SwaggerUIRenderer
+
+    class StaticSwaggerUIRenderer(SwaggerUIRenderer):
+        def get_swagger_ui_settings(self):
+            return {**super().get_swagger_ui_settings(), "url": spec_url}
+
+    class StaticReDocRenderer(ReDocRenderer):
+        def get_redoc_settings(self):
+            return {**super().get_redoc_settings(), "url": spec_url}
+
+    ui = {"swagger": StaticSwaggerUIRenderer, "redoc": StaticReDocRenderer}[renderer]()
+    context = {}
+    ui.set_context(context)
+    context["title"] = api_info().title
+    return ui.template, context
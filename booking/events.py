@@ -0,0 +1,227 @@
+"""
+Лента изменений броней (BookingEvent) для дисплеев комнат и интеграций:
+вместо периодического опроса /api/bookings/ клиент забирает только дельты.
+
+- GET /api/bookings/events/?since=<позиция>[&room=<id>][&timeout=<сек>] —
+  long-poll: ответ сразу, если есть события после since, иначе ожидание до
+  timeout; позиция продолжения — next_since.
+- GET /api/bookings/events/stream/ — Server-Sent Events (позиция события =
+  id SSE, продолжение по заголовку Last-Event-ID).
+
+События пишутся в БД брони (booking.sharding), лента читает все БД броней.
+Позиция — "<txid>-<id>" для default и "<alias>:<txid>-<id>" для каждой БД
+площадки через запятую: в каждой БД события идут в порядке (txid, id) и
+отдаются только транзакции ниже pg_snapshot_xmin (booking.sync.committed),
+поэтому событие, закоммиченное позже, не окажется позади уже отданной
+позиции. Числовой since (id события default) принимается как позиция этого
+события.
+
+Оба представления асинхронные: сервер приложения — uvicorn
+(project/asgi.py, entrypoint.sh), ожидание не занимает воркер.
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import router
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .models import BookingEvent
+from .sharding import booking_databases
+from .sync import committed, horizon
+
+KEEPALIVE_SECONDS = 15
+
+
+def _authenticate(request):
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+def _int_param(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _serialize(event):
+    return {
+        "id": event.id,
+        "action": event.action,
+        "booking": event.booking_id,
+        "user": event.user_id,
+        "room": event.room_id,
+        "date": event.date.isoformat(),
+        "start_time": event.start_time.strftime("%H:%M:%S"),
+        "end_time": event.end_time.strftime("%H:%M:%S"),
+        "created_at": event.created_at.isoformat(),
+    }
+
+
+def _position(event):
+    return event.txid, event.id
+
+
+def _cursor(positions):
+    parts = []
+    for alias, (txid, event_id) in positions.items():
+        prefix = "" if alias == "default" else f"{alias}:"
+        parts.append(f"{prefix}{txid}-{event_id}")
+    return ",".join(parts)
+
+
+def _databases():
+    """{БД броней: alias для чтения}; default — через роутер (реплика при сбое)."""
+    read = router.db_for_read(BookingEvent)
+    return {
+        alias: read if alias == "default" else alias for alias in booking_databases()
+    }
+
+
+def _parse(since, db):
+    """Позиции из since или None, если since нет или событие не найдено."""
+    if not since:
+        return None
+    if since.isdigit():
+        # since=<id события> — позиция этого события
+        event_id = int(since)
+        if not event_id:
+            return {}
+        position = (
+            BookingEvent.objects.using(db)
+            .filter(pk=event_id)
+            .values_list("txid", "id")
+            .first()
+        )
+        return {"default": position} if position else None
+    positions = {}
+    for part in since.split(","):
+        alias, _, position = part.rpartition(":")
+        txid, _, event_id = position.partition("-")
+        positions[alias or "default"] = int(txid), int(event_id)
+    return positions
+
+
+def _start(since):
+    """Позиции {БД: (txid, id)}, после которых клиент читает ленту."""
+    databases = _databases()
+    try:
+        positions = _parse(since, databases["default"])
+    except ValueError:
+        positions = None
+    if positions is None:
+        # с текущего конца журнала: транзакции ниже границы завершены
+        return {alias: (horizon(db)[0], 0) for alias, db in databases.items()}
+    # БД, которой нет в позиции (новая площадка), читается с начала
+    return {alias: positions.get(alias, (0, 0)) for alias in databases}
+
+
+def _fetch(user, positions, room):
+    """События после positions из всех БД: [(БД, событие), ...]."""
+    limit = settings.BOOKING_EVENTS_PAGE_SIZE
+    chunks = []
+    # запросы по индексу повторяются каждые BOOKING_EVENTS_POLL_SECONDS, поэтому
+    # БД опрашиваются по очереди на постоянных соединениях, а не через fan_out
+    for alias, db in _databases().items():
+        txid, event_id = positions[alias]
+        after = Q(txid__gt=txid) | Q(txid=txid, id__gt=event_id)
+        events = BookingEvent.objects.using(db).filter(after & committed(db))
+        if not user.is_staff:
+            events = events.filter(user_id=user.id)
+        if room is not None:
+            events = events.filter(room_id=room)
+        events = events.order_by("txid", "id")[:limit]
+        chunks.append([(alias, event) for event in events])
+    # из каждой БД — префикс её порядка, как в booking.sync
+    merged = heapq.merge(*chunks, key=lambda item: _position(item[1]))
+    return list(itertools.islice(merged, limit))
+
+
+async def _prepare(request, since):
+    """Возвращает (user, позиции, room) или None, если клиент не аутентифицирован."""
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return None
+    positions = await sync_to_async(_start)(since)
+    return user, positions, _int_param(request.GET.get("room"), None)
+
+
+def _unauthorized():
+    return JsonResponse(
+        {"detail": "Authentication credentials were not provided."}, status=401
+    )
+
+
+async def booking_events(request):
+    prepared = await _prepare(request, request.GET.get("since"))
+    if prepared is None:
+        return _unauthorized()
+    user, positions, room = prepared
+    timeout = min(
+        _int_param(
+            request.GET.get("timeout"), settings.BOOKING_EVENTS_LONGPOLL_SECONDS
+        ),
+        settings.BOOKING_EVENTS_LONGPOLL_SECONDS,
+    )
+    deadline = time.monotonic() + timeout
+    while True:
+        events = await sync_to_async(_fetch)(user, positions, room)
+        if events or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(settings.BOOKING_EVENTS_POLL_SECONDS)
+    for alias, event in events:
+        positions[alias] = _position(event)
+    return JsonResponse(
+        {
+            "results": [_serialize(event) for _, event in events],
+            "next_since": _cursor(positions),
+        }
+    )
+
+
+async def booking_events_stream(request):
+    since = request.headers.get("Last-Event-ID", request.GET.get("since"))
+    prepared = await _prepare(request, since)
+    if prepared is None:
+        return _unauthorized()
+    user, positions, room = prepared
+
+    async def stream():
+        # соединение закрывается по истечении BOOKING_EVENTS_STREAM_SECONDS,
+        # EventSource переподключается сам с Last-Event-ID
+        deadline = time.monotonic() + settings.BOOKING_EVENTS_STREAM_SECONDS
+        last_sent = time.monotonic()
+        yield "retry: 1000\n\n"
+        while time.monotonic() < deadline:
+            events = await sync_to_async(_fetch)(user, positions, room)
+            for alias, event in events:
+                positions[alias] = _position(event)
+                last_sent = time.monotonic()
+                yield (
+                    f"id: {_cursor(positions)}\nevent: {event.action}\n"
+                    f"data: {json.dumps(_serialize(event))}\n\n"
+                )
+            if events:
+                continue
+            if time.monotonic() - last_sent >= KEEPALIVE_SECONDS:
+                # комментарий SSE не даёт прокси закрыть «молчащее» соединение
+                last_sent = time.monotonic()
+                yield ": keepalive\n\n"
+            await asyncio.sleep(settings.BOOKING_EVENTS_POLL_SECONDS)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,111 @@
+"""
+Работа при недоступном мастере (alias default).
+
+Соединения проверяются перед повторным использованием (CONN_HEALTH_CHECKS),
+а connect_timeout и TCP keepalive (DB_CONNECT_TIMEOUT) обнаруживают упавший
+сервер за секунды, а не за минуты TCP-таймаутов.
+
+Когда запрос падает на соединении с мастером, процесс считает мастер
+недоступным DB_PRIMARY_RETRY_SECONDS секунд:
+
+- чтения (в том числе комнат и пользователя для JWT) идут на реплику;
+- запись сразу отвечает 503 с Retry-After, не дожидаясь таймаута.
+
+По истечении интервала следующий запрос снова идёт на мастер.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, InterfaceError, OperationalError, connections
+from rest_framework import permissions, status
+from rest_framework.exceptions import APIException
+from rest_framework.views import exception_handler as drf_exception_handler
+
+from .passwords import PasswordHashingBusy, PasswordHashingUnavailable
+
+logger = logging.getLogger(__name__)
+
+_primary_down_until = 0.0
+
+
+class PrimaryUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Primary database is unavailable, retry later."
+    default_code = "primary_unavailable"
+
+    def __init__(self):
+        super().__init__()
+        self.wait = settings.DB_PRIMARY_RETRY_SECONDS
+
+
+def primary_available():
+    return time.monotonic() >= _primary_down_until
+
+
+def mark_primary_down():
+    global _primary_down_until
+    _primary_down_until = time.monotonic() + settings.DB_PRIMARY_RETRY_SECONDS
+    logger.warning(
+        "Primary database unavailable, reading from replica for %s s",
+        settings.DB_PRIMARY_RETRY_SECONDS,
+    )
+
+
+def mark_primary_up():
+    global _primary_down_until
+    _primary_down_until = 0.0
+
+
+def read_db():
+    """Alias для чтений, которым нужен мастер: реплика, пока он недоступен."""
+    return "default" if primary_available() else "replica"
+
+
+def ensure_primary():
+    if not primary_available():
+        raise PrimaryUnavailable()
+
+
+def _primary_reachable():
+    connection = connections["default"]
+    if connection.connection is not None and not connection.connection.closed:
+        # ошибка пришла не из соединения с мастером
+        return True
+    connection.close()
+    try:
+        connection.ensure_connection()
+    except DatabaseError:
+        return False
+    return True
+
+
+def exception_handler(exc, context):
+    """
+    EXCEPTION_HANDLER DRF: обрыв соединения с мастером и занятые слоты
+    хэширования паролей (booking.passwords) — 503, а не 500.
+    """
+    if isinstance(exc, (OperationalError, InterfaceError)) and not _primary_reachable():
+        mark_primary_down()
+        exc = PrimaryUnavailable()
+    elif isinstance(exc, PasswordHashingBusy):
+        exc = PasswordHashingUnavailable()
+    return drf_exception_handler(exc, context)
+
+
+class FailFastWritesMixin:
+    """
+    Запись при недоступном мастере сразу получает 503. Действия из
+    read_only_actions (POST, который только читает) не блокируются.
+    """
+
+    read_only_actions = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            request.method not in permissions.SAFE_METHODS
+            and getattr(self, "action", None) not in self.read_only_actions
+        ):
+            ensure_primary()
@@ -0,0 +1,86 @@
+"""
+Короткие удержания слотов (hold) перед бронированием.
+
+Пользователь, выбравший комнату из /api/rooms/free/, сначала удерживает
+(room, date, интервал) на BOOKING_HOLD_SECONDS, затем подтверждает удержание —
+оно превращается в Booking обычным путём записи. Пока удержание действует,
+чужие попытки удержать или забронировать пересекающийся интервал сразу
+получают 409 без запроса к броням, а free_rooms показывает комнату занятой.
+
+Удержания лежат в таблице SlotHold основной БД и видны всем воркерам и
+контейнерам. Проверка и вставка удержания идут под advisory lock на
+(room, date) в основной БД, поэтому два пересекающихся удержания
+одновременно не проходят. Истёкшие удержания не
+учитываются, а удаляет их задача holds.prune (booking.cron).
+"""
+
+import datetime
+import uuid
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import SlotHold
+
+
+class SlotHeld(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "This slot is held by another user, please choose another one."
+    default_code = "slot_held"
+
+
+def _live(date, start_time, end_time, user):
+    """Действующие чужие удержания даты, пересекающие интервал."""
+    return SlotHold.objects.filter(
+        date=date,
+        start_time__lt=end_time,
+        end_time__gt=start_time,
+        expires_at__gt=timezone.now(),
+    ).exclude(user=user)
+
+
+def ensure_not_held(room, date, start_time, end_time, user):
+    """SlotHeld, если интервал комнаты удерживает другой пользователь."""
+    if _live(date, start_time, end_time, user).filter(room_id=room).exists():
+        raise SlotHeld()
+
+
+def held_rooms(date, start_time, end_time, user):
+    """id комнат с чужими удержаниями, пересекающими интервал."""
+    return set(
+        _live(date, start_time, end_time, user).values_list("room_id", flat=True)
+    )
+
+
+def place_hold(room, date, start_time, end_time, user):
+    """Удерживает слот за user; чужое пересекающееся удержание — SlotHeld."""
+    now = timezone.now()
+    with transaction.atomic(using="default"):
+        with connections["default"].cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(%s, %s)", [room, date.toordinal()]
+            )
+        ensure_not_held(room, date, start_time, end_time, user)
+        return SlotHold.objects.create(
+            id=uuid.uuid4().hex,
+            room_id=room,
+            user=user,
+            date=date,
+            start_time=start_time,
+            end_time=end_time,
+            expires_at=now + datetime.timedelta(seconds=settings.BOOKING_HOLD_SECONDS),
+        )
+
+
+def get_hold(hold_id, user):
+    """Действующее удержание user по id или None."""
+    return SlotHold.objects.filter(
+        pk=hold_id, user=user, expires_at__gt=timezone.now()
+    ).first()
+
+
+def release_hold(hold):
+    SlotHold.objects.filter(pk=hold.pk).delete()
@@ -0,0 +1,102 @@
+"""
+Идемпотентное создание брони: заголовок Idempotency-Key.
+
+Мобильные клиенты повторяют POST /api/bookings/ при обрыве связи. Первый
+запрос с ключом занимает строку IdempotencyKey (user, key) и в той же
+транзакции основной БД создаёт бронь и сохраняет ответ. Повтор получает
+сохранённый ответ (заголовок Idempotent-Replayed) без обращения к
+booking_booking; одновременный повтор ждёт на уникальном ключе, пока первый
+не завершится. Неудачный запрос откатывает и строку ключа — его можно
+повторить с тем же ключом.
+
+Ключ действует BOOKING_IDEMPOTENCY_TTL_SECONDS: устаревший занимается
+заново, а задача idempotency.prune (booking.cron) удаляет такие строки.
+"""
+
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import connections, transaction
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field("key").max_length
+
+# занимает ключ; конфликт с действующим ключом ждёт завершения его
+# транзакции и ничего не возвращает, устаревший ключ перезаписывается
+CLAIM_SQL = """
+    INSERT INTO {table} AS t (user_id, key, request_hash, created_at)
+    VALUES (%(user)s, %(key)s, %(request_hash)s, now())
+    ON CONFLICT (user_id, key) DO UPDATE SET
+        request_hash = EXCLUDED.request_hash,
+        status_code = NULL,
+        response = NULL,
+        created_at = EXCLUDED.created_at
+    WHERE t.created_at < now() - make_interval(secs => %(ttl)s)
+    RETURNING id
+"""
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used with a different request."
+    default_code = "idempotency_key_reused"
+
+
+def request_hash(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.path}\n{body}".encode()).hexdigest()
+
+
+class IdempotentCreateMixin:
+    """create() с поддержкой заголовка Idempotency-Key."""
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return super().create(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            raise serializers.ValidationError(
+                {
+                    HEADER: [
+                        f"Ensure this value has at most {MAX_KEY_LENGTH} characters."
+                    ]
+                }
+            )
+        fingerprint = request_hash(request)
+        with transaction.atomic(using="default"):
+            with connections["default"].cursor() as cursor:
+                cursor.execute(
+                    CLAIM_SQL.format(table=IdempotencyKey._meta.db_table),
+                    {
+                        "user": request.user.pk,
+                        "key": key,
+                        "request_hash": fingerprint,
+                        "ttl": settings.BOOKING_IDEMPOTENCY_TTL_SECONDS,
+                    },
+                )
+                claimed = cursor.fetchone()
+            if claimed is None:
+                return self.replay(request, key, fingerprint)
+            response = super().create(request, *args, **kwargs)
+            IdempotencyKey.objects.using("default").filter(pk=claimed[0]).update(
+                status_code=response.status_code, response=response.data
+            )
+        return response
+
+    def replay(self, request, key, fingerprint):
+        # основная БД: ответ мог быть сохранён только что
+        stored = IdempotencyKey.objects.using("default").get(user=request.user, key=key)
+        if stored.request_hash != fingerprint:
+            raise IdempotencyKeyReused()
+        return Response(
+            stored.response,
+            status=stored.status_code,
+            headers={REPLAYED_HEADER: "true"},
+        )
@@ -0,0 +1,213 @@
+"""
+Лёгкая очередь фоновых задач поверх таблицы Job.
+
+Воркеры (manage.py run_jobs) забирают задачи через SELECT ... FOR UPDATE
+SKIP LOCKED, поэтому их можно запускать сколько угодно параллельно.
+Задача выполняется вне транзакции (VACUUM и т.п. допустимы), при ошибке
+повторяется с экспоненциальной задержкой до max_attempts.
+
+Задачи с exclusive=True (обслуживание БД из booking.cron) выполняются не
+больше чем одним воркером на весь кластер: на время выполнения воркер
+держит advisory-блокировку PostgreSQL по имени задачи. Если её держит
+другой воркер (например, задачу перехватили после истечения
+JOB_LEASE_SECONDS, пока первый ещё работает), запуск завершается со
+статусом skipped.
+
+Каждая попытка записывается строкой JobRun (воркер, начало, конец,
+результат, ошибка); строка Job хранит состояние последней попытки. Итог
+попытки записывается в Job, только если задачу не перехватил другой воркер:
+попытка, потерявшая аренду, меняет лишь свою строку JobRun.
+"""
+
+import datetime
+import logging
+import os
+import socket
+import time
+import traceback
+import zlib
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job, JobRun
+from .slow_queries import current_view
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = {}
+EXCLUSIVE = set()
+
+
+def job(name, *, exclusive=False):
+    """
+    Регистрирует функцию как задачу очереди под именем name. exclusive=True —
+    не больше одного одновременного выполнения на кластер.
+    """
+
+    def decorator(func):
+        REGISTRY[name] = func
+        if exclusive:
+            EXCLUSIVE.add(name)
+        return func
+
+    return decorator
+
+
+def advisory_key(name):
+    """Ключ advisory-блокировки PostgreSQL (bigint) для строки name."""
+    return zlib.crc32(f"booking.jobs:{name}".encode())
+
+
+def _try_lock(name):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [advisory_key(name)])
+        return cursor.fetchone()[0]
+
+
+def _unlock(name):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [advisory_key(name)])
+    except DatabaseError:
+        # соединение потеряно — блокировка снята вместе с сессией
+        logger.warning("Advisory lock for %s was not released", name, exc_info=True)
+
+
+def enqueue(name, *, delay=0, max_attempts=None, unique=False, **kwargs):
+    """
+    Ставит задачу в очередь. При unique=True задача не создаётся, если такая же
+    ещё не начата (ограничение uniq_job_pending); тогда у возвращённого
+    объекта pk=None. Оба варианта — один INSERT.
+    """
+    if name not in REGISTRY:
+        raise LookupError(f"Unknown job {name!r}")
+    queued = Job(
+        name=name,
+        kwargs=kwargs,
+        run_after=timezone.now() + datetime.timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+    if unique:
+        Job.objects.bulk_create([queued], ignore_conflicts=True)
+    else:
+        queued.save()
+    return queued
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(worker):
+    """
+    Забирает следующую готовую задачу (или зависшую дольше JOB_LEASE_SECONDS)
+    и помечает её выполняющейся. Возвращает None, если очередь пуста.
+    """
+    now = timezone.now()
+    stale = now - datetime.timedelta(seconds=settings.JOB_LEASE_SECONDS)
+    with transaction.atomic():
+        claimed = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=Job.QUEUED, run_after__lte=now)
+                | Q(status=Job.RUNNING, started_at__lt=stale)
+            )
+            .order_by("run_after", "id")
+            .first()
+        )
+        if claimed is None:
+            return None
+        claimed.status = Job.RUNNING
+        claimed.attempts += 1
+        claimed.started_at = now
+        claimed.finished_at = None
+        claimed.worker = worker
+        claimed.save(
+            update_fields=["status", "attempts", "started_at", "finished_at", "worker"]
+        )
+        JobRun.objects.create(
+            job=claimed, attempt=claimed.attempts, worker=worker, started_at=now
+        )
+    return claimed
+
+
+def _finish(claimed, outcome):
+    """
+    Записывает итог попытки в JobRun и, если аренду задачи не перехватил
+    другой воркер, в Job.
+    """
+    JobRun.objects.filter(job=claimed, attempt=claimed.attempts).update(
+        finished_at=claimed.finished_at, outcome=outcome, error=claimed.last_error
+    )
+    saved = Job.objects.filter(
+        pk=claimed.pk, worker=claimed.worker, attempts=claimed.attempts
+    ).update(
+        status=claimed.status,
+        finished_at=claimed.finished_at,
+        last_error=claimed.last_error,
+        run_after=claimed.run_after,
+    )
+    if not saved:
+        logger.warning("Job %s lost its lease, result not saved", claimed)
+
+
+def run(claimed):
+    """Выполняет задачу и записывает результат в JobRun и строку Job."""
+    exclusive = claimed.name in EXCLUSIVE
+    if exclusive and not _try_lock(claimed.name):
+        logger.info("Job %s skipped: already running elsewhere", claimed)
+        claimed.status = Job.SKIPPED
+        claimed.finished_at = timezone.now()
+        claimed.last_error = "Already running on another worker"
+        _finish(claimed, JobRun.SKIPPED)
+        return claimed
+    # запросы задачи в журнале медленных запросов — под её именем
+    token = current_view.set(f"job:{claimed.name}")
+    try:
+        func = REGISTRY.get(claimed.name)
+        if func is None:
+            raise LookupError(f"Unknown job {claimed.name!r}")
+        func(**claimed.kwargs)
+    except Exception:
+        logger.exception("Job %s failed", claimed)
+        claimed.last_error = traceback.format_exc()
+        claimed.finished_at = timezone.now()
+        outcome = JobRun.FAILED
+        if claimed.attempts < claimed.max_attempts:
+            delay = settings.JOB_RETRY_DELAY_SECONDS * 2 ** (claimed.attempts - 1)
+            claimed.status = Job.QUEUED
+            claimed.run_after = claimed.finished_at + datetime.timedelta(seconds=delay)
+        else:
+            claimed.status = Job.FAILED
+    else:
+        outcome = JobRun.DONE
+        claimed.status = Job.DONE
+        claimed.finished_at = timezone.now()
+        claimed.last_error = ""
+    finally:
+        current_view.reset(token)
+        if exclusive:
+            _unlock(claimed.name)
+    _finish(claimed, outcome)
+    return claimed
+
+
+def work(worker=None, once=False, poll=None):
+    """
+    Цикл воркера. once=True — выполнить всё, что готово, и выйти.
+    """
+    worker = worker or default_worker_id()
+    poll = settings.JOB_POLL_SECONDS if poll is None else poll
+    while True:
+        claimed = claim(worker)
+        if claimed is not None:
+            run(claimed)
+            continue
+        if once:
+            return
+        time.sleep(poll)
+        # долгоживущий процесс: отбрасываем соединения старше CONN_MAX_AGE
+        close_old_connections()
@@ -1,26 +1,205 @@
 import datetime
+import json
+import os
 
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from django.db import connection
+from django.db import connections
 
 from booking.models import Booking
+from booking.partitioning.health import partition_health
+from booking.sharding import booking_databases
+
+# метрика -> (поле партиции, тип, описание)
+PARTITION_METRICS = {
+    "booking_partition_rows": ("rows", "gauge", "Живых строк в партиции"),
+    "booking_partition_dead_rows": ("dead_rows", "gauge", "Мёртвых строк"),
+    "booking_partition_dead_ratio": (
+        "dead_ratio",
+        "gauge",
+        "Доля мёртвых строк",
+    ),
+    "booking_partition_table_bytes": ("table_bytes", "gauge", "Размер таблицы"),
+    "booking_partition_index_bytes": ("index_bytes", "gauge", "Размер индексов"),
+    "booking_partition_bloat_bytes": (
+        "bloat_bytes",
+        "gauge",
+        "Оценка раздутия таблицы",
+    ),
+    "booking_partition_bloat_ratio": (
+        "bloat_ratio",
+        "gauge",
+        "Доля раздутых страниц",
+    ),
+    "booking_partition_last_vacuum_timestamp_seconds": (
+        "last_vacuum",
+        "gauge",
+        "Последний VACUUM (0 — не было)",
+    ),
+    "booking_partition_last_analyze_timestamp_seconds": (
+        "last_analyze",
+        "gauge",
+        "Последний ANALYZE (0 — не было)",
+    ),
+}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+def _metric_value(value):
+    if value is None:
+        return 0
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    return value
+
+
+def _labels(**labels):
+    return ",".join(f'{key}="{value}"' for key, value in labels.items())
+
+
+def prometheus(reports):
+    """Текстовый формат Prometheus (для textfile collector node_exporter)."""
+    lines = []
+    for metric, (field, kind, description) in PARTITION_METRICS.items():
+        lines += [f"# HELP {metric} {description}", f"# TYPE {metric} {kind}"]
+        for report in reports:
+            for partition in report["partitions"]:
+                labels = _labels(
+                    database=report["database"],
+                    partition=partition["name"],
+                    kind=partition["kind"],
+                    profile=partition["index_profile"],
+                )
+                lines.append(f"{metric}{{{labels}}} {_metric_value(partition[field])}")
+    for metric, field, description in (
+        (
+            "booking_partition_default_rows",
+            "default_rows",
+            "Строк в DEFAULT-партиции (брони вне созданных месяцев)",
+        ),
+        (
+            "booking_partition_horizon_days",
+            "horizon_days",
+            "На сколько дней вперёд созданы партиции",
+        ),
+    ):
+        lines += [f"# HELP {metric} {description}", f"# TYPE {metric} gauge"]
+        for report in reports:
+            labels = _labels(database=report["database"])
+            lines.append(f"{metric}{{{labels}}} {report[field]}")
+    metric = "booking_partition_missing_months"
+    lines += [
+        f"# HELP {metric} Ближайших месяцев без партиции",
+        f"# TYPE {metric} gauge",
+    ]
+    for report in reports:
+        labels = _labels(database=report["database"])
+        lines.append(f"{metric}{{{labels}}} {len(report['missing_months'])}")
+    return "\n".join(lines) + "\n"
+
+
+def partition_warnings(report):
+    found = []
+    if report["default_rows"]:
+        found.append(
+            f"DEFAULT-партиция содержит {report['default_rows']} строк: "
+            "брони пишутся в месяцы без своей партиции"
+        )
+    for partition in report["partitions"]:
+        if partition["dead_ratio"] > settings.BOOKING_PARTITION_MAX_DEAD_RATIO:
+            found.append(
+                f"{partition['name']}: мёртвых строк {partition['dead_ratio']:.0%}"
+            )
+        if partition["bloat_ratio"] > settings.BOOKING_PARTITION_MAX_BLOAT_RATIO:
+            found.append(
+                f"{partition['name']}: раздутие ≈ {partition['bloat_ratio']:.0%}"
+            )
+    return found
+
+
+def mb(size):
+    return f"{size / 1024 / 1024:.1f} MB"
 
 
 class Command(BaseCommand):
-    help = "Проверяет, что ожидаемые партиции Booking созданы"
+    help = (
+        "Проверяет, что партиции Booking на ближайшие месяцы созданы, и выводит "
+        "их состояние: строки, размеры, раздутие, VACUUM/ANALYZE, горизонт"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            action="append",
+            dest="databases",
+            help="Алиас БД (можно несколько; по умолчанию — все БД броней)",
+        )
+        parser.add_argument(
+            "--format", choices=["text", "json", "prometheus"], default="text"
+        )
+        parser.add_argument(
+            "--output",
+            help="Записать отчёт в файл (атомарно), а не в stdout",
+        )
 
     def handle(self, *args, **options):
         table = Booking._meta.db_table
-        with connection.cursor() as cursor:
-            part = connection.introspection.get_partitioned_table(cursor, table)
-            if not part:
-                raise CommandError(f"Таблица {table} не партиционируется")
-            today = datetime.date.today()
-            # Проверяем на три ближайших месяца
-            for i in range(3):
-                dt = today + datetime.timedelta(days=30 * i)
-                mon = dt.strftime("%b").lower()
-                name = f"{dt.year}_{mon}"
-                if not part.partition_by_name(name=name):
-                    raise CommandError(f"Не найдено: партиция {name}")
+        reports = []
+        for using in options["databases"] or booking_databases():
+            connection = connections[using]
+            with connection.cursor() as cursor:
+                if not connection.introspection.get_partitioned_table(cursor, table):
+                    raise CommandError(f"Таблица {table} не партиционируется ({using})")
+            reports.append(partition_health(using))
+
+        if options["format"] == "text":
+            self.text(reports)
+            return
+        if options["format"] == "json":
+            output = json.dumps(
+                reports, default=_json_default, ensure_ascii=False, indent=2
+            )
+        else:
+            output = prometheus(reports)
+        if options["output"]:
+            # textfile collector не должен прочитать недописанный файл
+            tmp = f"{options['output']}.tmp"
+            with open(tmp, "w") as fh:
+                fh.write(output)
+            os.replace(tmp, options["output"])
+        else:
+            self.stdout.write(output)
+
+    def text(self, reports):
+        missing = []
+        for report in reports:
+            self.stdout.write(
+                f"{report['database']}: партиции созданы до "
+                f"{report['covered_until'] or '—'} ({report['horizon_days']} дн.)"
+            )
+            self.stdout.write(
+                f"{'партиция':<32} {'строк':>10} {'мёртвых':>8} {'таблица':>10} "
+                f"{'индексы':>10} {'раздутие':>9}  vacuum / analyze"
+            )
+            for p in report["partitions"]:
+                vacuum = p["last_vacuum"].date() if p["last_vacuum"] else "—"
+                analyze = p["last_analyze"].date() if p["last_analyze"] else "—"
+                self.stdout.write(
+                    f"{p['name']:<32} {p['rows']:>10} {p['dead_ratio']:>8.0%} "
+                    f"{mb(p['table_bytes']):>10} {mb(p['index_bytes']):>10} "
+                    f"{p['bloat_ratio']:>9.0%}  {vacuum} / {analyze}"
+                )
+            for warning in partition_warnings(report):
+                self.stdout.write(self.style.WARNING(f"⚠ {warning}"))
+            missing += [
+                f"{report['database']}: {month:%Y_%b}".lower()
+                for month in report["missing_months"]
+            ]
+        if missing:
+            raise CommandError(f"Не найдено: партиции {', '.join(missing)}")
         self.stdout.write(self.style.SUCCESS("✅ Партиции в порядке"))
@@ -0,0 +1,49 @@
+import logging
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from booking.docs import schema_artifact
+
+
+class Command(BaseCommand):
+    help = (
+        "Собирает OpenAPI-схему в JSON и YAML (API_SCHEMA_DIR) для раздачи "
+        "как статики; запускать перед collectstatic"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output-dir",
+            default=None,
+            help="Каталог для схемы (по умолчанию API_SCHEMA_DIR)",
+        )
+
+    def handle(self, *args, output_dir, **options):
+        if not settings.API_DOCS_ENABLED:
+            self.stdout.write("API_DOCS_ENABLED=False — схема не собирается")
+            return
+
+        from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+        from drf_yasg.generators import OpenAPISchemaGenerator
+
+        from booking.docs import api_info
+
+        # без запроса drf_yasg предупреждает о полях с CurrentUserDefault
+        logging.disable(logging.WARNING)
+        try:
+            schema = OpenAPISchemaGenerator(api_info()).get_schema(public=True)
+        finally:
+            logging.disable(logging.NOTSET)
+        output_dir = Path(output_dir or settings.API_SCHEMA_DIR)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        codecs = {
+            "json": OpenAPICodecJson(validators=[], pretty=True),
+            "yaml": OpenAPICodecYaml(validators=[]),
+        }
+        for format, codec in codecs.items():
+            # API_SCHEMA_DIR подключён в STATICFILES_DIRS с префиксом openapi/
+            path = output_dir / Path(schema_artifact(format)).name
+            path.write_bytes(codec.encode(schema))
+            self.stdout.write(f"Схема записана в {path}")
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from booking.models import Booking, Room
+from booking.sharding import mirror_room, site_id_offset
+
+
+class Command(BaseCommand):
+    help = (
+        "Готовит БД площадок (BOOKING_SITE_DATABASES): миграции, партиции, "
+        "смещение id броней и копии комнат площадки"
+    )
+
+    def handle(self, *args, **options):
+        table = Booking._meta.db_table
+        for site, alias in settings.BOOKING_SITE_DATABASES.items():
+            self.stdout.write(f"Площадка {site} ({alias})")
+            call_command("migrate", database=alias, interactive=False, verbosity=0)
+            call_command("pgpartition", using=alias, yes=True, verbosity=0)
+            with connections[alias].cursor() as cursor:
+                # id броней площадки — из её блока, по id видно нужную БД
+                cursor.execute(
+                    f"""
+                    SELECT setval(
+                        pg_get_serial_sequence(%s, 'id'),
+                        GREATEST(%s, (SELECT COALESCE(MAX(id), 0) FROM {table}))
+                    )
+                    """,
+                    [table, site_id_offset(site)],
+                )
+            for room in Room.objects.using("default").filter(site=site):
+                mirror_room(Room, room, "default")
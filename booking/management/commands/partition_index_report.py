@@ -0,0 +1,194 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from booking.models import Booking
+from booking.partitioning.indexes import (
+    CLOSED,
+    COMPACT_HOT,
+    HOT,
+    PROFILES,
+    booking_partitions,
+    existing_indexes,
+    index_name,
+    index_statement,
+    profile_indexes,
+)
+
+# горячий профиль по минутам суток (BOOKING_COMPACT_TIME)
+COMPACT = "compact"
+
+# профили для замера: имя -> суффиксы индексов. Горячий профиль по time —
+# те же три B-tree, что до профилей стояли на родительской таблице во всех
+# партициях, поэтому он же служит точкой отсчёта для вставки и места
+BENCH_PROFILES = {HOT: PROFILES[HOT], COMPACT: COMPACT_HOT, CLOSED: PROFILES[CLOSED]}
+
+PARTITION_STATS_SQL = """
+    SELECT c.reltuples::bigint, pg_indexes_size(c.oid)
+    FROM pg_class c
+    WHERE c.oid = %s::regclass
+"""
+
+BENCH_TABLE = "booking_index_bench"
+
+# брони одного месяца: 200 комнат, случайные пользователи; id задаются
+# явно, чтобы не расходовать последовательность настоящей таблицы
+BENCH_INSERT_SQL = """
+    INSERT INTO {table} (id, user_id, room_id, date, start_time, end_time,
+                         start_minute, end_minute, version, txid, updated_at)
+    SELECT
+        g,
+        (random() * 1000)::int + 1,
+        g %% 200 + 1,
+        DATE '2000-01-01' + (g / 200) %% 28,
+        TIME '08:00' + make_interval(mins => (g / 5600) %% 600),
+        TIME '08:30' + make_interval(mins => (g / 5600) %% 600),
+        480 + (g / 5600) %% 600,
+        510 + (g / 5600) %% 600,
+        g,
+        0,
+        now()
+    FROM generate_series(1, %s) AS g
+"""
+
+PROFILE_INDEXES_SIZE_SQL = """
+    SELECT COALESCE(SUM(pg_relation_size(indexrelid)), 0)
+    FROM pg_index
+    WHERE indexrelid = ANY(%s::regclass[])
+"""
+
+
+def mb(size):
+    return f"{size / 1024 / 1024:.1f} MB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Отчёт по профилям индексов партиций Booking: размер индексов, "
+        "экономия места на закрытых партициях и стоимость вставки в горячие "
+        "партиции по сравнению с индексами до профилей"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=20000,
+            help="Строк во временной таблице для замера (0 — без замера)",
+        )
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        partitions = self.partition_stats(using)
+        self.stdout.write(
+            f"{'партиция':<32} {'профиль':<8} {'строк':>10} {'индексы':>10}  "
+            "соответствие"
+        )
+        for row in partitions:
+            self.stdout.write(
+                f"{row['name']:<32} {row['profile']:<8} {row['rows']:>10} "
+                f"{mb(row['index_size']):>10}  {row['state']}"
+            )
+        if not options["rows"]:
+            return
+
+        bench = self.benchmark(using, options["rows"])
+        closed_rows = sum(row["rows"] for row in partitions if row["profile"] == CLOSED)
+        saved = closed_rows * (
+            bench[HOT]["bytes_per_row"] - bench[CLOSED]["bytes_per_row"]
+        )
+        self.stdout.write("")
+        for profile in BENCH_PROFILES:
+            self.stdout.write(
+                f"профиль {profile:<7} {bench[profile]['bytes_per_row']:.1f} "
+                "байт индексов на строку"
+            )
+        self.stdout.write(
+            f"Закрытые партиции: {closed_rows} строк, экономия индексов ≈ "
+            f"{mb(saved)} по сравнению с индексами до профилей"
+        )
+        # новые брони идут в горячие партиции; закрытые вставок не получают,
+        # и скорость вставки в них ничего не говорит о нагрузке записи
+        before = 1e6 / bench[HOT]["rows_per_second"]
+        if settings.BOOKING_COMPACT_TIME:
+            hot = 1e6 / bench[COMPACT]["rows_per_second"]
+            self.stdout.write(
+                f"Вставка в горячую партицию (по минутам суток): {hot:.1f} мкс "
+                f"на строку против {before:.1f} мкс с индексами до профилей "
+                f"({hot / before - 1:+.0%})"
+            )
+        else:
+            self.stdout.write(
+                f"Вставка в горячую партицию: {before:.1f} мкс на строку, "
+                "индексы те же, что до профилей"
+            )
+        compact = 1 - bench[COMPACT]["bytes_per_row"] / bench[HOT]["bytes_per_row"]
+        self.stdout.write(
+            f"Горячие индексы по минутам суток (BOOKING_COMPACT_TIME) меньше на "
+            f"{compact:.0%}"
+        )
+
+    def partition_stats(self, using):
+        connection = connections[using]
+        stats = []
+        for name, bound, profile in booking_partitions(using):
+            with connection.cursor() as cursor:
+                cursor.execute(PARTITION_STATS_SQL, [connection.ops.quote_name(name)])
+                rows, index_size = cursor.fetchone()
+            present = existing_indexes(name, using)
+            wanted = set(profile_indexes(profile))
+            state = "ок"
+            if present != wanted:
+                state = (
+                    f"создать {sorted(wanted - present)}, "
+                    f"удалить {sorted(present - wanted)}"
+                )
+            stats.append(
+                {
+                    "name": name,
+                    "bound": bound,
+                    "profile": profile,
+                    "rows": max(rows, 0),
+                    "index_size": index_size,
+                    "state": state,
+                }
+            )
+        return stats
+
+    def benchmark(self, using, rows):
+        """
+        Вставка rows строк во временную копию таблицы с индексами родителя и
+        индексами каждого профиля (горячий — в двух вариантах: по time и по
+        минутам суток); всё откатывается.
+        """
+        connection = connections[using]
+        quote = connection.ops.quote_name
+        results = {}
+        with transaction.atomic(using=using):
+            for profile, suffixes in BENCH_PROFILES.items():
+                table = f"{BENCH_TABLE}_{profile}"
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"CREATE TEMP TABLE {quote(table)} "
+                        f"(LIKE {quote(Booking._meta.db_table)} "
+                        "INCLUDING DEFAULTS INCLUDING INDEXES)"
+                    )
+                    for suffix in suffixes:
+                        cursor.execute(index_statement(table, suffix, connection))
+                    started = time.perf_counter()
+                    cursor.execute(BENCH_INSERT_SQL.format(table=quote(table)), [rows])
+                    elapsed = time.perf_counter() - started
+                    cursor.execute(
+                        PROFILE_INDEXES_SIZE_SQL,
+                        [[index_name(table, suffix) for suffix in suffixes]],
+                    )
+                    profile_size = cursor.fetchone()[0]
+                results[profile] = {
+                    "rows_per_second": rows / elapsed,
+                    "bytes_per_row": profile_size / rows,
+                }
+            transaction.set_rollback(True, using=using)
+        return results
@@ -0,0 +1,51 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from booking.jobs import default_worker_id, work
+
+
+class Command(BaseCommand):
+    help = "Запускает воркер(ы) фоновой очереди задач Job"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Количество процессов-воркеров",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Выполнить готовые задачи и выйти",
+        )
+        parser.add_argument(
+            "--poll",
+            type=float,
+            default=None,
+            help="Пауза между опросами пустой очереди, сек (JOB_POLL_SECONDS)",
+        )
+
+    def handle(self, *args, processes, once, poll, **options):
+        if processes <= 1:
+            work(once=once, poll=poll)
+            return
+        # соединения не должны наследоваться дочерними процессами
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(
+                target=work,
+                kwargs={
+                    "worker": f"{default_worker_id()}/{i}",
+                    "once": once,
+                    "poll": poll,
+                },
+            )
+            for i in range(processes)
+        ]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
@@ -0,0 +1,160 @@
+"""
+Промежуточные слои booking.
+
+Контроль допуска: не больше BOOKING_MAX_CONCURRENT_REQUESTS запросов
+одновременно. Лишние сразу получают 503 с Retry-After, а не ждут в очереди
+соединения с БД (CONN_MAX_AGE держит по соединению на поток).
+
+Число запросов в работе — счётчик в кэше THROTTLE_CACHE_ALIAS: с общим кэшем
+(Redis, Memcached) лимит общий для всех воркеров uvicorn и контейнеров,
+с LocMemCache — на процесс. Счётчик живёт BOOKING_CONCURRENCY_COUNTER_TIMEOUT
+секунд с создания: запросы упавшего процесса перестают учитываться не позже
+этого срока. Без кэша (DummyCache) запросы не ограничиваются. Долгие
+соединения ленты изменений (BOOKING_CONCURRENCY_EXEMPT_PATHS) не учитываются.
+"""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+
+from .slow_queries import current_view
+from .throttling import OVERLOAD, count_rejection
+
+INFLIGHT_KEY = "concurrency-inflight"
+
+
+def _overloaded():
+    count_rejection(OVERLOAD)
+    response = JsonResponse(
+        {"detail": "Server is overloaded, retry later."}, status=503
+    )
+    response["Retry-After"] = str(settings.BOOKING_OVERLOAD_RETRY_AFTER)
+    return response
+
+
+def _cache():
+    return caches[settings.THROTTLE_CACHE_ALIAS]
+
+
+def _enter():
+    """Запросов в работе вместе с этим или None, если счётчика нет."""
+    cache = _cache()
+    try:
+        return cache.incr(INFLIGHT_KEY)
+    except ValueError:
+        cache.add(INFLIGHT_KEY, 0, timeout=settings.BOOKING_CONCURRENCY_COUNTER_TIMEOUT)
+    try:
+        return cache.incr(INFLIGHT_KEY)
+    except ValueError:
+        return None
+
+
+def _leave():
+    try:
+        _cache().decr(INFLIGHT_KEY)
+    except ValueError:
+        # счётчик истёк, пока запрос выполнялся
+        pass
+
+
+async def _aenter():
+    cache = _cache()
+    try:
+        return await cache.aincr(INFLIGHT_KEY)
+    except ValueError:
+        await cache.aadd(
+            INFLIGHT_KEY, 0, timeout=settings.BOOKING_CONCURRENCY_COUNTER_TIMEOUT
+        )
+    try:
+        return await cache.aincr(INFLIGHT_KEY)
+    except ValueError:
+        return None
+
+
+async def _aleave():
+    try:
+        await _cache().adecr(INFLIGHT_KEY)
+    except ValueError:
+        pass
+
+
+class ConcurrencyLimitMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.BOOKING_MAX_CONCURRENT_REQUESTS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.limit = settings.BOOKING_MAX_CONCURRENT_REQUESTS
+        self.exempt = tuple(settings.BOOKING_CONCURRENCY_EXEMPT_PATHS)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path.startswith(self.exempt):
+            return self.get_response(request)
+        inflight = _enter()
+        if inflight is None:
+            return self.get_response(request)
+        if inflight > self.limit:
+            _leave()
+            return _overloaded()
+        try:
+            return self.get_response(request)
+        finally:
+            _leave()
+
+    async def __acall__(self, request):
+        if request.path.startswith(self.exempt):
+            return await self.get_response(request)
+        inflight = await _aenter()
+        if inflight is None:
+            return await self.get_response(request)
+        if inflight > self.limit:
+            await _aleave()
+            return _overloaded()
+        try:
+            return await self.get_response(request)
+        finally:
+            await _aleave()
+
+
+class SlowQueryContextMiddleware:
+    """
+    Имя view для журнала медленных запросов (booking.slow_queries):
+    до разрешения URL — путь запроса.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_MS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = current_view.set(request.path)
+        try:
+            return self.get_response(request)
+        finally:
+            current_view.reset(token)
+
+    async def __acall__(self, request):
+        token = current_view.set(request.path)
+        try:
+            return await self.get_response(request)
+        finally:
+            current_view.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current_view.set(request.resolver_match.view_name or request.path)
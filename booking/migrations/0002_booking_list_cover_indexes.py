@@ -0,0 +1,33 @@
+# Generated by Django 4.2.20 on 2026-10-19 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="booking",
+            options={"ordering": ["date", "start_time", "id"]},
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["date", "start_time", "id"],
+                include=("end_time", "room", "user"),
+                name="idx_date_start_id_cover",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["user", "date", "start_time", "id"],
+                include=("end_time", "room"),
+                name="idx_user_date_start_id_cover",
+            ),
+        ),
+    ]
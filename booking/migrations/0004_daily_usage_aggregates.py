@@ -0,0 +1,83 @@
+# Generated by Django 4.2.20 on 2026-10-19 14:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0003_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FloorDailyPeak",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("floor", models.IntegerField()),
+                ("date", models.DateField()),
+                ("peak_concurrency", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "ordering": ["date", "floor"],
+            },
+        ),
+        migrations.CreateModel(
+            name="RoomDailyUsage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("minutes_booked", models.PositiveIntegerField(default=0)),
+                ("bookings", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "ordering": ["date", "room"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="job",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("attempts", 0), ("status", "queued")),
+                fields=("name", "kwargs"),
+                name="uniq_job_pending",
+            ),
+        ),
+        migrations.AddField(
+            model_name="roomdailyusage",
+            name="room",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="usage",
+                to="booking.room",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="floordailypeak",
+            unique_together={("date", "floor")},
+        ),
+        migrations.AddIndex(
+            model_name="roomdailyusage",
+            index=models.Index(fields=["date", "room"], name="idx_usage_date_room"),
+        ),
+        migrations.AlterUniqueTogether(
+            name="roomdailyusage",
+            unique_together={("room", "date")},
+        ),
+    ]
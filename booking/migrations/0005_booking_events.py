@@ -0,0 +1,54 @@
+# Generated by Django 4.2.20 on 2026-10-19 14:41
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0004_daily_usage_aggregates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookingEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("booking_id", models.BigIntegerField()),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("created", "Created"),
+                            ("updated", "Updated"),
+                            ("deleted", "Deleted"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("user_id", models.IntegerField()),
+                ("room_id", models.BigIntegerField()),
+                ("date", models.DateField()),
+                ("start_time", models.TimeField()),
+                ("end_time", models.TimeField()),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(fields=["user_id", "id"], name="idx_event_user_id"),
+                    models.Index(fields=["room_id", "id"], name="idx_event_room_id"),
+                    models.Index(fields=["created_at"], name="idx_event_created"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 4.2.20 on 2026-10-19 14:43
+
+from django.db import migrations, models
+
+# Версии строк для инкрементальной синхронизации (/api/bookings/sync/):
+# BEFORE-триггер проставляет version/updated_at при любой вставке/изменении
+# брони (ORM, админка, сырой SQL), AFTER DELETE-триггер пишет tombstone.
+# При переносе строки между партициями (смена date) PostgreSQL выполняет
+# DELETE + INSERT; tombstone такой строки отсекает booking.sync (см. 0015).
+VERSION_TRIGGERS_SQL = """
+CREATE SEQUENCE IF NOT EXISTS booking_version_seq;
+
+CREATE OR REPLACE FUNCTION booking_booking_stamp() RETURNS trigger AS $$
+BEGIN
+    NEW.version := nextval('booking_version_seq');
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION booking_booking_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO booking_bookingtombstone (booking_id, user_id, version, deleted_at)
+    VALUES (OLD.id, OLD.user_id, nextval('booking_version_seq'), now());
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER booking_booking_stamp
+    BEFORE INSERT OR UPDATE ON booking_booking
+    FOR EACH ROW EXECUTE FUNCTION booking_booking_stamp();
+
+CREATE TRIGGER booking_booking_tombstone
+    AFTER DELETE ON booking_booking
+    FOR EACH ROW EXECUTE FUNCTION booking_booking_tombstone();
+
+-- существующим строкам версию проставит триггер
+UPDATE booking_booking SET version = 0;
+"""
+
+DROP_VERSION_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS booking_booking_tombstone ON booking_booking;
+DROP TRIGGER IF EXISTS booking_booking_stamp ON booking_booking;
+DROP FUNCTION IF EXISTS booking_booking_tombstone();
+DROP FUNCTION IF EXISTS booking_booking_stamp();
+DROP SEQUENCE IF EXISTS booking_version_seq;
+"""
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0005_booking_events"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookingTombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("booking_id", models.BigIntegerField()),
+                ("user_id", models.IntegerField()),
+                ("version", models.BigIntegerField()),
+                ("deleted_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "ordering": ["version"],
+            },
+        ),
+        migrations.AddField(
+            model_name="booking",
+            name="updated_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+        migrations.AddField(
+            model_name="booking",
+            name="version",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(fields=["user", "version"], name="idx_user_version"),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(fields=["version"], name="idx_version"),
+        ),
+        migrations.AddIndex(
+            model_name="bookingtombstone",
+            index=models.Index(
+                fields=["user_id", "version"], name="idx_tomb_user_version"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bookingtombstone",
+            index=models.Index(fields=["version"], name="idx_tomb_version"),
+        ),
+        migrations.AddIndex(
+            model_name="bookingtombstone",
+            index=models.Index(fields=["deleted_at"], name="idx_tomb_deleted_at"),
+        ),
+        migrations.RunSQL(VERSION_TRIGGERS_SQL, DROP_VERSION_TRIGGERS_SQL),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.20 on 2026-10-19 15:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("booking", "0006_booking_versions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="room",
+            name="site",
+            field=models.CharField(db_index=True, default="default", max_length=32),
+        ),
+        migrations.AlterField(
+            model_name="booking",
+            name="user",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="bookings",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.20 on 2026-10-19 15:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Брони комнаты удаляются на стороне БД: Django больше не собирает их в память
+# (on_delete=DO_NOTHING), а оставшиеся после пачечного удаления (booking.purge)
+# строки удалит ON DELETE CASCADE одним запросом по партициям.
+ROOM_FK_SQL = """
+DO $$
+DECLARE fk text;
+BEGIN
+    SELECT conname INTO fk FROM pg_constraint
+    WHERE conrelid = 'booking_booking'::regclass
+      AND confrelid = 'booking_room'::regclass
+      AND contype = 'f';
+    IF fk IS NOT NULL THEN
+        EXECUTE format('ALTER TABLE booking_booking DROP CONSTRAINT %I', fk);
+    END IF;
+    ALTER TABLE booking_booking ADD CONSTRAINT booking_booking_room_id_fk
+        FOREIGN KEY (room_id) REFERENCES booking_room (id)
+        ON DELETE {action} DEFERRABLE INITIALLY DEFERRED;
+END $$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("booking", "0007_room_site"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="room",
+            name="is_active",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AlterField(
+            model_name="booking",
+            name="room",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="bookings",
+                to="booking.room",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="booking",
+            name="user",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="bookings",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunSQL(
+            ROOM_FK_SQL.format(action="CASCADE"),
+            ROOM_FK_SQL.format(action="NO ACTION"),
+        ),
+    ]
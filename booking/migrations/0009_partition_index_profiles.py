@@ -0,0 +1,69 @@
+# Generated by Django 4.2.20 on 2026-10-19 15:13
+
+from django.db import migrations
+
+# Составные B-tree проверки пересечений и поиска свободных комнат переезжают
+# с родительской таблицы на партиции: сначала каждая партиция получает
+# горячий профиль, закрытые месяцы менеджер партиций затем переводит на BRIN
+# (booking.partitioning.indexes).
+HOT_INDEXES_SQL = """
+DO $$
+DECLARE part text;
+BEGIN
+    FOR part IN
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'booking_booking'::regclass
+    LOOP
+        EXECUTE format(
+            'CREATE INDEX IF NOT EXISTS %I ON %I (room_id, date, start_time, end_time)',
+            part || '_room_date_time', part);
+        EXECUTE format(
+            'CREATE INDEX IF NOT EXISTS %I ON %I (user_id, date, start_time, end_time)',
+            part || '_user_date_time', part);
+        EXECUTE format(
+            'CREATE INDEX IF NOT EXISTS %I ON %I (date, start_time, end_time, room_id)',
+            part || '_date_start_end_room', part);
+    END LOOP;
+END $$;
+"""
+
+DROP_PARTITION_INDEXES_SQL = """
+DO $$
+DECLARE part text;
+DECLARE suffix text;
+BEGIN
+    FOR part IN
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'booking_booking'::regclass
+    LOOP
+        FOREACH suffix IN ARRAY ARRAY[
+            'room_date_time', 'user_date_time', 'date_start_end_room', 'date_brin'
+        ] LOOP
+            EXECUTE format('DROP INDEX IF EXISTS %I', part || '_' || suffix);
+        END LOOP;
+    END LOOP;
+END $$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0008_room_is_active_set_based_deletes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="booking",
+            name="idx_room_date_time",
+        ),
+        migrations.RemoveIndex(
+            model_name="booking",
+            name="idx_user_date_time",
+        ),
+        migrations.RemoveIndex(
+            model_name="booking",
+            name="idx_date_start_end_room",
+        ),
+        migrations.RunSQL(HOT_INDEXES_SQL, DROP_PARTITION_INDEXES_SQL),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.20 on 2026-10-19 15:20
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0009_partition_index_profiles"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SlowQuery",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fingerprint", models.CharField(max_length=40)),
+                ("alias", models.CharField(max_length=64)),
+                ("sql", models.TextField()),
+                ("view", models.CharField(blank=True, max_length=200)),
+                ("calls", models.PositiveIntegerField(default=0)),
+                ("total_ms", models.FloatField(default=0)),
+                ("max_ms", models.FloatField(default=0)),
+                ("last_ms", models.FloatField(default=0)),
+                ("plan", models.TextField(blank=True)),
+                ("first_seen", models.DateTimeField(default=django.utils.timezone.now)),
+                ("last_seen", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "ordering": ["-total_ms"],
+                "indexes": [
+                    models.Index(fields=["last_seen"], name="idx_slowquery_last_seen")
+                ],
+                "unique_together": {("fingerprint", "alias")},
+            },
+        ),
+    ]
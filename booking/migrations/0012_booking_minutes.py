@@ -0,0 +1,71 @@
+# Generated by Django 4.2.20 on 2026-10-19 15:31
+
+from django.db import migrations, models
+
+# Минуты от начала суток (booking.compact_time) проставляет BEFORE-триггер при
+# любой вставке/изменении; секунды округляются наружу, поэтому пересечение по
+# минутам не пропускает пересечений по времени. Триггер родителя действует и
+# на партиции, создаваемые позже.
+#
+# booking_booking_stamp пропускает смену версии, если транзакция выставила
+# booking.skip_version: служебное заполнение колонок (0013) не должно
+# отдавать все брони клиентам синхронизации как изменённые.
+MINUTES_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION booking_booking_minutes() RETURNS trigger AS $$
+BEGIN
+    NEW.start_minute := floor(EXTRACT(EPOCH FROM NEW.start_time) / 60)::smallint;
+    NEW.end_minute := ceil(EXTRACT(EPOCH FROM NEW.end_time) / 60)::smallint;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER booking_booking_minutes
+    BEFORE INSERT OR UPDATE ON booking_booking
+    FOR EACH ROW EXECUTE FUNCTION booking_booking_minutes();
+
+CREATE OR REPLACE FUNCTION booking_booking_stamp() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND current_setting('booking.skip_version', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
+    NEW.version := nextval('booking_version_seq');
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+DROP_MINUTES_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS booking_booking_minutes ON booking_booking;
+DROP FUNCTION IF EXISTS booking_booking_minutes();
+
+CREATE OR REPLACE FUNCTION booking_booking_stamp() RETURNS trigger AS $$
+BEGIN
+    NEW.version := nextval('booking_version_seq');
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0011_job_skipped_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="booking",
+            name="end_minute",
+            field=models.SmallIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="booking",
+            name="start_minute",
+            field=models.SmallIntegerField(editable=False, null=True),
+        ),
+        migrations.RunSQL(MINUTES_TRIGGER_SQL, DROP_MINUTES_TRIGGER_SQL),
+    ]
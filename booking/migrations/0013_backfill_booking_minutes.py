@@ -0,0 +1,51 @@
+from django.db import migrations, transaction
+
+# Заполнение start_minute/end_minute существующих броней без перезаписи
+# таблицы целиком: по каждой партиции окнами id по BATCH строк, каждое окно —
+# своя короткая транзакция (миграция неатомарная). Значения вычисляет триггер
+# booking_booking_minutes (0012), версия синхронизации не меняется.
+BATCH = 5000
+
+PARTITIONS_SQL = """
+    SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'booking_booking'::regclass
+    ORDER BY c.relname
+"""
+
+BACKFILL_SQL = """
+    UPDATE {partition} SET start_time = start_time
+    WHERE id > %s AND id <= %s AND start_minute IS NULL
+"""
+
+
+def backfill_minutes(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute(PARTITIONS_SQL)
+        partitions = [row[0] for row in cursor.fetchall()]
+    for partition in partitions:
+        table = connection.ops.quote_name(partition)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT min(id), max(id) FROM {table}")
+            low, high = cursor.fetchone()
+        if low is None:
+            continue
+        for start in range(low - 1, high, BATCH):
+            with transaction.atomic(using=connection.alias):
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL booking.skip_version = 'on'")
+                    cursor.execute(
+                        BACKFILL_SQL.format(partition=table), [start, start + BATCH]
+                    )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("booking", "0012_booking_minutes"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_minutes, migrations.RunPython.noop),
+    ]
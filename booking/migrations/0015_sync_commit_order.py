@@ -0,0 +1,125 @@
+# Generated by Django 4.2.20 on 2026-10-19 15:49
+
+from django.db import migrations, models
+
+# Порядок синхронизации (/api/bookings/sync/) — (txid, version): txid —
+# транзакция записи. Версии из последовательности выдаются до коммита, и
+# транзакция с меньшей версией может завершиться позже клиента, уже
+# прошедшего большую; txid всех ещё не завершённых транзакций не меньше
+# pg_snapshot_xmin, поэтому отданные строки ниже этой границы дополняться
+# не будут.
+#
+# При переносе строки между партициями (смена date) новая строка получает
+# версию в BEFORE-триггере, а tombstone — в AFTER DELETE в конце оператора,
+# то есть большую; такие tombstone отсекает booking.sync.
+TXID_TRIGGERS_SQL = """
+CREATE OR REPLACE FUNCTION booking_booking_stamp() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND current_setting('booking.skip_version', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
+    NEW.txid := pg_current_xact_id()::text::bigint;
+    NEW.version := nextval('booking_version_seq');
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION booking_booking_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO booking_bookingtombstone
+        (booking_id, user_id, version, txid, deleted_at)
+    VALUES (
+        OLD.id, OLD.user_id, nextval('booking_version_seq'),
+        pg_current_xact_id()::text::bigint, now()
+    );
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+DROP_TXID_TRIGGERS_SQL = """
+CREATE OR REPLACE FUNCTION booking_booking_stamp() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND current_setting('booking.skip_version', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
+    NEW.version := nextval('booking_version_seq');
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION booking_booking_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO booking_bookingtombstone (booking_id, user_id, version, deleted_at)
+    VALUES (OLD.id, OLD.user_id, nextval('booking_version_seq'), now());
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0014_idempotency_keys"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="bookingtombstone",
+            options={"ordering": ["txid", "version"]},
+        ),
+        migrations.RemoveIndex(
+            model_name="booking",
+            name="idx_user_version",
+        ),
+        migrations.RemoveIndex(
+            model_name="booking",
+            name="idx_version",
+        ),
+        migrations.RemoveIndex(
+            model_name="bookingtombstone",
+            name="idx_tomb_user_version",
+        ),
+        migrations.RemoveIndex(
+            model_name="bookingtombstone",
+            name="idx_tomb_version",
+        ),
+        migrations.AddField(
+            model_name="booking",
+            name="txid",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="bookingtombstone",
+            name="txid",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["user", "txid", "version"], name="idx_user_txid_version"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(fields=["txid", "version"], name="idx_txid_version"),
+        ),
+        migrations.AddIndex(
+            model_name="bookingtombstone",
+            index=models.Index(
+                fields=["user_id", "txid", "version"], name="idx_tomb_user_txid_version"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bookingtombstone",
+            index=models.Index(
+                fields=["txid", "version"], name="idx_tomb_txid_version"
+            ),
+        ),
+        migrations.RunSQL(TXID_TRIGGERS_SQL, DROP_TXID_TRIGGERS_SQL),
+    ]
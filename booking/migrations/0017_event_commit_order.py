@@ -0,0 +1,51 @@
+# Generated by Django 4.2.20 on 2026-10-19 16:16
+
+from django.db import migrations, models
+
+# Лента событий (/api/bookings/events/) — в порядке (txid, id), как
+# синхронизация в 0015: id из последовательности выдаётся до коммита, и
+# событие с меньшим id может стать видимым после того, как клиент прошёл
+# больший. Старые события получают txid 0 и идут первыми.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0016_slot_holds"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="bookingevent",
+            options={"ordering": ["txid", "id"]},
+        ),
+        migrations.RemoveIndex(
+            model_name="bookingevent",
+            name="idx_event_user_id",
+        ),
+        migrations.RemoveIndex(
+            model_name="bookingevent",
+            name="idx_event_room_id",
+        ),
+        migrations.AddField(
+            model_name="bookingevent",
+            name="txid",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="bookingevent",
+            index=models.Index(fields=["txid", "id"], name="idx_event_txid_id"),
+        ),
+        migrations.AddIndex(
+            model_name="bookingevent",
+            index=models.Index(
+                fields=["user_id", "txid", "id"], name="idx_event_user_txid_id"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bookingevent",
+            index=models.Index(
+                fields=["room_id", "txid", "id"], name="idx_event_room_txid_id"
+            ),
+        ),
+    ]
@@ -1,14 +1,23 @@
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
 from psqlextra.models import PostgresPartitionedModel
 from psqlextra.types import PostgresPartitioningMethod
 
+from .compact_time import overlap_q
+
 
 class Room(models.Model):
     name = models.CharField(max_length=100, unique=True)
     capacity = models.PositiveIntegerField()
     floor = models.IntegerField()
+    # площадка (офис): брони комнаты хранятся в БД этой площадки
+    # (BOOKING_SITE_DATABASES, booking.sharding)
+    site = models.CharField(max_length=32, default="default", db_index=True)
+    # выключенная комната не предлагается как свободная и не бронируется;
+    # удаление комнаты выключает её сразу, брони удаляются пачками (booking.purge)
+    is_active = models.BooleanField(default=True)
 
     def __str__(self):
         return f"{self.name} (Floor {self.floor}, capacity {self.capacity})"
@@ -18,13 +27,32 @@ class Room(models.Model):
 
 
 class Booking(PostgresPartitionedModel):
+    # пользователи хранятся только в default, брони — и в БД площадок:
+    # ограничение внешнего ключа между базами невозможно.
+    # Брони удалённого пользователя или комнаты Django не собирает в память:
+    # их удаляют пачками по партициям (booking.purge), а для комнаты
+    # ограничение в БД — ON DELETE CASCADE (миграция 0008)
     user = models.ForeignKey(
-        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="bookings"
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        related_name="bookings",
+        db_constraint=False,
     )
-    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="bookings")
+    room = models.ForeignKey(Room, on_delete=models.DO_NOTHING, related_name="bookings")
     date = models.DateField()
     start_time = models.TimeField()
     end_time = models.TimeField()
+    # минуты от начала суток (booking.compact_time); проставляет триггер
+    # booking_booking_minutes из start_time/end_time
+    start_minute = models.SmallIntegerField(null=True, editable=False)
+    end_minute = models.SmallIntegerField(null=True, editable=False)
+    # проставляются триггером booking_booking_stamp при каждой вставке/изменении
+    # (общая с BookingTombstone последовательность booking_version_seq)
+    version = models.BigIntegerField(default=0, editable=False)
+    # транзакция записи (pg_current_xact_id): синхронизация отдаёт изменения
+    # в порядке (txid, version) только завершённых транзакций (booking.sync)
+    txid = models.BigIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class PartitioningMeta:
         method = PostgresPartitioningMethod.RANGE
@@ -42,10 +70,7 @@ class Booking(PostgresPartitionedModel):
                 date=self.date,
             )
             .exclude(pk=self.pk)
-            .filter(
-                start_time__lt=self.end_time,
-                end_time__gt=self.start_time,
-            )
+            .filter(overlap_q(self.start_time, self.end_time))
         )
         if room_conflicts.exists():
             raise ValidationError(
@@ -59,10 +84,7 @@ class Booking(PostgresPartitionedModel):
                 date=self.date,
             )
             .exclude(pk=self.pk)
-            .filter(
-                start_time__lt=self.end_time,
-                end_time__gt=self.start_time,
-            )
+            .filter(overlap_q(self.start_time, self.end_time))
         )
         if user_conflicts.exists():
             raise ValidationError(
@@ -73,22 +95,328 @@ class Booking(PostgresPartitionedModel):
         return f"{self.room.name} – {self.date}: {self.start_time} - {self.end_time}"
 
     class Meta:
-        ordering = ["date", "start_time"]
+        ordering = ["date", "start_time", "id"]
         unique_together = ("room", "date", "start_time", "end_time")
         indexes = [
-            # поиск по комнате+дате+времени
+            # индексы проверки пересечений и поиска свободных комнат создаются
+            # на каждой партиции по её возрасту (booking.partitioning.indexes)
+            # покрывающие индексы под порядок курсорной пагинации (date, start_time, id):
+            # INCLUDE содержит остальные поля BookingSerializer, чтобы страницы
+            # списка отдавались index-only scan без сортировки в памяти
+            models.Index(
+                fields=["date", "start_time", "id"],
+                include=["end_time", "room", "user"],
+                name="idx_date_start_id_cover",
+            ),
+            models.Index(
+                fields=["user", "date", "start_time", "id"],
+                include=["end_time", "room"],
+                name="idx_user_date_start_id_cover",
+            ),
+            # инкрементальная синхронизация: изменения новее позиции клиента
+            models.Index(
+                fields=["user", "txid", "version"], name="idx_user_txid_version"
+            ),
+            models.Index(fields=["txid", "version"], name="idx_txid_version"),
+        ]
+
+
+class BookingTombstone(models.Model):
+    """
+    След удалённой брони для /api/bookings/sync/: пишется триггером
+    booking_booking_tombstone, версия — из той же последовательности, что и
+    Booking.version, txid — транзакция удаления.
+    """
+
+    booking_id = models.BigIntegerField()
+    user_id = models.IntegerField()
+    version = models.BigIntegerField()
+    txid = models.BigIntegerField(default=0)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"booking {self.booking_id} deleted (v{self.version})"
+
+    class Meta:
+        ordering = ["txid", "version"]
+        indexes = [
             models.Index(
-                fields=["room", "date", "start_time", "end_time"],
-                name="idx_room_date_time",
+                fields=["user_id", "txid", "version"],
+                name="idx_tomb_user_txid_version",
             ),
-            # поиск пересечений по пользователю
+            models.Index(fields=["txid", "version"], name="idx_tomb_txid_version"),
+            models.Index(fields=["deleted_at"], name="idx_tomb_deleted_at"),
+        ]
+
+
+class BookingEvent(models.Model):
+    """
+    Журнал изменений броней (только добавление): клиенты забирают дельты
+    через /api/bookings/events/ (?since=<id>, long-poll или SSE).
+    Пишется в том же запросе, что и сама бронь (booking.services).
+    """
+
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    ACTION_CHOICES = [
+        (CREATED, "Created"),
+        (UPDATED, "Updated"),
+        (DELETED, "Deleted"),
+    ]
+
+    # без внешних ключей: событие переживает удаление брони/комнаты
+    booking_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    user_id = models.IntegerField()
+    room_id = models.BigIntegerField()
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    # транзакция записи: лента отдаёт события в порядке (txid, id)
+    # (booking.events)
+    txid = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"#{self.pk} {self.action} booking {self.booking_id}"
+
+    class Meta:
+        ordering = ["txid", "id"]
+        indexes = [
+            models.Index(fields=["txid", "id"], name="idx_event_txid_id"),
             models.Index(
-                fields=["user", "date", "start_time", "end_time"],
-                name="idx_user_date_time",
+                fields=["user_id", "txid", "id"], name="idx_event_user_txid_id"
             ),
-            # составной индекс для быстрого поиска свободных комнат
             models.Index(
-                fields=["date", "start_time", "end_time", "room"],
-                name="idx_date_start_end_room",
+                fields=["room_id", "txid", "id"], name="idx_event_room_txid_id"
             ),
+            models.Index(fields=["created_at"], name="idx_event_created"),
+        ]
+
+
+class RoomDailyUsage(models.Model):
+    """
+    Агрегат загрузки комнаты за день (booking.usage): отчёты читают его
+    вместо сырых Booking по закрытым партициям.
+    """
+
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="usage")
+    date = models.DateField()
+    minutes_booked = models.PositiveIntegerField(default=0)
+    bookings = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.room_id} – {self.date}: {self.minutes_booked} min"
+
+    class Meta:
+        ordering = ["date", "room"]
+        unique_together = ("room", "date")
+        indexes = [
+            models.Index(fields=["date", "room"], name="idx_usage_date_room"),
+        ]
+
+
+class FloorDailyPeak(models.Model):
+    """Пиковое число одновременных броней на этаже за день (booking.usage)."""
+
+    floor = models.IntegerField()
+    date = models.DateField()
+    peak_concurrency = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Floor {self.floor} – {self.date}: {self.peak_concurrency}"
+
+    class Meta:
+        ordering = ["date", "floor"]
+        unique_together = ("date", "floor")
+
+
+class SlowQuery(models.Model):
+    """
+    Медленные запросы, сгруппированные по отпечатку SQL (booking.slow_queries):
+    число вызовов, суммарное и максимальное время, последний вызвавший view и
+    выборочно снятый EXPLAIN.
+    """
+
+    fingerprint = models.CharField(max_length=40)
+    alias = models.CharField(max_length=64)
+    sql = models.TextField()
+    view = models.CharField(max_length=200, blank=True)
+    calls = models.PositiveIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    last_ms = models.FloatField(default=0)
+    plan = models.TextField(blank=True)
+    first_seen = models.DateTimeField(default=timezone.now)
+    last_seen = models.DateTimeField(default=timezone.now)
+
+    @property
+    def avg_ms(self):
+        return self.total_ms / self.calls if self.calls else 0
+
+    def __str__(self):
+        return f"{self.fingerprint} ({self.calls} calls, max {self.max_ms:.0f} ms)"
+
+    class Meta:
+        ordering = ["-total_ms"]
+        unique_together = ("fingerprint", "alias")
+        indexes = [
+            models.Index(fields=["last_seen"], name="idx_slowquery_last_seen"),
+        ]
+
+
+class Job(models.Model):
+    """
+    Задача фоновой очереди (booking.jobs). started_at, finished_at и
+    last_error — последней попытки; каждая попытка отдельно — в JobRun.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    # эксклюзивная задача уже выполнялась другим воркером (booking.jobs)
+    SKIPPED = "skipped"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+        (SKIPPED, "Skipped"),
+    ]
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+
+    @property
+    def duration(self):
+        if self.started_at and self.finished_at:
+            return self.finished_at - self.started_at
+        return None
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            # выборка следующей задачи воркером: status + run_after
+            models.Index(
+                fields=["status", "run_after"], name="idx_job_status_run_after"
+            ),
+            models.Index(fields=["name", "-created_at"], name="idx_job_name_created"),
+        ]
+        constraints = [
+            # не больше одной ожидающей задачи с теми же аргументами
+            # (enqueue(unique=True) — INSERT ... ON CONFLICT DO NOTHING)
+            models.UniqueConstraint(
+                fields=["name", "kwargs"],
+                condition=models.Q(status="queued", attempts=0),
+                name="uniq_job_pending",
+            ),
+        ]
+
+
+class JobRun(models.Model):
+    """Попытка выполнения задачи (booking.jobs): строка на каждый claim."""
+
+    RUNNING = Job.RUNNING
+    DONE = Job.DONE
+    FAILED = Job.FAILED
+    SKIPPED = Job.SKIPPED
+    OUTCOME_CHOICES = [
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+        (SKIPPED, "Skipped"),
+    ]
+
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name="runs")
+    attempt = models.PositiveIntegerField()
+    worker = models.CharField(max_length=100)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    outcome = models.CharField(max_length=10, choices=OUTCOME_CHOICES, default=RUNNING)
+    error = models.TextField(blank=True)
+
+    @property
+    def duration(self):
+        if self.finished_at:
+            return self.finished_at - self.started_at
+        return None
+
+    def __str__(self):
+        return f"{self.job_id} attempt {self.attempt} ({self.outcome})"
+
+    class Meta:
+        ordering = ["job", "attempt"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["job", "attempt"], name="uniq_job_run_attempt"
+            ),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """
+    Ответ на создание брони по заголовку Idempotency-Key
+    (booking.idempotency): повтор запроса с тем же ключом получает
+    сохранённый ответ без новой записи в Booking. Устаревшие ключи удаляет
+    задача idempotency.prune.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    key = models.CharField(max_length=255)
+    # отпечаток тела запроса: тот же ключ с другим телом — ошибка клиента
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.user_id}:{self.key} ({self.status_code})"
+
+    class Meta:
+        unique_together = ("user", "key")
+        indexes = [
+            models.Index(fields=["created_at"], name="idx_idempotency_created"),
+        ]
+
+
+class SlotHold(models.Model):
+    """
+    Удержание слота перед бронированием (booking.holds): пока не истёк
+    expires_at, чужие удержания и брони пересекающегося интервала комнаты
+    получают 409. Истёкшие удержания удаляет задача holds.prune.
+    """
+
+    id = models.CharField(max_length=32, primary_key=True)
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="+")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.room_id} {self.date} {self.start_time}-{self.end_time}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["date", "room"], name="idx_hold_date_room"),
+            models.Index(fields=["expires_at"], name="idx_hold_expires"),
         ]
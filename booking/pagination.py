@@ -3,5 +3,7 @@ from rest_framework.pagination import CursorPagination
 
 class CustomCursorPagination(CursorPagination):
     page_size = 20
-    ordering = ["date", "-start_time"]
+    # совпадает с Booking.Meta.ordering и покрывающими индексами,
+    # id — уникальный тай-брейкер для детерминированного порядка
+    ordering = ["date", "start_time", "id"]
     cursor_query_param = "cursor"
@@ -0,0 +1,144 @@
+"""
+Состояние партиций Booking для check_partitions: строки и размер каждой
+партиции (включая DEFAULT), размер индексов, оценка раздутия таблицы,
+последние VACUUM/ANALYZE, доля мёртвых строк и горизонт заранее созданных
+партиций.
+
+Раздутие оценивается без расширений: ожидаемое число страниц считается по
+reltuples и средней ширине строки из pg_stats и сравнивается с relpages.
+
+Строки DEFAULT считаются точно (count(*)): в норме партиция пуста, и любая
+попавшая туда бронь должна сразу дать сигнал, а reltuples отстаёт до
+следующего ANALYZE. Для партиций месяцев достаточно оценки — большее из
+reltuples (до первого ANALYZE равен -1) и n_live_tup: занизить число строк
+может только отставание обеих оценок сразу.
+"""
+
+import datetime
+import re
+
+from dateutil.relativedelta import relativedelta
+from django.db import connections
+
+from booking.models import Booking
+
+from .indexes import booking_partitions
+
+# сколько месяцев вперёд, включая текущий, партиции должны существовать
+EXPECTED_MONTHS = 3
+
+# заголовок строки (23 байта с выравниванием) + указатель на строку
+TUPLE_OVERHEAD = 24 + 4
+PAGE_HEADER = 24
+
+PARTITION_STATS_SQL = """
+    SELECT
+        c.relpages,
+        c.reltuples::bigint,
+        pg_table_size(c.oid),
+        pg_indexes_size(c.oid),
+        COALESCE(s.n_live_tup, 0),
+        COALESCE(s.n_dead_tup, 0),
+        GREATEST(s.last_vacuum, s.last_autovacuum),
+        GREATEST(s.last_analyze, s.last_autoanalyze),
+        (
+            SELECT COALESCE(SUM((1 - st.null_frac) * st.avg_width), 0)
+            FROM pg_stats st
+            WHERE st.schemaname = n.nspname AND st.tablename = c.relname
+        ),
+        current_setting('block_size')::int
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    WHERE c.relname = %s
+"""
+
+BOUNDS = re.compile(r"FROM \('(\d{4}-\d{2}-\d{2})'\) TO \('(\d{4}-\d{2}-\d{2})'\)")
+
+
+def _bounds(bound):
+    match = BOUNDS.search(bound or "")
+    if match is None:
+        return None, None
+    return tuple(datetime.date.fromisoformat(value) for value in match.groups())
+
+
+def _bloat(relpages, reltuples, row_width, block_size):
+    """(байты, доля) раздутия таблицы по сравнению с плотной упаковкой."""
+    if not relpages or not reltuples:
+        return 0, 0.0
+    per_page = (block_size - PAGE_HEADER) / (TUPLE_OVERHEAD + row_width)
+    expected = -(-reltuples // max(int(per_page), 1))
+    extra = max(relpages - expected, 0)
+    return extra * block_size, extra / relpages
+
+
+def partition_health(using="default", today=None):
+    today = today or datetime.date.today()
+    partitions = []
+    with connections[using].cursor() as cursor:
+        for name, bound, profile in booking_partitions(using, today):
+            cursor.execute(PARTITION_STATS_SQL, [name])
+            (
+                relpages,
+                reltuples,
+                table_bytes,
+                index_bytes,
+                live,
+                dead,
+                last_vacuum,
+                last_analyze,
+                row_width,
+                block_size,
+            ) = cursor.fetchone()
+            lower, upper = _bounds(bound)
+            bloat_bytes, bloat_ratio = _bloat(
+                relpages, max(reltuples, 0), float(row_width), block_size
+            )
+            if upper is None:
+                cursor.execute(
+                    "SELECT count(*) FROM %s" % connections[using].ops.quote_name(name)
+                )
+                (rows,) = cursor.fetchone()
+            else:
+                rows = max(reltuples, live)
+            partitions.append(
+                {
+                    "name": name,
+                    "kind": "range" if upper else "default",
+                    "from": lower,
+                    "to": upper,
+                    "index_profile": profile,
+                    "rows": rows,
+                    "dead_rows": dead,
+                    "dead_ratio": dead / (live + dead) if live + dead else 0.0,
+                    "table_bytes": table_bytes,
+                    "index_bytes": index_bytes,
+                    "bloat_bytes": bloat_bytes,
+                    "bloat_ratio": bloat_ratio,
+                    "last_vacuum": last_vacuum,
+                    "last_analyze": last_analyze,
+                }
+            )
+
+    ranges = [p for p in partitions if p["kind"] == "range"]
+    month = today.replace(day=1)
+    expected = [month + relativedelta(months=i) for i in range(EXPECTED_MONTHS)]
+    missing = [
+        start
+        for start in expected
+        if not any(p["from"] <= start < p["to"] for p in ranges)
+    ]
+    covered_until = max((p["to"] for p in ranges), default=None)
+    default_rows = sum(p["rows"] for p in partitions if p["kind"] == "default")
+    return {
+        "database": using,
+        "table": Booking._meta.db_table,
+        "checked_at": today,
+        "partitions": partitions,
+        "missing_months": missing,
+        "covered_until": covered_until,
+        # сколько дней вперёд брони ещё попадают в созданные партиции
+        "horizon_days": (covered_until - today).days if covered_until else 0,
+        "default_rows": default_rows,
+    }
@@ -0,0 +1,154 @@
+"""
+Профили индексов партиций Booking по возрасту.
+
+На родительской таблице остаются индексы, нужные во всех партициях:
+первичный ключ, unique_together, покрывающие индексы списка и индексы версий
+синхронизации. Составные B-tree для проверки пересечений и поиска свободных
+комнат создаются на каждой партиции отдельно, по профилю:
+
+- hot — текущий и будущие месяцы (и закрывшийся не раньше
+  BOOKING_PARTITION_GRACE_MONTHS месяцев назад), а также DEFAULT-партиция:
+  все три B-tree;
+- closed — закрытые месяцы, которые читают только отчёты: один BRIN по date.
+
+При BOOKING_COMPACT_TIME горячие B-tree строятся по минутам суток
+(start_minute, end_minute) вместо time (booking.compact_time).
+
+Профиль применяет менеджер партиций (booking.partitioning.manager) после
+создания партиций и ежедневная задача partition_manager.
+"""
+
+import datetime
+import re
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import connections
+
+from booking.models import Booking
+
+HOT = "hot"
+CLOSED = "closed"
+
+# суффикс имени индекса партиции -> (метод, колонки)
+PARTITION_INDEXES = {
+    "room_date_time": ("btree", ["room_id", "date", "start_time", "end_time"]),
+    "user_date_time": ("btree", ["user_id", "date", "start_time", "end_time"]),
+    "date_start_end_room": ("btree", ["date", "start_time", "end_time", "room_id"]),
+    "date_brin": ("brin", ["date"]),
+    "room_date_minutes": (
+        "btree",
+        ["room_id", "date", "start_minute", "end_minute"],
+    ),
+    "user_date_minutes": (
+        "btree",
+        ["user_id", "date", "start_minute", "end_minute"],
+    ),
+    "date_minutes_room": (
+        "btree",
+        ["date", "start_minute", "end_minute", "room_id"],
+    ),
+}
+
+PROFILES = {
+    HOT: ["room_date_time", "user_date_time", "date_start_end_room"],
+    CLOSED: ["date_brin"],
+}
+
+# горячий профиль при BOOKING_COMPACT_TIME
+COMPACT_HOT = ["room_date_minutes", "user_date_minutes", "date_minutes_room"]
+
+PARTITIONS_SQL = """
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = %s::regclass
+    ORDER BY c.relname
+"""
+
+UPPER_BOUND = re.compile(r"TO \('(\d{4}-\d{2}-\d{2})'\)")
+
+
+def index_name(partition, suffix):
+    return f"{partition}_{suffix}"
+
+
+def profile_indexes(profile):
+    """Суффиксы индексов профиля с учётом BOOKING_COMPACT_TIME."""
+    if profile == HOT and settings.BOOKING_COMPACT_TIME:
+        return COMPACT_HOT
+    return PROFILES[profile]
+
+
+def cluster_suffix():
+    """Индекс горячей партиции, по которому её упорядочивает CLUSTER."""
+    return profile_indexes(HOT)[2]
+
+
+def partition_profile(bound, today=None):
+    """Профиль партиции по выражению границ (pg_get_expr(relpartbound))."""
+    match = UPPER_BOUND.search(bound or "")
+    if match is None:
+        # DEFAULT-партиция принимает любые даты
+        return HOT
+    upper = datetime.date.fromisoformat(match.group(1))
+    month_start = (today or datetime.date.today()).replace(day=1)
+    grace = relativedelta(months=settings.BOOKING_PARTITION_GRACE_MONTHS)
+    return CLOSED if upper + grace <= month_start else HOT
+
+
+def booking_partitions(using="default", today=None):
+    """[(имя партиции, границы, профиль), ...]"""
+    with connections[using].cursor() as cursor:
+        cursor.execute(PARTITIONS_SQL, [Booking._meta.db_table])
+        rows = cursor.fetchall()
+    return [(name, bound, partition_profile(bound, today)) for name, bound in rows]
+
+
+def index_statement(table, suffix, connection):
+    method, columns = PARTITION_INDEXES[suffix]
+    quote = connection.ops.quote_name
+    return "CREATE INDEX IF NOT EXISTS {} ON {} USING {} ({})".format(
+        quote(index_name(table, suffix)),
+        quote(table),
+        method,
+        ", ".join(quote(column) for column in columns),
+    )
+
+
+def existing_indexes(partition, using="default"):
+    """Суффиксы профильных индексов, уже созданных на партиции."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE tablename = %s", [partition]
+        )
+        names = {row[0] for row in cursor.fetchall()}
+    return {
+        suffix for suffix in PARTITION_INDEXES if index_name(partition, suffix) in names
+    }
+
+
+def apply_index_profiles(using="default", today=None):
+    """
+    Приводит индексы каждой партиции к её профилю: сначала создаёт
+    недостающие, затем удаляет лишние. Возвращает {партиция: профиль}
+    для изменённых партиций.
+    """
+    connection = connections[using]
+    changed = {}
+    for partition, _, profile in booking_partitions(using, today):
+        wanted = set(profile_indexes(profile))
+        present = existing_indexes(partition, using)
+        if wanted == present:
+            continue
+        with connection.cursor() as cursor:
+            for suffix in profile_indexes(profile):
+                if suffix not in present:
+                    cursor.execute(index_statement(partition, suffix, connection))
+            for suffix in sorted(present - wanted):
+                cursor.execute(
+                    "DROP INDEX IF EXISTS "
+                    + connection.ops.quote_name(index_name(partition, suffix))
+                )
+        changed[partition] = profile
+    return changed
@@ -5,11 +5,28 @@ from psqlextra.partitioning import (
     PostgresTimePartitionSize,
 )
 from psqlextra.partitioning.config import PostgresPartitioningConfig
+from psqlextra.partitioning.plan import PostgresPartitioningPlan
 
 from booking.models import Booking
 
+from .indexes import apply_index_profiles
+
+
+class IndexProfilePlan(PostgresPartitioningPlan):
+    """План pgpartition, после создания партиций применяющий профили индексов."""
+
+    def apply(self, using=None):
+        super().apply(using=using)
+        apply_index_profiles(using=using or "default")
+
+
+class AgeAwarePartitioningManager(PostgresPartitioningManager):
+    def plan(self, *args, **kwargs):
+        return IndexProfilePlan(super().plan(*args, **kwargs).model_plans)
+
+
 # модель Booking должна быть импортируема!
-manager = PostgresPartitioningManager(
+manager = AgeAwarePartitioningManager(
     [
         PostgresPartitioningConfig(
             model=Booking,
@@ -0,0 +1,134 @@
+"""
+Ограничение одновременного хэширования паролей и дешёвая проверка паролей.
+
+PBKDF2 с сотнями тысяч итераций — самая дорогая часть регистрации и входа,
+и всё это время он занимает поток воркера. BoundedPBKDF2PasswordHasher
+хэширует, только заняв один из PASSWORD_HASH_SLOTS слотов в кэше
+THROTTLE_CACHE_ALIAS; свободного слота нет — хэшер сразу бросает
+PasswordHashingBusy, не начиная хэширования. Запросы API получают на это 503
+с Retry-After (booking.failover.exception_handler); admin, createsuperuser и
+прочий код вне DRF получают само исключение. Волна регистраций занимает не
+больше PASSWORD_HASH_SLOTS потоков и не вытесняет запросы броней.
+
+Лимит общий для всех процессов только с общим кэшем (Redis, Memcached); с
+LocMemCache он действует на процесс, о чём при DEBUG=False предупреждает
+проверка booking.W001. Слот упавшего процесса освобождается через
+PASSWORD_HASH_SLOT_TIMEOUT секунд.
+
+Число итераций задаётся PASSWORD_HASH_ITERATIONS; хэши с другим числом
+итераций Django пересчитывает при следующем успешном входе.
+"""
+
+import functools
+import gzip
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import hashers, password_validation
+from django.core.cache import caches
+from django.core.checks import Warning, register
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+LOCMEM_CACHE = "django.core.cache.backends.locmem.LocMemCache"
+
+
+class PasswordHashingBusy(Exception):
+    """Все слоты хэширования заняты."""
+
+
+class PasswordHashingUnavailable(APIException):
+    """Ответ API на PasswordHashingBusy."""
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many sign-ins in progress, retry later."
+    default_code = "password_hashing_busy"
+
+    def __init__(self):
+        super().__init__()
+        # DRF выставляет Retry-After по этому атрибуту
+        self.wait = settings.BOOKING_OVERLOAD_RETRY_AFTER
+
+
+@register()
+def check_shared_slot_cache(app_configs, **kwargs):
+    """Слоты хэширования в LocMemCache ограничивают только свой процесс."""
+    backend = settings.CACHES[settings.THROTTLE_CACHE_ALIAS]["BACKEND"]
+    if settings.DEBUG or backend != LOCMEM_CACHE:
+        return []
+    return [
+        Warning(
+            "PASSWORD_HASH_SLOTS is enforced per process: the throttle cache "
+            "is LocMemCache.",
+            hint="Set THROTTLE_CACHE_BACKEND to a shared cache (e.g. Redis).",
+            id="booking.W001",
+        )
+    ]
+
+
+def _cache():
+    return caches[settings.THROTTLE_CACHE_ALIAS]
+
+
+def _slot_key(slot):
+    return f"password-hash-slot:{slot}"
+
+
+def _acquire():
+    """Номер и метка занятого слота; свободного нет — PasswordHashingBusy."""
+    token = uuid.uuid4().hex
+    for slot in range(settings.PASSWORD_HASH_SLOTS):
+        if _cache().add(
+            _slot_key(slot), token, timeout=settings.PASSWORD_HASH_SLOT_TIMEOUT
+        ):
+            return slot, token
+    raise PasswordHashingBusy(
+        f"All {settings.PASSWORD_HASH_SLOTS} password hashing slots are busy."
+    )
+
+
+def _release(slot, token):
+    # слот, истёкший и занятый другим процессом, не трогаем
+    if _cache().get(_slot_key(slot)) == token:
+        _cache().delete(_slot_key(slot))
+
+
+def run_bounded(func, *args):
+    """Выполняет func(*args), заняв слот хэширования, или сразу отказывает."""
+    slot, token = _acquire()
+    try:
+        return func(*args)
+    finally:
+        _release(slot, token)
+
+
+class BoundedPBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 с числом итераций из настроек и ограничением одновременных
+    вычислений. Имя алгоритма то же, что у PBKDF2PasswordHasher: существующие
+    хэши проверяются без миграции.
+    """
+
+    iterations = settings.PASSWORD_HASH_ITERATIONS
+
+    def encode(self, password, salt, iterations=None):
+        # verify() и harden_runtime() тоже вызывают encode()
+        return run_bounded(super().encode, password, salt, iterations)
+
+
+@functools.lru_cache(maxsize=None)
+def _common_passwords(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return frozenset(line.strip() for line in f)
+
+
+class CommonPasswordValidator(password_validation.CommonPasswordValidator):
+    """
+    Список из 20 000 распространённых паролей распаковывается один раз на
+    процесс, а не в каждом экземпляре валидатора, и хранится как frozenset.
+    """
+
+    def __init__(self, password_list_path=None):
+        self.passwords = _common_passwords(
+            str(password_list_path or self.DEFAULT_PASSWORD_LIST_PATH)
+        )
@@ -0,0 +1,108 @@
+"""
+Удаление броней комнаты или пользователя без загрузки их в память.
+
+Django-каскад (on_delete=CASCADE) выбирает все связанные брони по всем
+партициям и удаляет их пачками из Python — на загруженной комнате это
+съедало память воркера. Вместо этого брони удаляются прямо в БД: по каждой
+партиции отдельно, пачками по BOOKING_DELETE_CHUNK_SIZE строк, каждая пачка —
+своя короткая транзакция (блокировки и WAL ограничены пачкой). Поэтому
+удаление запускается после коммита транзакции, выключившей комнату или
+удалившей пользователя (transaction.on_commit): внутри неё пачки были бы
+лишь точками сохранения одной длинной транзакции.
+
+Удаление комнаты (API и админка) сразу выключает её (Room.is_active):
+free_rooms её больше не предлагает, новые брони в неё не проходят. Брони и
+сама комната удаляются сразу или, при BOOKING_PURGE_IN_BACKGROUND, задачей
+очереди (booking.jobs). Tombstone для синхронизации пишет триггер удаления.
+"""
+
+import functools
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .jobs import enqueue, job
+from .models import Room
+from .partitioning.indexes import booking_partitions
+from .sharding import booking_databases, db_for_room
+
+# ctid = ANY(ARRAY(...)) — TID Scan по найденным строкам пачки
+DELETE_CHUNK_SQL = """
+    DELETE FROM {partition}
+    WHERE ctid = ANY(ARRAY(
+        SELECT ctid FROM {partition} WHERE {column} = %s LIMIT %s
+    ))
+"""
+
+PURGE_COLUMNS = ("room_id", "user_id")
+
+
+def delete_bookings(column, value, using="default"):
+    """
+    Удаляет брони с column = value в БД using по партициям пачками.
+    Возвращает число удалённых строк.
+    """
+    if column not in PURGE_COLUMNS:
+        raise ValueError(f"Unsupported column {column!r}")
+    chunk = settings.BOOKING_DELETE_CHUNK_SIZE
+    deleted = 0
+    for partition, _, _ in booking_partitions(using):
+        sql = DELETE_CHUNK_SQL.format(
+            partition=connections[using].ops.quote_name(partition), column=column
+        )
+        while True:
+            with transaction.atomic(using=using):
+                with connections[using].cursor() as cursor:
+                    cursor.execute(sql, [value, chunk])
+                    count = cursor.rowcount
+            deleted += count
+            if count < chunk:
+                break
+    return deleted
+
+
+@job("rooms.purge")
+def purge_room(room_id):
+    """Удаляет брони комнаты пачками, затем саму комнату."""
+    delete_bookings("room_id", room_id, using=db_for_room(room_id))
+    # агрегаты загрузки удаляются одним DELETE, копия в БД площадки —
+    # сигналом booking.sharding
+    Room.objects.filter(pk=room_id).delete()
+
+
+@job("users.purge_bookings")
+def purge_user_bookings(user_id):
+    for alias in booking_databases():
+        delete_bookings("user_id", user_id, using=alias)
+
+
+def retire_room(room):
+    """
+    Удаление комнаты: выключает её сразу, брони и комнату удаляет сразу или
+    в фоне (BOOKING_PURGE_IN_BACKGROUND).
+    """
+    room.is_active = False
+    room.save(update_fields=["is_active"])
+    if settings.BOOKING_PURGE_IN_BACKGROUND:
+        # задача появится в очереди вместе с коммитом выключения
+        enqueue("rooms.purge", unique=True, room_id=room.pk)
+    else:
+        transaction.on_commit(functools.partial(purge_room, room.pk))
+
+
+@receiver(post_delete, sender=get_user_model())
+def purge_deleted_user(sender, instance, using, **kwargs):
+    """
+    CASCADE по пользователю: брони во всех БД (внешнего ключа в БД нет).
+    Сигнал приходит внутри транзакции User.delete(); пачки удаляются после
+    её коммита.
+    """
+    if settings.BOOKING_PURGE_IN_BACKGROUND:
+        enqueue("users.purge_bookings", user_id=instance.pk)
+    else:
+        transaction.on_commit(
+            functools.partial(purge_user_bookings, instance.pk), using=using
+        )
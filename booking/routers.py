@@ -1,11 +1,19 @@
 import sys
 
+from django.conf import settings
+
+from .failover import primary_available
+from .sharding import db_for_room, is_sharded
+
 # считаем, что мы в тестах, если в sys.argv есть pytest
 TESTING = any("pytest" in arg for arg in sys.argv)
 
 
 class ReadReplicaRouter:
     def db_for_read(self, model, **hints):
+        # мастер недоступен — все чтения с реплики (booking.failover)
+        if not primary_available():
+            return "replica"
         # в тестах — всё на default
         if any("pytest" in arg for arg in sys.argv):
             return "default"
@@ -26,3 +34,31 @@ class ReadReplicaRouter:
     def allow_migrate(self, db, app_label, model_name=None, **hints):
         # миграции только на мастере
         return db == "default"
+
+
+class SiteShardRouter(ReadReplicaRouter):
+    """
+    Брони комнаты площадки — в БД этой площадки (booking.sharding). Площадку
+    определяют хинты instance (бронь) или room (id комнаты); без них
+    решает ReadReplicaRouter.
+    """
+
+    def _site_db(self, model, hints):
+        if model._meta.model_name != "booking" or not is_sharded():
+            return None
+        if "room" in hints:
+            return db_for_room(hints["room"])
+        instance = hints.get("instance")
+        if instance is not None and hasattr(instance, "room_id"):
+            return db_for_room(instance.room_id)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._site_db(model, hints) or super().db_for_read(model, **hints)
+
+    def db_for_write(self, model, **hints):
+        return self._site_db(model, hints) or super().db_for_write(model, **hints)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # БД площадок получают полную схему (manage.py migrate_sites)
+        return db == "default" or db in settings.BOOKING_SITE_DATABASES.values()
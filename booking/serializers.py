@@ -1,7 +1,26 @@
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
 
-from .models import Room, Booking
+from .models import Room, Booking, RoomDailyUsage, FloorDailyPeak
+from .services import create_booking, update_booking
+
+
+class RoomPrimaryKeyField(serializers.PrimaryKeyRelatedField):
+    """
+    PK комнаты без запроса Room: существование комнаты проверяется
+    в том же запросе, что и пересечения (см. booking.services).
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
 
 
 class RoomSerializer(serializers.ModelSerializer):
@@ -14,6 +33,71 @@ class RoomSerializer(serializers.ModelSerializer):
         fields = "__all__"
         read_only_fields = ["id"]
 
+    def validate_site(self, value):
+        # брони хранятся в БД площадки (booking.sharding) и между базами
+        # не переносятся
+        if self.instance is not None and value != self.instance.site:
+            raise serializers.ValidationError("Room site cannot be changed.")
+        return value
+
+
+# Поля пользователя в ?expand=user (без хэша пароля и прочих колонок auth_user)
+BOOKING_USER_FIELDS = ["id", "username", "email"]
+
+
+class BookingUserSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = BOOKING_USER_FIELDS
+
+
+EXPANDABLE_FIELDS = {"room": RoomSerializer, "user": BookingUserSerializer}
+
+
+class FreeSlotSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    start_time = serializers.TimeField()
+    end_time = serializers.TimeField()
+    floor = serializers.IntegerField(required=False, help_text="Floor number")
+    capacity = serializers.IntegerField(
+        required=False, min_value=0, help_text="Minimum capacity"
+    )
+
+    def validate(self, data):
+        if data["start_time"] >= data["end_time"]:
+            raise serializers.ValidationError("Start time must be before end time.")
+        return data
+
+
+class SlotHoldSerializer(serializers.Serializer):
+    """Удержание слота (booking.holds)."""
+
+    id = serializers.CharField(read_only=True, help_text="Hold ID for confirm")
+    room = serializers.IntegerField(
+        source="room_id", help_text="ID of the room to hold"
+    )
+    date = serializers.DateField()
+    start_time = serializers.TimeField(format="%H:%M:%S")
+    end_time = serializers.TimeField(format="%H:%M:%S")
+    expires_at = serializers.DateTimeField(read_only=True, help_text="Hold expiry time")
+
+    def validate(self, data):
+        if data["start_time"] >= data["end_time"]:
+            raise serializers.ValidationError("Start time must be before end time.")
+        return data
+
+
+class FreeRoomsBatchSerializer(serializers.Serializer):
+    slots = FreeSlotSerializer(
+        many=True,
+        allow_empty=False,
+        max_length=settings.BOOKING_FREE_ROOMS_BATCH_MAX,
+    )
+
+
+class FreeRoomsBatchResultSerializer(serializers.Serializer):
+    rooms = RoomSerializer(many=True, help_text="Free rooms for the slot")
+
 
 class BookingSerializer(serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(
@@ -21,7 +105,7 @@ class BookingSerializer(serializers.ModelSerializer):
         default=serializers.CurrentUserDefault(),
         help_text="ID of the user who created the booking",
     )
-    room = serializers.PrimaryKeyRelatedField(
+    room = RoomPrimaryKeyField(
         queryset=Room.objects.all(), help_text="ID of the room to book"
     )
     date = serializers.DateField(help_text="Booking date (YYYY-MM-DD)")
@@ -32,26 +116,60 @@ class BookingSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Booking
-        fields = "__all__"
+        # служебные поля синхронизации (booking.sync) и компактного времени
+        # (booking.compact_time) в API не отдаются
+        exclude = ["version", "txid", "updated_at", "start_minute", "end_minute"]
         read_only_fields = ["id"]
+        # unique_together покрывается проверкой пересечений в booking.services
+        validators = []
 
-    def validate(self, data):
-        # При частичном обновлении подставляем отсутствующие поля из instance
-        if self.instance:
-            for field in self.instance._meta.fields:
-                name = field.name
-                if name not in data:
-                    data[name] = getattr(self.instance, name)
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # ?expand=room,user: вместо id — объект, заранее загруженный
+        # prefetch_related в BookingViewSet.get_queryset
+        for name in self.context.get("expand", ()):
+            data[name] = EXPANDABLE_FIELDS[name](getattr(instance, name)).data
+        return data
 
+    def validate(self, data):
+        # Проверки с БД (комната, пересечения) выполняются при записи одним
+        # запросом; здесь — только интервал, недостающие поля берём из instance
         data.pop("user", None)
-        user = self.context["request"].user
-        booking = Booking(user=user, **data)
-        if self.instance:
-            booking.pk = self.instance.pk
-
-        booking.clean()
+        start_time = data.get("start_time", getattr(self.instance, "start_time", None))
+        end_time = data.get("end_time", getattr(self.instance, "end_time", None))
+        if start_time >= end_time:
+            raise serializers.ValidationError("Start time must be before end time.")
         return data
 
+    def create(self, validated_data):
+        return create_booking(**validated_data)
+
+    def update(self, instance, validated_data):
+        return update_booking(instance, **validated_data)
+
+
+class BookingSyncSerializer(serializers.Serializer):
+    results = BookingSerializer(many=True)
+    deleted = serializers.ListField(
+        child=serializers.IntegerField(), help_text="IDs of removed bookings"
+    )
+    next = serializers.CharField(help_text="Token for the next ?since= request")
+    has_more = serializers.BooleanField(
+        help_text="More changes are available with the 'next' token"
+    )
+
+
+class RoomDailyUsageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RoomDailyUsage
+        fields = ["room", "date", "minutes_booked", "bookings"]
+
+
+class FloorDailyPeakSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FloorDailyPeak
+        fields = ["floor", "date", "peak_concurrency"]
+
 
 class RegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -60,6 +178,16 @@ class RegistrationSerializer(serializers.ModelSerializer):
         model = User
         fields = ("id", "username", "email", "password")
 
+    def validate(self, attrs):
+        # валидаторы AUTH_PASSWORD_VALIDATORS дешёвые (booking.passwords),
+        # дорогое хэширование — только для прошедших проверку паролей
+        user = User(username=attrs.get("username"), email=attrs.get("email", ""))
+        try:
+            validate_password(attrs["password"], user)
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError({"password": list(exc.messages)})
+        return attrs
+
     def create(self, validated_data):
         return User.objects.create_user(
             username=validated_data["username"],
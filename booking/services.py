@@ -0,0 +1,308 @@
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connections, router, transaction
+from django.http import Http404
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+
+from .compact_time import end_minute, minutes_sql, overlap_q, start_minute
+from .models import Room, Booking, BookingEvent
+from .sharding import booking_databases, fan_out
+
+ROOM_CONFLICT_MESSAGE = "This booking conflicts with an existing booking in this room."
+USER_CONFLICT_MESSAGE = (
+    "You already have another booking at this time in a different room."
+)
+OTHER_SITE_MESSAGE = "A booking cannot be moved to a room on another site."
+
+# SQLSTATE lock_not_available: истёк lock_timeout
+LOCK_NOT_AVAILABLE = "55P03"
+
+RETURNING_FIELDS = [
+    "id",
+    "user_id",
+    "room_id",
+    "date",
+    "start_time",
+    "end_time",
+    "start_minute",
+    "end_minute",
+    "version",
+    "txid",
+    "updated_at",
+]
+
+# Проверка комнаты и обоих пересечений (те же условия, что в Booking.clean)
+# одним CTE; строка комнаты блокируется FOR KEY SHARE до конца транзакции,
+# чтобы её не удалили между проверкой и записью.
+CHECKS_SQL = """
+    room AS (
+        SELECT id FROM {room_table}
+        WHERE id = %(room)s AND is_active
+        FOR KEY SHARE
+    ),
+    checks AS (
+        SELECT
+            EXISTS (SELECT 1 FROM room) AS room_exists,
+            EXISTS (
+                SELECT 1 FROM {booking_table}
+                WHERE room_id = %(room)s
+                  AND date = %(date)s
+                  AND start_time < %(end_time)s
+                  AND end_time > %(start_time)s
+                  {minutes}
+                  AND id IS DISTINCT FROM %(pk)s
+            ) AS room_conflict,
+            EXISTS (
+                SELECT 1 FROM {booking_table}
+                WHERE user_id = %(user)s
+                  AND date = %(date)s
+                  AND start_time < %(end_time)s
+                  AND end_time > %(start_time)s
+                  {minutes}
+                  AND id IS DISTINCT FROM %(pk)s
+            ) AS user_conflict
+    )
+"""
+
+INSERT_SQL = "WITH" + CHECKS_SQL + """,
+    written AS (
+        INSERT INTO {booking_table} (user_id, room_id, date, start_time, end_time)
+        SELECT %(user)s, %(room)s, %(date)s, %(start_time)s, %(end_time)s
+        FROM checks
+        WHERE room_exists AND NOT room_conflict AND NOT user_conflict
+        RETURNING {returning}
+    ),
+    {events}
+SELECT checks.room_exists, checks.room_conflict, checks.user_conflict, written.*
+FROM checks LEFT JOIN written ON TRUE
+"""
+
+# old_date в условии UPDATE отсекает лишние партиции (PK партиционированной
+# таблицы — (id, date)); смена даты переносит строку в нужную партицию.
+UPDATE_SQL = "WITH" + CHECKS_SQL + """,
+    written AS (
+        UPDATE {booking_table}
+        SET room_id = %(room)s,
+            date = %(date)s,
+            start_time = %(start_time)s,
+            end_time = %(end_time)s
+        FROM checks
+        WHERE id = %(pk)s
+          AND date = %(old_date)s
+          AND room_exists AND NOT room_conflict AND NOT user_conflict
+        RETURNING {returning}
+    ),
+    {events}
+SELECT checks.room_exists, checks.room_conflict, checks.user_conflict, written.*
+FROM checks LEFT JOIN written ON TRUE
+"""
+
+
+# Запись события в журнал BookingEvent тем же запросом, что и сама бронь.
+EVENTS_SQL = """events AS (
+        INSERT INTO {event_table}
+            (booking_id, action, user_id, room_id, date, start_time, end_time,
+             txid, created_at)
+        SELECT id, %(action)s, user_id, room_id, date, start_time, end_time,
+               pg_current_xact_id()::text::bigint, now()
+        FROM written
+    )"""
+
+DELETE_SQL = """
+WITH written AS (
+    DELETE FROM {booking_table}
+    WHERE id = %(pk)s AND date = %(date)s
+    RETURNING {returning}
+),
+{events}
+SELECT COUNT(*) FROM written
+"""
+
+
+class BookingLockTimeout(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "This room is being booked right now, please retry."
+    default_code = "booking_lock_timeout"
+
+
+def _format_sql(sql):
+    return sql.format(
+        room_table=Room._meta.db_table,
+        booking_table=Booking._meta.db_table,
+        returning=", ".join(RETURNING_FIELDS),
+        events=EVENTS_SQL.format(event_table=BookingEvent._meta.db_table),
+        minutes=minutes_sql("%(start_minute)s", "%(end_minute)s"),
+    )
+
+
+def _room_pk(room):
+    return room.pk if isinstance(room, Room) else room
+
+
+def _lock_room(cursor, room_id, date):
+    """
+    Записи в одну комнату выполняются по очереди: строка комнаты блокируется
+    FOR NO KEY UPDATE, а при BOOKING_ROOM_LOCKS — только (room_id, date)
+    транзакционным advisory lock. Блокировка берётся отдельным запросом до
+    записи: в READ COMMITTED снимок запроса записи создаётся после ожидания,
+    и проверка пересечений видит уже закоммиченную бронь победителя (FOR KEY
+    SHARE внутри CTE не мешает параллельным записям и видит старый снимок).
+    Ожидание ограничено BOOKING_ROOM_LOCK_TIMEOUT_MS до конца транзакции;
+    по таймауту — HTTP 409 (см. _execute_write).
+    """
+    cursor.execute(
+        "SELECT set_config('lock_timeout', %s, true)",
+        [f"{settings.BOOKING_ROOM_LOCK_TIMEOUT_MS}ms"],
+    )
+    if settings.BOOKING_ROOM_LOCKS:
+        # двухключевая форма (int4, int4) не пересекается с bigint-ключами
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(%s, %s)", [room_id, date.toordinal()]
+        )
+    else:
+        cursor.execute(
+            f"SELECT 1 FROM {Room._meta.db_table} WHERE id = %s FOR NO KEY UPDATE",
+            [room_id],
+        )
+
+
+def _user_conflict_on_other_sites(alias, params):
+    """
+    Пересечения по пользователю в БД других площадок. Проверка в запросе
+    записи видит только свою БД; без шардирования других БД нет.
+    """
+    return any(
+        fan_out(
+            lambda db: Booking.objects.using(db)
+            .filter(
+                overlap_q(params["start_time"], params["end_time"]),
+                user_id=params["user"],
+                date=params["date"],
+            )
+            .exclude(pk=params["pk"])
+            .exists(),
+            [db for db in booking_databases() if db != alias],
+        )
+    )
+
+
+def _execute_write(sql, params):
+    """
+    Выполняет проверку + запись одним запросом и возвращает записанную строку
+    как экземпляр Booking. Конфликты превращаются в ValidationError (HTTP 400).
+    Запросу предшествует блокировка комнаты (_lock_room).
+    """
+    # БД площадки комнаты (booking.sharding)
+    alias = router.db_for_write(Booking, room=params["room"])
+    if _user_conflict_on_other_sites(alias, params):
+        raise serializers.ValidationError(
+            {api_settings.NON_FIELD_ERRORS_KEY: [USER_CONFLICT_MESSAGE]}
+        )
+    sql = _format_sql(sql)
+    params = {
+        **params,
+        "start_minute": start_minute(params["start_time"]),
+        "end_minute": end_minute(params["end_time"]),
+    }
+    try:
+        with transaction.atomic(using=alias):
+            with connections[alias].cursor() as cursor:
+                _lock_room(cursor, params["room"], params["date"])
+                cursor.execute(sql, params)
+                row = cursor.fetchone()
+    except IntegrityError:
+        # гонка с параллельной записью ровно того же слота (unique_together)
+        raise serializers.ValidationError(
+            {api_settings.NON_FIELD_ERRORS_KEY: [ROOM_CONFLICT_MESSAGE]}
+        )
+    except OperationalError as exc:
+        # истёк lock_timeout: блокировка комнаты (_lock_room) или FOR KEY
+        # SHARE строки комнаты, которую выключают или удаляют
+        if getattr(exc.__cause__, "pgcode", None) == LOCK_NOT_AVAILABLE:
+            raise BookingLockTimeout()
+        raise
+
+    room_exists, room_conflict, user_conflict, *values = row
+    if not room_exists:
+        raise serializers.ValidationError(
+            {
+                "room": [
+                    serializers.PrimaryKeyRelatedField.default_error_messages[
+                        "does_not_exist"
+                    ].format(pk_value=params["room"])
+                ]
+            }
+        )
+    if room_conflict:
+        raise serializers.ValidationError(
+            {api_settings.NON_FIELD_ERRORS_KEY: [ROOM_CONFLICT_MESSAGE]}
+        )
+    if user_conflict:
+        raise serializers.ValidationError(
+            {api_settings.NON_FIELD_ERRORS_KEY: [USER_CONFLICT_MESSAGE]}
+        )
+    if values[0] is None:
+        # UPDATE не нашёл строку (бронь удалили параллельно)
+        raise Http404("No Booking matches the given query.")
+    return Booking.from_db(alias, RETURNING_FIELDS, values)
+
+
+def create_booking(user, room, date, start_time, end_time):
+    """
+    Создаёт бронь за один запрос: проверка комнаты, пересечений по комнате и
+    по пользователю и INSERT ... RETURNING в одной транзакции.
+    """
+    return _execute_write(
+        INSERT_SQL,
+        {
+            "action": BookingEvent.CREATED,
+            "pk": None,
+            "user": user.pk,
+            "room": _room_pk(room),
+            "date": date,
+            "start_time": start_time,
+            "end_time": end_time,
+        },
+    )
+
+
+def update_booking(instance, **changes):
+    """
+    Обновляет бронь за один запрос; отсутствующие в changes поля берутся из
+    уже загруженного instance.
+    """
+    values = {
+        "room": _room_pk(changes.get("room", instance.room_id)),
+        "date": changes.get("date", instance.date),
+        "start_time": changes.get("start_time", instance.start_time),
+        "end_time": changes.get("end_time", instance.end_time),
+    }
+    if router.db_for_write(Booking, room=values["room"]) != router.db_for_write(
+        Booking, instance=instance
+    ):
+        raise serializers.ValidationError({"room": [OTHER_SITE_MESSAGE]})
+    booking = _execute_write(
+        UPDATE_SQL,
+        {
+            "action": BookingEvent.UPDATED,
+            "pk": instance.pk,
+            "old_date": instance.date,
+            "user": instance.user_id,
+            **values,
+        },
+    )
+    # обновляем переданный instance, как это делает ModelSerializer.update
+    for field in RETURNING_FIELDS:
+        setattr(instance, field, getattr(booking, field))
+    return instance
+
+
+def delete_booking(instance):
+    """Удаляет бронь (с отсечением партиций по date) и пишет событие в журнал."""
+    alias = router.db_for_write(Booking, instance=instance)
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            _format_sql(DELETE_SQL),
+            {"action": BookingEvent.DELETED, "pk": instance.pk, "date": instance.date},
+        )
@@ -0,0 +1,208 @@
+"""
+Шардирование броней по площадкам (офисам).
+
+Комната принадлежит площадке (Room.site), брони комнаты хранятся в БД
+площадки из BOOKING_SITE_DATABASES (alias site_<site>), остальные — в
+default. Каталог комнат и пользователи остаются в default; комнаты площадки
+копируются в её БД (проверка комнаты при записи брони и агрегаты работают
+внутри одной базы).
+
+- запись и чтение брони комнаты идут только в БД её площадки
+  (SiteShardRouter, booking.services);
+- id броней площадки начинаются с её смещения (site_id_offset), поэтому
+  бронь по id ищется сразу в нужной БД; совпадение смещений двух площадок
+  — ошибка проверки booking.E001 (manage.py check, migrate);
+- список броней без ?site= опрашивает все БД параллельно и сливает страницы
+  в порядке курсорной пагинации (ShardedQuerySet), свободные комнаты
+  проверяются по всем БД.
+
+Отчёты (booking.usage), лента изменений (booking.events) и синхронизация
+(booking.sync) читают все БД (booking_databases) и хранят позицию клиента
+для каждой из них.
+
+Перенос комнаты на другую площадку не поддерживается: брони пришлось бы
+переносить между базами.
+"""
+
+import heapq
+import itertools
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.checks import Error, register
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .failover import read_db
+from .models import Room
+
+# site комнаты не меняется, поэтому кэш на процесс не устаревает
+_room_sites = {}
+
+# блок id броней на площадку; последовательность id в БД площадки начинается
+# со смещения площадки (manage.py migrate_sites)
+SITE_ID_BLOCK = 2**40
+
+
+def is_sharded():
+    return bool(settings.BOOKING_SITE_DATABASES)
+
+
+def site_db(site):
+    return settings.BOOKING_SITE_DATABASES.get(site, "default")
+
+
+def booking_databases():
+    """Все БД с бронями: default и БД площадок."""
+    return ["default", *sorted(set(settings.BOOKING_SITE_DATABASES.values()))]
+
+
+def site_id_offset(site):
+    # не зависит от порядка и числа площадок; 2**20 блоков помещаются в bigint
+    return (zlib.crc32(site.encode()) % 2**20 + 1) * SITE_ID_BLOCK
+
+
+@register()
+def check_site_id_offsets(app_configs, **kwargs):
+    """Смещения id площадок не совпадают (crc32 имени может совпасть)."""
+    errors = []
+    sites = {}
+    for site in sorted(settings.BOOKING_SITE_DATABASES):
+        other = sites.setdefault(site_id_offset(site), site)
+        if other != site:
+            errors.append(
+                Error(
+                    f"Sites {other!r} and {site!r} have the same booking id "
+                    "offset, their booking ids would collide.",
+                    hint="Choose another name for one of the sites.",
+                    id="booking.E001",
+                )
+            )
+    return errors
+
+
+def db_for_booking_id(pk):
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return "default"
+    for site, alias in settings.BOOKING_SITE_DATABASES.items():
+        if site_id_offset(site) <= pk < site_id_offset(site) + SITE_ID_BLOCK:
+            return alias
+    return "default"
+
+
+def db_for_room(room_id):
+    if not is_sharded():
+        return "default"
+    if room_id not in _room_sites:
+        site = (
+            Room.objects.using(read_db())
+            .filter(pk=room_id)
+            .values_list("site", flat=True)
+            .first()
+        )
+        if site is None:
+            # неизвестная комната: запрос в default сообщит об этом сам
+            return "default"
+        _room_sites[room_id] = site
+    return site_db(_room_sites[room_id])
+
+
+def fan_out(func, databases):
+    """
+    func(alias) для каждой БД; разные базы опрашиваются параллельно. Потоки
+    закрывают свои соединения — они живут только на время запроса.
+    """
+    if len(set(databases)) < 2:
+        return [func(alias) for alias in databases]
+
+    def call(alias):
+        try:
+            return func(alias)
+        finally:
+            connections[alias].close()
+
+    with ThreadPoolExecutor(max_workers=len(databases)) as executor:
+        return list(executor.map(call, databases))
+
+
+class ShardedQuerySet:
+    """
+    Брони из нескольких БД с тем подмножеством QuerySet, которое использует
+    CursorPagination: order_by, filter и срез. Для среза [a:b] из каждой базы
+    берутся первые b строк в том же порядке и сливаются heapq.merge —
+    страница совпадает с той, что вернула бы одна общая таблица.
+    """
+
+    def __init__(self, querysets, ordering=()):
+        self.querysets = list(querysets)
+        self.ordering = list(ordering)
+        self.model = self.querysets[0].model
+
+    def _clone(self, querysets, ordering=None):
+        return ShardedQuerySet(
+            querysets, self.ordering if ordering is None else ordering
+        )
+
+    def order_by(self, *fields):
+        return self._clone([qs.order_by(*fields) for qs in self.querysets], fields)
+
+    def filter(self, *args, **kwargs):
+        return self._clone([qs.filter(*args, **kwargs) for qs in self.querysets])
+
+    def __getitem__(self, k):
+        if not isinstance(k, slice) or k.step is not None:
+            raise TypeError("ShardedQuerySet supports only slicing without step.")
+        start, stop = k.start or 0, k.stop
+        return list(itertools.islice(self._merge(self._fetch(stop)), start, stop))
+
+    def __iter__(self):
+        return iter(self[0:None])
+
+    def _fetch(self, stop):
+        databases = [qs.db for qs in self.querysets]
+        if len(set(databases)) == len(databases):
+            by_db = dict(zip(databases, self.querysets))
+            return fan_out(lambda alias: list(by_db[alias][:stop]), databases)
+        # несколько выборок из одной БД — последовательно
+        return [list(qs[:stop]) for qs in self.querysets]
+
+    def _merge(self, chunks):
+        names = [field.lstrip("-") for field in self.ordering]
+        descending = {field.startswith("-") for field in self.ordering}
+        if len(descending) > 1:
+            raise ValueError("Mixed ordering directions cannot be merged.")
+        return heapq.merge(
+            *chunks, key=attrgetter(*names), reverse=descending == {True}
+        )
+
+
+@receiver(post_save, sender=Room)
+def mirror_room(sender, instance, using, raw=False, **kwargs):
+    """Копирует комнату в БД её площадки."""
+    alias = site_db(instance.site)
+    if raw or using != "default" or alias == "default":
+        return
+    Room.objects.using(alias).update_or_create(
+        pk=instance.pk,
+        defaults={
+            "name": instance.name,
+            "capacity": instance.capacity,
+            "floor": instance.floor,
+            "site": instance.site,
+            "is_active": instance.is_active,
+        },
+    )
+
+
+@receiver(post_delete, sender=Room)
+def delete_room_mirror(sender, instance, using, **kwargs):
+    """Удаляет копию комнаты в БД площадки (брони — ON DELETE CASCADE)."""
+    _room_sites.pop(instance.pk, None)
+    alias = site_db(instance.site)
+    if using == "default" and alias != "default":
+        Room.objects.using(alias).filter(pk=instance.pk).delete()
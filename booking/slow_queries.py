@@ -0,0 +1,147 @@
+"""
+Журнал медленных запросов к БД.
+
+Обёртка выполнения (connection.execute_wrappers) ставится на каждое
+соединение при его создании и замеряет каждый запрос. Запрос дольше
+SLOW_QUERY_MS записывается в SlowQuery по отпечатку SQL (литералы, параметры
+и списки IN/VALUES схлопнуты) и БД: счётчик вызовов, суммарное/максимальное
+время, view или задача очереди, откуда он пришёл. Для доли
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE таких запросов на том же соединении сразу
+после выполнения снимается EXPLAIN (без ANALYZE — запрос не повторяется).
+
+Запись в default никогда не выполняется внутри транзакции вызывающего
+кода: иначе блокировка строки отпечатка держалась бы до её коммита и
+одинаковые медленные запросы параллельных запросов ждали бы друг друга.
+Если в default открыта транзакция, запись откладывается до её коммита
+(transaction.on_commit); запросы, откаченные вместе с транзакцией, в журнал
+не попадают. Ошибка записи не ломает запрос. Старые отпечатки удаляет
+задача slow_queries.prune (booking.cron).
+"""
+
+import functools
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+# view (или задача очереди), в рамках которого выполняются запросы;
+# выставляет booking.middleware.SlowQueryContextMiddleware
+current_view = ContextVar("slow_query_view", default="")
+
+# запросы самого журнала (EXPLAIN, запись SlowQuery) не замеряются
+_local = threading.local()
+
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+NORMALIZE = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s|%\(\w+\)s"), "?"),
+    # списки значений разной длины — один отпечаток
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(...)"),
+    (re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+"), "(...)"),
+    (re.compile(r"\s+"), " "),
+]
+
+UPSERT_SQL = """
+    INSERT INTO {table} AS t (
+        fingerprint, alias, sql, view, calls, total_ms, max_ms, last_ms,
+        plan, first_seen, last_seen
+    )
+    VALUES (%(fingerprint)s, %(alias)s, %(sql)s, %(view)s, 1, %(ms)s, %(ms)s,
+            %(ms)s, %(plan)s, now(), now())
+    ON CONFLICT (fingerprint, alias) DO UPDATE SET
+        calls = t.calls + 1,
+        total_ms = t.total_ms + EXCLUDED.total_ms,
+        max_ms = GREATEST(t.max_ms, EXCLUDED.max_ms),
+        last_ms = EXCLUDED.last_ms,
+        view = EXCLUDED.view,
+        plan = COALESCE(NULLIF(EXCLUDED.plan, ''), t.plan),
+        last_seen = now()
+"""
+
+
+def normalize(sql):
+    for pattern, replacement in NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()
+
+
+def _explain(connection, sql, params):
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return ""
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN {sql}", params)
+            return "\n".join(row[0] for row in cursor.fetchall())
+
+
+def _write(values):
+    _local.active = True
+    try:
+        with connections["default"].cursor() as cursor:
+            cursor.execute(UPSERT_SQL.format(table=SlowQuery._meta.db_table), values)
+    except DatabaseError:
+        # журнал не должен ломать сам запрос (например, default недоступна)
+        logger.warning("Slow query was not recorded", exc_info=True)
+    finally:
+        _local.active = False
+
+
+def _record(connection, sql, params, many, duration_ms):
+    _local.active = True
+    try:
+        plan = ""
+        if not many and random.random() < settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE:
+            plan = _explain(connection, sql, params)
+    except DatabaseError:
+        logger.warning("Slow query plan was not captured", exc_info=True)
+    finally:
+        _local.active = False
+    values = {
+        "fingerprint": fingerprint(sql),
+        "alias": connection.alias,
+        "sql": normalize(sql),
+        "view": current_view.get()[:200],
+        "ms": duration_ms,
+        "plan": plan,
+    }
+    if connections["default"].in_atomic_block:
+        # после коммита default — уже вне транзакции вызывающего кода
+        transaction.on_commit(functools.partial(_write, values), using="default")
+    else:
+        _write(values)
+
+
+def record_slow_queries(execute, sql, params, many, context):
+    threshold = settings.SLOW_QUERY_MS
+    if not threshold or getattr(_local, "active", False):
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration_ms = (time.perf_counter() - started) * 1000
+    if duration_ms >= threshold and SlowQuery._meta.db_table not in sql:
+        _record(context["connection"], sql, params, many, duration_ms)
+    return result
+
+
+@receiver(connection_created)
+def install_recorder(sender, connection, **kwargs):
+    if record_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_slow_queries)
@@ -0,0 +1,162 @@
+"""
+Инкрементальная синхронизация броней для мобильных клиентов
+(/api/bookings/sync/?since=<token>).
+
+Каждая вставка/изменение брони получает новую Booking.version и txid своей
+транзакции, удаление — BookingTombstone с версией из той же
+последовательности. Ответ содержит изменения и удаления после позиции
+(txid, version) из токена клиента, в этом порядке и не больше
+BOOKING_SYNC_PAGE_SIZE; токен продолжения — последняя отданная позиция,
+подписанная и с меткой времени. Токен старше срока хранения tombstone
+(BOOKING_SYNC_RETENTION_DAYS) отвергается — клиент делает полную синхронизацию.
+
+Брони площадок лежат в своих БД (booking.sharding) со своими
+последовательностями версий, поэтому токен хранит позицию для каждой БД,
+а страница сливается из всех БД (опрашиваются параллельно).
+
+Отдаются только записи транзакций с txid меньше pg_snapshot_xmin — все такие
+транзакции завершены, и более поздний коммит не окажется позади уже
+отданной позиции. Запись, ещё не попавшая под границу, придёт следующим
+запросом.
+"""
+
+import datetime
+import heapq
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections, router
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import Booking, BookingTombstone
+from .sharding import booking_databases, fan_out
+
+TOKEN_SALT = "booking.sync"
+
+
+class SyncTokenExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "Sync token expired, start a full sync without 'since'."
+    default_code = "sync_token_expired"
+
+
+# граница завершённых транзакций; записи своей транзакции видны и так
+HORIZON_SQL = """
+    SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint,
+           pg_current_xact_id_if_assigned()::text::bigint
+"""
+
+
+def make_token(positions):
+    return signing.dumps(
+        {alias: list(position) for alias, position in positions.items()},
+        salt=TOKEN_SALT,
+    )
+
+
+def read_token(token):
+    """Позиции клиента по БД: {alias: (txid, version)}."""
+    if not token:
+        return {}
+    try:
+        position = signing.loads(
+            token,
+            salt=TOKEN_SALT,
+            max_age=datetime.timedelta(days=settings.BOOKING_SYNC_RETENTION_DAYS),
+        )
+    except signing.SignatureExpired:
+        raise SyncTokenExpired()
+    except signing.BadSignature:
+        raise ValidationError({"since": ["Invalid sync token."]})
+    if isinstance(position, list):
+        # токен одной БД — до чтения БД площадок
+        return {"default": tuple(position)}
+    if not isinstance(position, dict):
+        # токен до перехода на позицию (txid, version)
+        raise SyncTokenExpired()
+    return {alias: tuple(value) for alias, value in position.items()}
+
+
+def _position(row):
+    return row.txid, row.version
+
+
+def _after(txid, version):
+    return Q(txid__gt=txid) | Q(txid=txid, version__gt=version)
+
+
+def horizon(alias):
+    """(pg_snapshot_xmin, txid своей транзакции или None) для БД alias."""
+    with connections[alias].cursor() as cursor:
+        cursor.execute(HORIZON_SQL)
+        return cursor.fetchone()
+
+
+def committed(alias):
+    """Фильтр по txid: записи завершённых транзакций и своей."""
+    xmin, own = horizon(alias)
+    return Q(txid__lt=xmin) | Q(txid=own)
+
+
+def _changes(user, db, since, limit):
+    """
+    Изменения и удаления БД db после since по порядку (не больше limit + 1)
+    и id броней из этих удалений, которые существуют.
+    """
+    # брони, tombstone и граница — из одной БД (реплика отстаёт целиком)
+    window = _after(*since) & committed(db)
+    changed = Booking.objects.using(db).filter(window)
+    deleted = BookingTombstone.objects.using(db).filter(window)
+    if not user.is_staff:
+        changed = changed.filter(user=user)
+        deleted = deleted.filter(user_id=user.id)
+    # по limit + 1 из каждого источника: хватает, чтобы слить limit записей
+    # и понять, есть ли продолжение
+    changed = list(changed.order_by("txid", "version")[: limit + 1])
+    deleted = list(deleted.order_by("txid", "version")[: limit + 1])
+    rows = list(heapq.merge(changed, deleted, key=_position))[: limit + 1]
+
+    # перенос брони в другую партицию (смена date) — новая строка и затем
+    # tombstone с большей версией, возможно на следующей странице: бронь,
+    # которая существует, в удалённые не попадает
+    tombstones = {row.booking_id for row in rows if isinstance(row, BookingTombstone)}
+    alive = set(
+        Booking.objects.using(db).filter(pk__in=tombstones).values_list("pk", flat=True)
+    )
+    return rows, alive
+
+
+def changes_since(user, token):
+    """
+    Возвращает (изменённые Booking, id удалённых броней, новый токен, has_more).
+    """
+    positions = read_token(token)
+    limit = settings.BOOKING_SYNC_PAGE_SIZE
+
+    # default — через роутер (реплика), БД площадок — напрямую
+    aliases = {
+        (router.db_for_read(Booking) if alias == "default" else alias): alias
+        for alias in booking_databases()
+    }
+    results = fan_out(
+        lambda db: _changes(user, db, positions.get(aliases[db], (0, 0)), limit),
+        list(aliases),
+    )
+    # позиции разных БД независимы: слияние берёт из каждой БД префикс её
+    # порядка, этого достаточно для продолжения по токену
+    merged = list(heapq.merge(*(rows for rows, _ in results), key=_position))
+    page, has_more = merged[:limit], len(merged) > limit
+    # id броней разных БД не пересекаются (booking.sharding.site_id_offset)
+    alive = set().union(*(alive for _, alive in results))
+
+    bookings = [row for row in page if isinstance(row, Booking)]
+    deleted_ids = [
+        row.booking_id
+        for row in page
+        if isinstance(row, BookingTombstone) and row.booking_id not in alive
+    ]
+    for row in page:
+        positions[aliases[row._state.db]] = _position(row)
+    return bookings, deleted_ids, make_token(positions), has_more
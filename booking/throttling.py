@@ -0,0 +1,107 @@
+"""
+Ограничение частоты дорогих запросов (/api/rooms/free/, создание брони).
+
+Token bucket на пользователя и на IP: ведро ёмкостью N токенов из ставки
+"N/период" пополняется равномерно, поэтому короткий всплеск до N запросов
+проходит, а зацикленный скрипт упирается в среднюю ставку. Состояние ведёр
+и счётчики отказов лежат в кэше THROTTLE_CACHE_ALIAS: LocMemCache считает
+в каждом воркере отдельно, общий кэш (Redis, Memcached) — на все воркеры.
+
+Ставки задаются в REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"] по областям
+(scope); представление сопоставляет действию область в throttle_scopes.
+Для ограничения по IP используется область "<scope>_ip". Ставка None
+отключает ограничение.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+OVERLOAD = "overload"
+
+
+def _cache():
+    return caches[settings.THROTTLE_CACHE_ALIAS]
+
+
+def count_rejection(reason):
+    """Увеличивает счётчик отказов reason (область throttle или OVERLOAD)."""
+    cache, key = _cache(), f"throttle_rejected_{reason}"
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # ключ вытеснен между add и incr — отказ не посчитан
+        pass
+
+
+def rejection_counts():
+    """Счётчики отказов по областям из DEFAULT_THROTTLE_RATES и перегрузке."""
+    reasons = [*api_settings.DEFAULT_THROTTLE_RATES, OVERLOAD]
+    counts = _cache().get_many([f"throttle_rejected_{reason}" for reason in reasons])
+    return {reason: counts.get(f"throttle_rejected_{reason}", 0) for reason in reasons}
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    scope_suffix = ""
+
+    def __init__(self):
+        # область и ставка известны только по действию представления
+        self.wait_seconds = None
+
+    @property
+    def cache(self):
+        return _cache()
+
+    def get_ident_key(self, request):
+        return self.get_ident(request)
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            "scope": self.scope,
+            "ident": self.get_ident_key(request),
+        }
+
+    def allow_request(self, request, view):
+        scope = getattr(view, "throttle_scopes", {}).get(getattr(view, "action", None))
+        if scope is None:
+            return True
+        self.scope = scope + self.scope_suffix
+        # ставки читаются на каждый запрос: THROTTLE_RATES фиксируется при импорте
+        self.rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        if self.rate is None:
+            return True
+        capacity, duration = self.parse_rate(self.rate)
+
+        key = self.get_cache_key(request, view)
+        now = self.timer()
+        tokens, updated = self.cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * capacity / duration)
+        if tokens < 1:
+            self.wait_seconds = (1 - tokens) * duration / capacity
+            count_rejection(self.scope)
+            return False
+        # чтение и запись не атомарны: при гонке воркеров ведро может
+        # пропустить лишний запрос, что для защиты от перегрузки допустимо;
+        # через duration ведро в любом случае полное, ключ можно забыть
+        self.cache.set(key, (tokens - 1, now), duration)
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Ведро на пользователя (анонимные запросы — на IP)."""
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user-{request.user.pk}"
+        return f"ip-{self.get_ident(request)}"
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """Ведро на IP клиента: ограничивает и массовую регистрацию аккаунтов."""
+
+    scope_suffix = "_ip"
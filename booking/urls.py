@@ -1,13 +1,31 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from .views import RoomViewSet, BookingViewSet, RegistrationView
+from .events import booking_events, booking_events_stream
+from .views import (
+    RoomViewSet,
+    BookingViewSet,
+    RegistrationView,
+    RoomUsageViewSet,
+    FloorPeakViewSet,
+    RejectionStatsView,
+)
 
 router = DefaultRouter()
 router.register(r"rooms", RoomViewSet, basename="room")
 router.register(r"bookings", BookingViewSet, basename="booking")
+router.register(r"stats/room-usage", RoomUsageViewSet, basename="room-usage")
+router.register(r"stats/floor-peaks", FloorPeakViewSet, basename="floor-peak")
 
 urlpatterns = [
     path("auth/register/", RegistrationView.as_view(), name="register"),
+    # до router.urls, иначе "events" попадёт в bookings/{pk}/
+    path("bookings/events/", booking_events, name="booking-events"),
+    path(
+        "bookings/events/stream/",
+        booking_events_stream,
+        name="booking-events-stream",
+    ),
+    path("stats/rejections/", RejectionStatsView.as_view(), name="rejection-stats"),
     path("", include(router.urls)),
 ]
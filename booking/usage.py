@@ -0,0 +1,147 @@
+"""
+Дневные агрегаты загрузки: минуты брони по комнатам и пиковая
+одновременность по этажам (RoomDailyUsage, FloorDailyPeak).
+
+Записи броней ставят в очередь пересчёт своего дня, а ночная задача
+пересчитывает закрывшийся месяц (партицию) целиком — отчёты по закрытым
+периодам читают только агрегаты. Брони читаются из всех БД
+(booking.sharding.booking_databases), агрегаты хранятся в default.
+
+Пересчёты одних и тех же дней (два refresh_day одной даты, refresh_day
+внутри пересчитываемого месяца) выполняются по очереди: пересчёт держит
+advisory-блокировку транзакции на каждый свой день от чтения броней до
+записи агрегатов. Без неё параллельный пересчёт падал на уникальности
+(room, date) или перезаписывал свежие агрегаты устаревшими.
+"""
+
+import datetime
+from collections import Counter, defaultdict
+
+from dateutil.relativedelta import relativedelta
+from django.db import connections, transaction
+
+from .jobs import advisory_key, enqueue, job
+from .models import Room, Booking, RoomDailyUsage, FloorDailyPeak
+from .sharding import booking_databases, fan_out
+
+ROOM_USAGE_SQL = """
+    SELECT
+        room_id,
+        date,
+        SUM(EXTRACT(EPOCH FROM end_time - start_time))::int,
+        COUNT(*)
+    FROM {booking_table}
+    WHERE date BETWEEN %(date_from)s AND %(date_to)s
+    GROUP BY room_id, date
+"""
+
+# Изменение одновременности этажа в каждый момент начала (+1) и конца (-1)
+# броней; пик считается по сумме изменений всех БД (booking.sharding).
+FLOOR_DELTAS_SQL = """
+    WITH events AS (
+        SELECT r.floor, b.date, b.start_time AS at, 1 AS delta
+        FROM {booking_table} b JOIN {room_table} r ON r.id = b.room_id
+        WHERE b.date BETWEEN %(date_from)s AND %(date_to)s
+        UNION ALL
+        SELECT r.floor, b.date, b.end_time, -1
+        FROM {booking_table} b JOIN {room_table} r ON r.id = b.room_id
+        WHERE b.date BETWEEN %(date_from)s AND %(date_to)s
+    )
+    SELECT floor, date, at, SUM(delta) FROM events GROUP BY floor, date, at
+"""
+
+
+def _read_usage(alias, params):
+    """(строки загрузки комнат, изменения одновременности этажей) одной БД."""
+    tables = {
+        "booking_table": Booking._meta.db_table,
+        "room_table": Room._meta.db_table,
+    }
+    with connections[alias].cursor() as cursor:
+        cursor.execute(ROOM_USAGE_SQL.format(**tables), params)
+        rooms = cursor.fetchall()
+        cursor.execute(FLOOR_DELTAS_SQL.format(**tables), params)
+        return rooms, cursor.fetchall()
+
+
+def _floor_peaks(deltas):
+    """
+    Пик одновременности по (floor, date). Изменения в один момент
+    суммируются — конец брони и начало следующей не пересекаются
+    (интервалы полуоткрытые).
+    """
+    peaks, concurrent = {}, defaultdict(int)
+    for floor, date, at in sorted(deltas):
+        concurrent[floor, date] += deltas[floor, date, at]
+        peaks[floor, date] = max(peaks.get((floor, date), 0), concurrent[floor, date])
+    return peaks
+
+
+def _lock_days(date_from, date_to):
+    """Блокирует дни пересчёта до конца транзакции default."""
+    days = (date_to - date_from).days + 1
+    # порядок ключей один для всех пересчётов: пересекающиеся периоды не
+    # блокируют друг друга крест-накрест
+    keys = sorted(
+        advisory_key(f"usage:{date_from + datetime.timedelta(days=i)}")
+        for i in range(days)
+    )
+    with connections["default"].cursor() as cursor:
+        for key in keys:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [key])
+
+
+def refresh_usage(date_from, date_to):
+    """
+    Пересчитывает агрегаты за [date_from, date_to] по броням всех БД;
+    агрегаты заменяются в default одной транзакцией.
+    """
+    params = {"date_from": date_from, "date_to": date_to}
+    seconds, bookings, deltas = Counter(), Counter(), Counter()
+    with transaction.atomic(using="default"):
+        # брони читаются уже под блокировкой: закончивший последним
+        # пересчёт видит все брони, закоммиченные до его начала
+        _lock_days(date_from, date_to)
+        for rooms, floors in fan_out(
+            lambda alias: _read_usage(alias, params), booking_databases()
+        ):
+            for room_id, date, room_seconds, count in rooms:
+                seconds[room_id, date] += room_seconds
+                bookings[room_id, date] += count
+            for floor, date, at, delta in floors:
+                deltas[floor, date, at] += delta
+
+        RoomDailyUsage.objects.filter(date__range=(date_from, date_to)).delete()
+        FloorDailyPeak.objects.filter(date__range=(date_from, date_to)).delete()
+        RoomDailyUsage.objects.bulk_create(
+            RoomDailyUsage(
+                room_id=room_id,
+                date=date,
+                minutes_booked=seconds[room_id, date] // 60,
+                bookings=bookings[room_id, date],
+            )
+            for room_id, date in seconds
+        )
+        FloorDailyPeak.objects.bulk_create(
+            FloorDailyPeak(floor=floor, date=date, peak_concurrency=peak)
+            for (floor, date), peak in _floor_peaks(deltas).items()
+        )
+
+
+@job("usage.refresh_day")
+def refresh_day(date):
+    day = datetime.date.fromisoformat(date)
+    refresh_usage(day, day)
+
+
+@job("usage.refresh_closed_month", exclusive=True)
+def refresh_closed_month():
+    """Пересчитывает предыдущий месяц — последнюю закрывшуюся партицию."""
+    first = datetime.date.today().replace(day=1) - relativedelta(months=1)
+    refresh_usage(first, first + relativedelta(months=1, days=-1))
+
+
+def schedule_refresh(*dates):
+    """Ставит пересчёт дней в очередь (повторные запросы схлопываются)."""
+    for day in {d for d in dates if d is not None}:
+        enqueue("usage.refresh_day", unique=True, date=day.isoformat())
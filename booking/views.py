@@ -1,34 +1,91 @@
+from django.contrib.auth.models import User
+from django.db.models import Prefetch
+from django.utils.dateparse import parse_date, parse_time
 from django_filters.rest_framework import DjangoFilterBackend
-from drf_yasg import openapi
-from drf_yasg.utils import swagger_auto_schema
 from rest_framework import viewsets, permissions, status, generics
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.relations import PrimaryKeyRelatedField
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 
-from .models import Room, Booking
+from .assignment import assign_room
+from .availability import free_rooms_batch
+from .compact_time import overlap_q
+from .docs import openapi, swagger_auto_schema
+from .failover import FailFastWritesMixin, read_db
+from .holds import (
+    ensure_not_held,
+    get_hold,
+    held_rooms,
+    place_hold,
+    release_hold,
+)
+from .idempotency import HEADER as IDEMPOTENCY_HEADER
+from .idempotency import IdempotentCreateMixin
+from .models import Room, Booking, RoomDailyUsage, FloorDailyPeak
 from .pagination import CustomCursorPagination
-from .serializers import RoomSerializer, BookingSerializer, RegistrationSerializer
+from .serializers import (
+    RoomSerializer,
+    BookingSerializer,
+    BookingSyncSerializer,
+    RegistrationSerializer,
+    RoomDailyUsageSerializer,
+    FloorDailyPeakSerializer,
+    FreeRoomsBatchSerializer,
+    FreeRoomsBatchResultSerializer,
+    FreeSlotSerializer,
+    SlotHoldSerializer,
+    BOOKING_USER_FIELDS,
+    EXPANDABLE_FIELDS,
+)
+from .purge import retire_room
+from .services import ROOM_CONFLICT_MESSAGE, delete_booking
+from .sharding import (
+    ShardedQuerySet,
+    booking_databases,
+    db_for_booking_id,
+    db_for_room,
+    fan_out,
+    is_sharded,
+    site_db,
+)
+from .sync import changes_since
+from .throttling import rejection_counts
+from .usage import schedule_refresh
 
 
-class RegistrationView(generics.CreateAPIView):
+class RegistrationView(FailFastWritesMixin, generics.CreateAPIView):
     serializer_class = RegistrationSerializer
     permission_classes = [permissions.AllowAny]
     queryset = []
 
 
-class RoomViewSet(viewsets.ModelViewSet):
+class RoomViewSet(FailFastWritesMixin, viewsets.ModelViewSet):
     serializer_class = RoomSerializer
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ["floor", "capacity"]
+    # области ставок token bucket (booking.throttling) по действиям
+    throttle_scopes = {"free_rooms": "free_rooms", "free_rooms_batch": "free_rooms"}
+    read_only_actions = ("free_rooms_batch",)
+    filterset_fields = ["floor", "capacity", "site", "is_active"]
 
     def get_permissions(self):
-        if self.request.method in permissions.SAFE_METHODS:
+        # пакетный поиск — POST, но только читает
+        if (
+            self.request.method in permissions.SAFE_METHODS
+            or self.action == "free_rooms_batch"
+        ):
             return [permissions.IsAuthenticated()]
         return [permissions.IsAdminUser()]
 
     def get_queryset(self):
-        # Всегда читаем список комнат из мастера
-        return Room.objects.using("default").all()
+        # Комнаты читаем из мастера, пока он доступен (booking.failover)
+        return Room.objects.using(read_db()).all()
+
+    def perform_destroy(self, instance):
+        # брони удаляются пачками в БД, а не каскадом Django (booking.purge)
+        retire_room(instance)
 
     @swagger_auto_schema(
         manual_parameters=[
@@ -88,18 +145,36 @@ class RoomViewSet(viewsets.ModelViewSet):
         if capacity:
             filters["capacity__gte"] = capacity
 
-        # Всегда работаем с мастер‑БД при определении свободных комнат
-        rooms = Room.objects.using("default").filter(**filters)
-        busy_room_ids = (
-            Booking.objects.using("default")
-            .filter(
-                date=date,
-                start_time__lt=end_time,
-                end_time__gt=start_time,
+        # Свободные комнаты определяем по мастер‑БД, при его недоступности —
+        # по реплике (booking.failover)
+        db = read_db()
+        rooms = Room.objects.using(db).filter(is_active=True, **filters)
+
+        def busy(alias):
+            return (
+                Booking.objects.using(alias)
+                .filter(overlap_q(start_time, end_time), date=date)
+                .values_list("room_id", flat=True)
             )
-            .values_list("room_id", flat=True)
-        )
+
+        if is_sharded():
+            # брони площадок — в их БД (booking.sharding): занятые комнаты
+            # собираем со всех БД параллельно
+            busy_room_ids = set().union(
+                *fan_out(
+                    lambda alias: set(busy(db if alias == "default" else alias)),
+                    booking_databases(),
+                )
+            )
+        else:
+            busy_room_ids = busy(db)
         free_rooms = rooms.exclude(id__in=busy_room_ids)
+        # слоты, удержанные другими пользователями (booking.holds), заняты
+        slot = parse_date(date), parse_time(start_time), parse_time(end_time)
+        if all(slot):
+            held = held_rooms(*slot, request.user)
+            if held:
+                free_rooms = free_rooms.exclude(id__in=held)
 
         page = self.paginate_queryset(free_rooms)
         if page is not None:
@@ -109,26 +184,291 @@ class RoomViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(free_rooms, many=True)
         return Response(serializer.data)
 
+    @swagger_auto_schema(
+        operation_description=(
+            "Свободные комнаты сразу для списка слотов (date, start_time, "
+            "end_time, floor, capacity) одним запросом к БД; результаты "
+            "в порядке слотов"
+        ),
+        request_body=FreeRoomsBatchSerializer,
+        responses={200: FreeRoomsBatchResultSerializer(many=True)},
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="free/batch",
+        serializer_class=FreeRoomsBatchSerializer,
+        pagination_class=None,
+    )
+    def free_rooms_batch(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        slots = serializer.validated_data["slots"]
+        results = []
+        for slot, rooms in zip(slots, free_rooms_batch(slots)):
+            # одно чтение кэша удержаний на слот
+            held = held_rooms(
+                slot["date"], slot["start_time"], slot["end_time"], request.user
+            )
+            results.append([room for room in rooms if room.id not in held])
+        return Response(
+            FreeRoomsBatchResultSerializer(
+                [{"rooms": rooms} for rooms in results], many=True
+            ).data
+        )
+
+
+# колонки Booking, которые отдаёт BookingSerializer
+BOOKING_LIST_FIELDS = ["id", "user", "room", "date", "start_time", "end_time"]
+
 
-class BookingViewSet(viewsets.ModelViewSet):
+class BookingViewSet(FailFastWritesMixin, IdempotentCreateMixin, viewsets.ModelViewSet):
     pagination_class = CustomCursorPagination
     serializer_class = BookingSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ["date", "room"]
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scopes = {
+        "create": "booking_create",
+        "hold": "booking_create",
+        "confirm_hold": "booking_create",
+        "auto_assign": "booking_create",
+    }
 
     def get_queryset(self):
         if getattr(self, "swagger_fake_view", False):
             return Booking.objects.none()
-        if self.request.user.is_staff:
-            return Booking.objects.all().select_related("room", "user")
-        return Booking.objects.filter(user=self.request.user).select_related("room")
+        queryset = Booking.objects.all()
+        if is_sharded() and "pk" in self.kwargs:
+            # по id видно, в какой БД площадки лежит бронь
+            queryset = queryset.using(db_for_booking_id(self.kwargs["pk"]))
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(user=self.request.user)
+        site = self.request.query_params.get("site")
+        if site and self.action == "list":
+            queryset = queryset.filter(
+                room__in=Room.objects.filter(site=site).values("pk")
+            )
+        if self.action not in ("list", "retrieve"):
+            return queryset
+        # BookingSerializer отдаёт room и user как id: без JOIN и только
+        # сериализуемые колонки (покрывающие индексы списка их включают)
+        queryset = queryset.only(*BOOKING_LIST_FIELDS)
+        expand = self.get_expand()
+        if "room" in expand:
+            queryset = queryset.prefetch_related("room")
+        if "user" in expand:
+            queryset = queryset.prefetch_related(
+                Prefetch("user", queryset=User.objects.only(*BOOKING_USER_FIELDS))
+            )
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        if not is_sharded():
+            return super().list(request, *args, **kwargs)
+        # ?site= — только БД площадки, иначе все БД параллельно с слиянием
+        # страниц в порядке курсорной пагинации (booking.sharding)
+        site = request.query_params.get("site")
+        databases = [site_db(site)] if site else booking_databases()
+        queryset = ShardedQuerySet(
+            self.filter_queryset(self.get_queryset().using(alias))
+            for alias in databases
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def get_expand(self):
+        """Связанные объекты из ?expand=room,user (только list и retrieve)."""
+        if self.action not in ("list", "retrieve"):
+            return set()
+        requested = self.request.query_params.get("expand", "").split(",")
+        return {name.strip() for name in requested} & set(EXPANDABLE_FIELDS)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["expand"] = self.get_expand() if self.request else set()
+        return context
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        # чужое удержание слота — сразу 409, без запроса к БД
+        ensure_not_held(**serializer.validated_data, user=self.request.user)
+        booking = serializer.save(user=self.request.user)
+        schedule_refresh(booking.date)
+
+    def perform_update(self, serializer):
+        instance, data = serializer.instance, serializer.validated_data
+        ensure_not_held(
+            room=data.get("room", instance.room_id),
+            date=data.get("date", instance.date),
+            start_time=data.get("start_time", instance.start_time),
+            end_time=data.get("end_time", instance.end_time),
+            user=self.request.user,
+        )
+        old_date = instance.date
+        booking = serializer.save()
+        schedule_refresh(old_date, booking.date)
+
+    def perform_destroy(self, instance):
+        delete_booking(instance)
+        schedule_refresh(instance.date)
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Удержание слота на BOOKING_HOLD_SECONDS: пока оно действует, "
+            "другие пользователи получают 409, а free_rooms показывает комнату "
+            "занятой. Подтверждение — POST /api/bookings/holds/{id}/confirm/"
+        ),
+        request_body=SlotHoldSerializer,
+        responses={201: SlotHoldSerializer},
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="holds",
+        serializer_class=SlotHoldSerializer,
+    )
+    def hold(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        slot = dict(serializer.validated_data)
+        room = slot.pop("room_id")
+        if not Room.objects.filter(pk=room, is_active=True).exists():
+            raise ValidationError(
+                {
+                    "room": [
+                        PrimaryKeyRelatedField.default_error_messages[
+                            "does_not_exist"
+                        ].format(pk_value=room)
+                    ]
+                }
+            )
+        hold = place_hold(room, **slot, user=request.user)
+        # удержание получил один пользователь — только он проверяет брони
+        conflict = (
+            Booking.objects.using(db_for_room(room))
+            .filter(
+                overlap_q(slot["start_time"], slot["end_time"]),
+                room_id=room,
+                date=slot["date"],
+            )
+            .exists()
+        )
+        if conflict:
+            release_hold(hold)
+            raise ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [ROOM_CONFLICT_MESSAGE]}
+            )
+        return Response(SlotHoldSerializer(hold).data, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(
+        operation_description="Превращает удержание в бронирование",
+        request_body=openapi.Schema(type=openapi.TYPE_OBJECT, properties={}),
+        responses={201: BookingSerializer},
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path=r"holds/(?P<hold_id>[0-9a-f]{32})/confirm",
+    )
+    def confirm_hold(self, request, hold_id):
+        hold = get_hold(hold_id, request.user)
+        if hold is None:
+            raise NotFound("Hold not found or expired.")
+        serializer = self.get_serializer(
+            data={
+                "room": hold.room_id,
+                "date": hold.date,
+                "start_time": hold.start_time,
+                "end_time": hold.end_time,
+            }
+        )
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        release_hold(hold)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @swagger_auto_schema(
-        operation_description="Создание бронирования",
+        operation_description=(
+            "Бронирует наименьшую подходящую свободную комнату (date, "
+            "start_time, end_time, floor, capacity); при равной вместимости — "
+            "ту, где бронь меньше дробит свободное время дня. Если комнату "
+            "заняли между поиском и записью, сервер пробует следующую; "
+            "нет свободной — 409"
+        ),
+        request_body=FreeSlotSerializer,
+        responses={201: BookingSerializer},
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="auto",
+        serializer_class=FreeSlotSerializer,
+    )
+    def auto_assign(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        booking = assign_room(request.user, **serializer.validated_data)
+        schedule_refresh(booking.date)
+        return Response(
+            BookingSerializer(booking, context=self.get_serializer_context()).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+    @swagger_auto_schema(operation_description="Отменяет удержание слота")
+    @action(
+        detail=False,
+        methods=["delete"],
+        url_path=r"holds/(?P<hold_id>[0-9a-f]{32})",
+    )
+    def cancel_hold(self, request, hold_id):
+        hold = get_hold(hold_id, request.user)
+        if hold is None:
+            raise NotFound("Hold not found or expired.")
+        release_hold(hold)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                "since",
+                openapi.IN_QUERY,
+                description="Токен из поля next предыдущего ответа (пусто — полная синхронизация)",
+                type=openapi.TYPE_STRING,
+            ),
+        ],
+        operation_description="Изменённые и удалённые бронирования с момента выдачи токена since",
+        responses={200: BookingSyncSerializer},
+    )
+    @action(detail=False, methods=["get"], url_path="sync", pagination_class=None)
+    def sync(self, request):
+        bookings, deleted, token, has_more = changes_since(
+            request.user, request.query_params.get("since")
+        )
+        serializer = BookingSyncSerializer(
+            {
+                "results": bookings,
+                "deleted": deleted,
+                "next": token,
+                "has_more": has_more,
+            },
+            context=self.get_serializer_context(),
+        )
+        return Response(serializer.data)
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Создание бронирования. Повтор запроса с тем же Idempotency-Key "
+            "возвращает исходный ответ без повторной записи"
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                IDEMPOTENCY_HEADER,
+                openapi.IN_HEADER,
+                description="Ключ идемпотентности (до 255 символов, опционально)",
+                type=openapi.TYPE_STRING,
+            ),
+        ],
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
             required=["room", "date", "start_time", "end_time"],
@@ -152,3 +492,45 @@ class BookingViewSet(viewsets.ModelViewSet):
     )
     def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
+
+
+class RoomUsageViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Дневная загрузка комнат для отчётов (только staff). Читает агрегаты
+    RoomDailyUsage, а не сырые брони.
+    """
+
+    serializer_class = RoomDailyUsageSerializer
+    permission_classes = [permissions.IsAdminUser]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = {
+        "date": ["exact", "gte", "lte"],
+        "room": ["exact"],
+        "room__floor": ["exact"],
+    }
+    queryset = RoomDailyUsage.objects.all()
+
+
+class FloorPeakViewSet(viewsets.ReadOnlyModelViewSet):
+    """Пиковая одновременность броней по этажам (только staff)."""
+
+    serializer_class = FloorDailyPeakSerializer
+    permission_classes = [permissions.IsAdminUser]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = {
+        "date": ["exact", "gte", "lte"],
+        "floor": ["exact"],
+    }
+    queryset = FloorDailyPeak.objects.all()
+
+
+class RejectionStatsView(APIView):
+    """
+    Счётчики отклонённых запросов (только staff): по областям throttle
+    (429) и по перегрузке процесса (503, "overload").
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(rejection_counts())
@@ -24,11 +24,19 @@ python manage.py migrate --no-input
 # 4. Создать недостающие партиции
 echo "🗂 Создаём недостающие партиции..."
 python manage.py pgpartition --yes
+# БД площадок (BOOKING_SITE_DATABASES): миграции, партиции и комнаты
+python manage.py migrate_sites
 
 # 5. Проверить партиции
 echo "🔍 Проверяем партиции..."
 python manage.py check_partitions
 
+# Собрать OpenAPI-схему и статику: /swagger/ и /redoc/ загружают схему из
+# статики (WhiteNoise), а не генерируют её на каждый запрос
+echo "📚 Собираем OpenAPI-схему и статику..."
+python manage.py export_openapi
+python manage.py collectstatic --no-input
+
 # 6. Настроить и запустить cron‑демон для задач django-crontab
 echo "🔧 Настраиваем cron-задания..."
 # Удалим старые, если есть
@@ -40,12 +48,17 @@ echo "✅ Cron-задания добавлены!"
 # Запускаем демон cron
 cron
 
+# Запускаем воркер фоновой очереди (booking.jobs)
+echo "⚙️ Запускаем воркер задач..."
+python manage.py run_jobs --processes "${JOB_WORKERS:-1}" &
+
 echo "🧪 Прогоним тесты..."
 pytest --maxfail=1 --disable-warnings -q
 
-# 7. Запустить Gunicorn
-echo "🚀 Запускаем Gunicorn"
-exec gunicorn project.wsgi:application \
-     --bind 0.0.0.0:8000 \
+# 7. Запустить uvicorn (ASGI): long-poll и SSE ленты изменений
+# (booking.events) ждут событий, не занимая воркер
+echo "🚀 Запускаем uvicorn"
+exec uvicorn project.asgi:application \
+     --host 0.0.0.0 --port 8000 \
      --workers 3
 
@@ -3,6 +3,10 @@ ASGI config for project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Лента изменений броней (booking.events: long-poll и Server-Sent Events)
+реализована асинхронными представлениями — под ASGI-сервером ожидание
+новых событий не занимает воркер.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -26,10 +26,17 @@ SECRET_KEY = os.getenv("SECRET_KEY", "django-insecure-default-key")
 DEBUG = os.getenv("DEBUG", "True") == "True"
 ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS", "testserver,localhost,127.0.0.1").split(",")
 
+# В API-only развёртываниях Swagger/Redoc и админку можно отключить:
+# drf_yasg и django.contrib.admin тогда не импортируются при старте воркеров
+# и каждого manage.py (в т.ч. заданий django_crontab)
+API_DOCS_ENABLED = os.getenv("API_DOCS_ENABLED", "True") == "True"
+ADMIN_ENABLED = os.getenv("ADMIN_ENABLED", "True") == "True"
+# Сколько секунд отдавать сгенерированную OpenAPI-схему из кэша
+API_DOCS_CACHE_SECONDS = int(os.getenv("API_DOCS_CACHE_SECONDS", "3600"))
+
 # Application definition
 
 INSTALLED_APPS = [
-    "django.contrib.admin",
     "django.contrib.auth",
     "django.contrib.contenttypes",
     "django.contrib.sessions",
@@ -38,15 +45,20 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     "rest_framework",
     "rest_framework_simplejwt",
-    "drf_yasg",
     "django_filters",
     "psqlextra",
     "django_crontab",
     "booking",
 ]
+if ADMIN_ENABLED:
+    INSTALLED_APPS.insert(0, "django.contrib.admin")
+if API_DOCS_ENABLED:
+    INSTALLED_APPS.append("drf_yasg")
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "booking.middleware.ConcurrencyLimitMiddleware",
+    "booking.middleware.SlowQueryContextMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -80,22 +92,53 @@ WSGI_APPLICATION = "project.wsgi.application"
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 DEFAULT_SQLITE_URL = f"sqlite:///{BASE_DIR / 'db.sqlite3'}"
 
+# Быстрое обнаружение упавшего сервера БД: таймаут подключения, TCP keepalive
+# и tcp_user_timeout вместо минутных TCP-таймаутов (booking.failover)
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "3"))
+DB_PRIMARY_RETRY_SECONDS = int(os.getenv("DB_PRIMARY_RETRY_SECONDS", "5"))
+POSTGRES_FAILFAST_OPTIONS = {
+    "connect_timeout": DB_CONNECT_TIMEOUT,
+    "keepalives": 1,
+    "keepalives_idle": 5,
+    "keepalives_interval": 2,
+    "keepalives_count": 2,
+    "tcp_user_timeout": DB_CONNECT_TIMEOUT * 1000,
+}
+
+
+def database_config(url):
+    config = dj_database_url.parse(
+        url,
+        conn_max_age=600,
+        # перед повторным использованием соединение проверяется: после
+        # рестарта сервера мёртвый сокет не ломает следующий запрос
+        conn_health_checks=True,
+        ssl_require=False,
+    )
+    if "postgresql" in config["ENGINE"]:
+        config["OPTIONS"] = {**POSTGRES_FAILFAST_OPTIONS, **config.get("OPTIONS", {})}
+    return config
+
+
 DATABASES = {
     "default": {
-        **dj_database_url.config(
-            default=os.getenv("DATABASE_URL", DEFAULT_SQLITE_URL),
-            conn_max_age=600,
-            ssl_require=False,
-        ),
+        **database_config(os.getenv("DATABASE_URL", DEFAULT_SQLITE_URL)),
         "ENGINE": "psqlextra.backend",
     },
-    "replica": dj_database_url.config(
-        default=os.getenv("REPLICA_DATABASE_URL", DEFAULT_SQLITE_URL),
-        conn_max_age=600,
-        ssl_require=False,
+    # без REPLICA_DATABASE_URL реплика совпадает с мастером
+    "replica": database_config(
+        os.getenv("REPLICA_DATABASE_URL", os.getenv("DATABASE_URL", DEFAULT_SQLITE_URL))
     ),
 }
 
+# Шардирование броней по площадкам (booking.sharding): "site=URL,site2=URL2".
+# Брони комнат площадки без своей БД хранятся в default
+BOOKING_SITE_DATABASES = {}
+for entry in filter(None, os.getenv("BOOKING_SITE_DATABASES", "").split(",")):
+    site, url = entry.strip().split("=", 1)
+    DATABASES[f"site_{site}"] = {**database_config(url), "ENGINE": "psqlextra.backend"}
+    BOOKING_SITE_DATABASES[site] = f"site_{site}"
+
 PSQLEXTRA_PARTITIONING_CONFIG = [
     {
         "model": "booking.Booking",
@@ -108,7 +151,51 @@ PSQLEXTRA_PARTITIONING_CONFIG = [
 # точка входа для psqlextra, чтобы команда pgpartition нашла твой manager
 PSQLEXTRA_PARTITIONING_MANAGER = "booking.partitioning.manager.manager"
 
-DATABASE_ROUTERS = ["booking.routers.ReadReplicaRouter"]
+DATABASE_ROUTERS = ["booking.routers.SiteShardRouter"]
+
+# Записи броней в одну комнату идут по очереди (блокировка строки комнаты);
+# True — по очереди только записи в одну комнату на одну дату
+# (pg_advisory_xact_lock)
+BOOKING_ROOM_LOCKS = os.getenv("BOOKING_ROOM_LOCKS", "False") == "True"
+# Сколько ждать блокировку комнаты, прежде чем ответить 409
+BOOKING_ROOM_LOCK_TIMEOUT_MS = int(os.getenv("BOOKING_ROOM_LOCK_TIMEOUT_MS", "2000"))
+
+# Сколько месяцев закрывшаяся партиция сохраняет B-tree индексы горячего
+# профиля, прежде чем перейти на BRIN (booking.partitioning.indexes)
+BOOKING_PARTITION_GRACE_MONTHS = int(os.getenv("BOOKING_PARTITION_GRACE_MONTHS", "1"))
+
+# Проверки пересечений и горячие индексы партиций по минутам суток
+# (Booking.start_minute/end_minute, booking.compact_time) вместо time
+BOOKING_COMPACT_TIME = os.getenv("BOOKING_COMPACT_TIME", "False") == "True"
+
+# Пороги предупреждений check_partitions: доля мёртвых строк и оценка
+# раздутия партиции (booking.partitioning.health)
+BOOKING_PARTITION_MAX_DEAD_RATIO = float(
+    os.getenv("BOOKING_PARTITION_MAX_DEAD_RATIO", "0.2")
+)
+BOOKING_PARTITION_MAX_BLOAT_RATIO = float(
+    os.getenv("BOOKING_PARTITION_MAX_BLOAT_RATIO", "0.5")
+)
+
+# Удаление броней комнаты/пользователя пачками по партициям (booking.purge)
+BOOKING_DELETE_CHUNK_SIZE = int(os.getenv("BOOKING_DELETE_CHUNK_SIZE", "5000"))
+# Удалять брони в фоновой задаче (комната выключается сразу)
+BOOKING_PURGE_IN_BACKGROUND = (
+    os.getenv("BOOKING_PURGE_IN_BACKGROUND", "False") == "True"
+)
+
+# Сколько секунд повтор создания брони с тем же Idempotency-Key получает
+# сохранённый ответ (booking.idempotency)
+BOOKING_IDEMPOTENCY_TTL_SECONDS = int(
+    os.getenv("BOOKING_IDEMPOTENCY_TTL_SECONDS", "86400")
+)
+
+# Максимум слотов в одном запросе /api/rooms/free/batch/
+BOOKING_FREE_ROOMS_BATCH_MAX = int(os.getenv("BOOKING_FREE_ROOMS_BATCH_MAX", "100"))
+
+# Сколько комнат-кандидатов /api/bookings/auto/ пробует забронировать, если
+# предыдущую заняли между поиском и записью (booking.assignment)
+BOOKING_AUTO_ASSIGN_ATTEMPTS = int(os.getenv("BOOKING_AUTO_ASSIGN_ATTEMPTS", "3"))
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -121,13 +208,30 @@ AUTH_PASSWORD_VALIDATORS = [
         "NAME": "django.contrib.auth.password_validation.MinimumLengthValidator",
     },
     {
-        "NAME": "django.contrib.auth.password_validation.CommonPasswordValidator",
+        "NAME": "booking.passwords.CommonPasswordValidator",
     },
     {
         "NAME": "django.contrib.auth.password_validation.NumericPasswordValidator",
     },
 ]
 
+# Хэширование паролей (booking.passwords): не больше PASSWORD_HASH_SLOTS
+# одновременных PBKDF2 (слоты в кэше THROTTLE_CACHE_ALIAS — с общим кэшем на
+# все процессы, с LocMemCache на процесс: предупреждение booking.W001),
+# остальные запросы API сразу получают 503. Хэширование идёт в потоке
+# запроса и занимает воркер; лимит ограничивает число таких потоков
+PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", "600000"))
+PASSWORD_HASH_SLOTS = int(os.getenv("PASSWORD_HASH_SLOTS", "4"))
+# через сколько секунд слот упавшего процесса освобождается сам
+PASSWORD_HASH_SLOT_TIMEOUT = int(os.getenv("PASSWORD_HASH_SLOT_TIMEOUT", "10"))
+PASSWORD_HASHERS = [
+    "booking.passwords.BoundedPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -146,6 +250,11 @@ USE_TZ = True
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# OpenAPI-схема, собранная manage.py export_openapi: collectstatic кладёт её в
+# STATIC_ROOT/openapi/, WhiteNoise раздаёт сжатой и с хэшем в имени
+API_SCHEMA_DIR = BASE_DIR / "openapi"
+STATICFILES_DIRS = [("openapi", API_SCHEMA_DIR)]
+
 # Используем сжатый кэшированный storage
 STORAGES = {
     "staticfiles": {
@@ -167,8 +276,54 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
     "PAGE_SIZE": 20,
+    # обрыв соединения с мастером — 503 с Retry-After (booking.failover)
+    "EXCEPTION_HANDLER": "booking.failover.exception_handler",
+    # Token bucket для дорогих действий (booking.throttling); пустая ставка
+    # в окружении отключает ограничение
+    "DEFAULT_THROTTLE_CLASSES": [
+        "booking.throttling.UserTokenBucketThrottle",
+        "booking.throttling.IPTokenBucketThrottle",
+    ],
+    "DEFAULT_THROTTLE_RATES": {
+        "free_rooms": os.getenv("THROTTLE_FREE_ROOMS_RATE", "60/min") or None,
+        "free_rooms_ip": os.getenv("THROTTLE_FREE_ROOMS_IP_RATE", "300/min") or None,
+        "booking_create": os.getenv("THROTTLE_BOOKING_CREATE_RATE", "30/min") or None,
+        "booking_create_ip": (
+            os.getenv("THROTTLE_BOOKING_CREATE_IP_RATE", "120/min") or None
+        ),
+    },
 }
 
+# Кэш для ведер token bucket и счётчиков отказов. LocMemCache — отдельные
+# счётчики в каждом воркере; общий кэш (например, RedisCache) делает лимиты
+# общими для всех воркеров
+THROTTLE_CACHE_ALIAS = "throttle"
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    THROTTLE_CACHE_ALIAS: {
+        "BACKEND": os.getenv(
+            "THROTTLE_CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": os.getenv("THROTTLE_CACHE_LOCATION", "throttle"),
+    },
+}
+# Сколько секунд действует удержание слота перед подтверждением
+BOOKING_HOLD_SECONDS = int(os.getenv("BOOKING_HOLD_SECONDS", "30"))
+
+# Контроль допуска (booking.middleware): запросов одновременно (счётчик в
+# кэше THROTTLE_CACHE_ALIAS — с общим кэшем на все процессы), 0 — без
+# ограничения
+BOOKING_MAX_CONCURRENT_REQUESTS = int(
+    os.getenv("BOOKING_MAX_CONCURRENT_REQUESTS", "32")
+)
+# через сколько секунд счётчик сбрасывается и забывает запросы упавших процессов
+BOOKING_CONCURRENCY_COUNTER_TIMEOUT = int(
+    os.getenv("BOOKING_CONCURRENCY_COUNTER_TIMEOUT", "60")
+)
+BOOKING_OVERLOAD_RETRY_AFTER = int(os.getenv("BOOKING_OVERLOAD_RETRY_AFTER", "1"))
+BOOKING_CONCURRENCY_EXEMPT_PATHS = ["/api/bookings/events/", "/static/"]
+
 SWAGGER_SETTINGS = {
     "USE_SESSION_AUTH": False,
     "SECURITY_DEFINITIONS": {
@@ -182,11 +337,51 @@ SWAGGER_SETTINGS = {
 }
 
 if any("pytest" in arg for arg in sys.argv):
-    CACHES = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+    CACHES = {
+        alias: {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+        for alias in CACHES
+    }
 
 SWAGGER_USE_COMPAT_RENDERERS = False
 
+# Лента изменений броней (booking.events)
+BOOKING_EVENTS_PAGE_SIZE = int(os.getenv("BOOKING_EVENTS_PAGE_SIZE", "500"))
+BOOKING_EVENTS_POLL_SECONDS = float(os.getenv("BOOKING_EVENTS_POLL_SECONDS", "1"))
+BOOKING_EVENTS_LONGPOLL_SECONDS = int(
+    os.getenv("BOOKING_EVENTS_LONGPOLL_SECONDS", "25")
+)
+BOOKING_EVENTS_STREAM_SECONDS = int(os.getenv("BOOKING_EVENTS_STREAM_SECONDS", "300"))
+BOOKING_EVENTS_RETENTION_DAYS = int(os.getenv("BOOKING_EVENTS_RETENTION_DAYS", "7"))
+
+# Инкрементальная синхронизация броней (booking.sync)
+BOOKING_SYNC_PAGE_SIZE = int(os.getenv("BOOKING_SYNC_PAGE_SIZE", "500"))
+BOOKING_SYNC_RETENTION_DAYS = int(os.getenv("BOOKING_SYNC_RETENTION_DAYS", "30"))
+
+# Журнал медленных запросов (booking.slow_queries): порог в мс (0 — выключен),
+# доля записанных запросов с EXPLAIN и срок хранения отпечатков
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(
+    os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0.1")
+)
+SLOW_QUERY_RETENTION_DAYS = int(os.getenv("SLOW_QUERY_RETENTION_DAYS", "14"))
+
+# Фоновая очередь задач (booking.jobs)
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY_SECONDS = int(os.getenv("JOB_RETRY_DELAY_SECONDS", "60"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "3600"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "5"))
+
+# Задания cron запускаются в каждом контейнере web; задача ставится в очередь
+# один раз, если за это окно (сек) её не поставил другой контейнер (booking.cron)
+CRON_SINGLE_RUN_WINDOW_SECONDS = int(os.getenv("CRON_SINGLE_RUN_WINDOW_SECONDS", "600"))
+
 CRONJOBS = [
     ("0 0 * * *", "booking.cron.run_partition_manager"),
     ("0 2 * * 0", "booking.cron.db_maintenance"),
+    ("30 0 * * *", "booking.cron.refresh_closed_usage"),
+    ("45 0 * * *", "booking.cron.prune_booking_events"),
+    ("50 0 * * *", "booking.cron.prune_booking_tombstones"),
+    ("55 0 * * *", "booking.cron.prune_slow_queries_log"),
+    ("5 1 * * *", "booking.cron.prune_idempotency_store"),
+    ("*/10 * * * *", "booking.cron.prune_slot_holds"),
 ]
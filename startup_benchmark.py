@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк времени холодного старта: сколько стоит импорт приложения в новом
+процессе (как у воркера uvicorn или задания `manage.py crontab run`).
+
+Каждый замер — отдельный интерпретатор, который создаёт ASGI-приложение
+(django.setup()) и загружает URLconf. Сравниваются конфигурации с
+документацией/админкой и без них (API_DOCS_ENABLED / ADMIN_ENABLED).
+
+Запуск:
+    python startup_benchmark.py [--runs 10] [--top 15]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+STARTUP_CODE = """
+import os
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+from django.core.asgi import get_asgi_application
+application = get_asgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+"""
+
+CONFIGS = {
+    "по умолчанию": {},
+    "без документации": {"API_DOCS_ENABLED": "False"},
+    "API-only": {"API_DOCS_ENABLED": "False", "ADMIN_ENABLED": "False"},
+}
+
+
+def run_once(env, importtime=False):
+    args = [sys.executable]
+    if importtime:
+        args += ["-X", "importtime"]
+    started = time.perf_counter()
+    result = subprocess.run(
+        args + ["-c", STARTUP_CODE],
+        env={**os.environ, **env},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return time.perf_counter() - started, result.stderr
+
+
+def slowest_imports(stderr, top):
+    # строки вида "import time: self [us] | cumulative | imported package"
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not name.startswith(" " * 2):
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15)
+    options = parser.parse_args()
+
+    print(f"{'конфигурация':<20} {'медиана, мс':>12} {'мин, мс':>10} {'макс, мс':>10}")
+    for title, env in CONFIGS.items():
+        # первый запуск прогревает файловый кэш и .pyc
+        run_once(env)
+        samples = [run_once(env)[0] * 1000 for _ in range(options.runs)]
+        print(
+            f"{title:<20} {statistics.median(samples):>12.1f} "
+            f"{min(samples):>10.1f} {max(samples):>10.1f}"
+        )
+
+    print(f"\nСамые дорогие импорты верхнего уровня (по умолчанию, топ {options.top}):")
+    _, stderr = run_once({}, importtime=True)
+    for cumulative, name in slowest_imports(stderr, options.top):
+        print(f"{cumulative / 1000:>8.1f} мс  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,63 @@
 import datetime
+import importlib
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
 
 import pytest
+from asgiref.sync import async_to_sync
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework.test import APIClient
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from booking.models import Room, Booking
+from booking import (
+    assignment,
+    cron,
+    events,
+    failover,
+    holds,
+    jobs,
+    passwords,
+    purge,
+    sharding,
+    slow_queries,
+    sync,
+    usage,
+    views,
+)
+from booking.models import (
+    Room,
+    Booking,
+    BookingEvent,
+    BookingTombstone,
+    IdempotencyKey,
+    Job,
+    JobRun,
+    RoomDailyUsage,
+    FloorDailyPeak,
+    SlotHold,
+    SlowQuery,
+)
+from booking.pagination import CustomCursorPagination
+from booking.partitioning import indexes
+from booking.passwords import BoundedPBKDF2PasswordHasher
+from booking.routers import ReadReplicaRouter, SiteShardRouter
+from booking.services import create_booking
 
 
 # ---------------------------
@@ -89,6 +140,74 @@ class TestRegistration:
         response = api_client.post(url, data, format="json")
         assert response.status_code == 400
 
+    def test_registration_rejects_common_password(self, api_client):
+        url = reverse("register")
+        data = {
+            "username": "weak",
+            "email": "weak@example.com",
+            "password": "qwerty123",
+        }
+        response = api_client.post(url, data, format="json")
+        assert response.status_code == 400
+        assert "password" in response.data
+        assert not User.objects.filter(username="weak").exists()
+
+    def test_login_rehashes_with_configured_iterations(self, api_client, user):
+        hasher = BoundedPBKDF2PasswordHasher()
+        hasher.iterations = 1000
+        user.password = make_password("user123", hasher=hasher)
+        user.save(update_fields=["password"])
+
+        response = api_client.post(
+            reverse("token_obtain_pair"),
+            {"username": "user", "password": "user123"},
+            format="json",
+        )
+        assert response.status_code == 200
+        user.refresh_from_db()
+        assert user.password.split("$")[1] == str(settings.PASSWORD_HASH_ITERATIONS)
+
+    def test_password_hashing_slots_are_bounded(self, api_client):
+        with override_settings(
+            PASSWORD_HASH_SLOTS=1,
+            CACHES={
+                **settings.CACHES,
+                "throttle": {
+                    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                    "LOCATION": "test-password-slots",
+                },
+            },
+        ):
+            caches["throttle"].clear()
+            # слот занят другим процессом: отказ без хэширования
+            slot = passwords._acquire()
+            with pytest.raises(passwords.PasswordHashingBusy):
+                passwords.run_bounded(pytest.fail, "hashed without a slot")
+            # вне DRF (admin, createsuperuser) — обычное исключение, API — 503
+            assert not isinstance(
+                passwords.PasswordHashingBusy(), passwords.APIException
+            )
+            response = api_client.post(
+                reverse("register"),
+                {"username": "busy", "password": "newpass123"},
+                format="json",
+            )
+            assert response.status_code == 503
+            assert response["Retry-After"] == str(settings.BOOKING_OVERLOAD_RETRY_AFTER)
+            passwords._release(*slot)
+            assert passwords.run_bounded(str.upper, "ok") == "OK"
+            # слот освобождён после хэширования
+            assert passwords.run_bounded(str.upper, "again") == "AGAIN"
+
+    def test_password_slots_warn_without_shared_cache(self):
+        locmem = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        with override_settings(DEBUG=False, CACHES={"throttle": locmem}):
+            warnings = passwords.check_shared_slot_cache(None)
+        assert [warning.id for warning in warnings] == ["booking.W001"]
+        redis = {"BACKEND": "django.core.cache.backends.redis.RedisCache"}
+        with override_settings(DEBUG=False, CACHES={"throttle": redis}):
+            assert passwords.check_shared_slot_cache(None) == []
+
 
 # ---------------------------
 # Тесты комнат (Room endpoints)
@@ -116,7 +235,9 @@ class TestRoomEndpoints:
         assert response.status_code == 201
         assert response.data["name"] == "Room 3"
 
-    def test_room_update_and_delete(self, admin_client, room):
+    def test_room_update_and_delete(
+        self, admin_client, room, django_capture_on_commit_callbacks
+    ):
         # Update room
         url = reverse("room-detail", args=[room.id])
         update_data = {"name": "Updated Room", "capacity": 12, "floor": room.floor}
@@ -125,7 +246,8 @@ class TestRoomEndpoints:
         room.refresh_from_db()
         assert room.name == "Updated Room"
         # Delete room
-        response = admin_client.delete(url)
+        with django_capture_on_commit_callbacks(execute=True):
+            response = admin_client.delete(url)
         assert response.status_code == 204
         with pytest.raises(Room.DoesNotExist):
             Room.objects.get(id=room.id)
@@ -151,6 +273,119 @@ class TestRoomEndpoints:
         results = response.data.get("results", response.data)
         assert len(results) == 0
 
+    @override_settings(BOOKING_DELETE_CHUNK_SIZE=2)
+    def test_room_delete_removes_bookings_in_chunks(
+        self, admin_client, room, user, django_capture_on_commit_callbacks
+    ):
+        for month, hour in [(5, 9), (5, 10), (5, 11), (6, 9), (6, 10)]:
+            Booking.objects.create(
+                user=user,
+                room=room,
+                date=datetime.date(2025, month, 1),
+                start_time=datetime.time(hour),
+                end_time=datetime.time(hour + 1),
+            )
+        url = reverse("room-detail", args=[room.id])
+        with CaptureQueriesContext(connection) as ctx:
+            with django_capture_on_commit_callbacks(execute=True):
+                response = admin_client.delete(url)
+        assert response.status_code == 204
+        assert not Room.objects.filter(pk=room.id).exists()
+        assert not Booking.objects.filter(room_id=room.id).exists()
+        assert BookingTombstone.objects.filter(user_id=user.id).count() == 5
+        # брони не выбираются в память, только DELETE пачками по партициям
+        sqls = [q["sql"] for q in ctx.captured_queries]
+        assert not [q for q in sqls if q.startswith('SELECT "booking_booking"')]
+        assert len([q for q in sqls if "LIMIT 2" in q and "DELETE" in q]) == 3
+
+    @override_settings(BOOKING_PURGE_IN_BACKGROUND=True)
+    def test_room_delete_in_background(self, admin_client, room, user):
+        Booking.objects.create(
+            user=user,
+            room=room,
+            date=datetime.date(2025, 5, 1),
+            start_time=datetime.time(9),
+            end_time=datetime.time(10),
+        )
+        response = admin_client.delete(reverse("room-detail", args=[room.id]))
+        assert response.status_code == 204
+        room.refresh_from_db()
+        assert not room.is_active
+
+        slot = {"date": "2025-05-02", "start_time": "10:00", "end_time": "11:00"}
+        admin_client.force_authenticate(user)
+        response = admin_client.get(reverse("room-free-rooms"), slot)
+        assert room.id not in [r["id"] for r in response.data["results"]]
+        response = admin_client.post(
+            reverse("booking-list"), {"room": room.id, **slot}, format="json"
+        )
+        assert response.status_code == 400
+
+        jobs.work(worker="test", once=True)
+        assert not Room.objects.filter(pk=room.id).exists()
+        assert not Booking.objects.filter(room_id=room.id).exists()
+
+    def test_user_delete_removes_bookings(
+        self, room, create_user, django_capture_on_commit_callbacks
+    ):
+        member = create_user(username="leaving", password="leaving123")
+        Booking.objects.create(
+            user=member,
+            room=room,
+            date=datetime.date(2025, 5, 1),
+            start_time=datetime.time(9),
+            end_time=datetime.time(10),
+        )
+        member_id = member.pk
+        with django_capture_on_commit_callbacks(execute=True):
+            member.delete()
+        assert not Booking.objects.filter(user_id=member_id).exists()
+        assert Room.objects.filter(pk=room.id).exists()
+
+    def test_free_rooms_batch(self, auth_client, room, user):
+        small = Room.objects.create(name="Small Room", capacity=2, floor=2)
+        Booking.objects.create(
+            user=user,
+            room=room,
+            date=datetime.date(2025, 5, 1),
+            start_time=datetime.time(10, 0),
+            end_time=datetime.time(11, 0),
+        )
+        slots = [
+            {"date": "2025-05-01", "start_time": "10:30", "end_time": "11:30"},
+            {"date": "2025-05-01", "start_time": "11:00", "end_time": "12:00"},
+            {
+                "date": "2025-05-01",
+                "start_time": "09:00",
+                "end_time": "10:00",
+                "capacity": 5,
+            },
+            {
+                "date": "2025-05-02",
+                "start_time": "10:00",
+                "end_time": "11:00",
+                "floor": 3,
+            },
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            response = auth_client.post(
+                reverse("room-free-rooms-batch"), {"slots": slots}, format="json"
+            )
+        assert response.status_code == 200
+        assert [[r["id"] for r in result["rooms"]] for result in response.data] == [
+            [small.id],
+            [room.id, small.id],
+            [room.id],
+            [],
+        ]
+        assert len([q for q in ctx.captured_queries if "booking_room" in q["sql"]]) == 1
+
+    def test_free_rooms_batch_validation(self, auth_client):
+        url = reverse("room-free-rooms-batch")
+        assert auth_client.post(url, {"slots": []}, format="json").status_code == 400
+        bad = {"date": "2025-05-01", "start_time": "12:00", "end_time": "11:00"}
+        assert auth_client.post(url, {"slots": [bad]}, format="json").status_code == 400
+
 
 # ---------------------------
 # Тесты бронирований (Booking endpoints)
@@ -280,6 +515,1695 @@ class TestBookingEndpoints:
         assert booking.start_time.strftime("%H:%M:%S") == "14:15:00"
         assert booking.end_time.strftime("%H:%M:%S") == "15:00:00"
 
+    def test_staff_list_reads_only_serialized_columns(self, admin_client, room, user):
+        for hour in range(9, 14):
+            Booking.objects.create(
+                user=user,
+                room=room,
+                date=datetime.date(2025, 5, 5),
+                start_time=datetime.time(hour),
+                end_time=datetime.time(hour + 1),
+            )
+        with CaptureQueriesContext(connection) as ctx:
+            response = admin_client.get(reverse("booking-list"))
+        assert response.status_code == 200
+        assert response.data["results"][0]["room"] == room.id
+        sql = next(
+            q["sql"] for q in ctx.captured_queries if "booking_booking" in q["sql"]
+        )
+        assert "JOIN" not in sql
+        assert '"version"' not in sql
+
+        # ширина строки (байт) по оценке планировщика против прежнего
+        # select_related("room", "user")
+        def row_width(sql):
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+                raw = cursor.fetchone()[0]
+            plan = raw if isinstance(raw, list) else json.loads(raw)
+            return plan[0]["Plan"]["Plan Width"]
+
+        joined = Booking.objects.select_related("room", "user").order_by(
+            "date", "start_time", "id"
+        )[:21]
+        assert row_width(sql) * 4 < row_width(str(joined.query))
+
+    def test_list_expand_batches_related(self, admin_client, admin, room, user):
+        other_room = Room.objects.create(name="Other Room", capacity=4, floor=2)
+        for i, (owner, booked) in enumerate(
+            [(user, room), (admin, other_room), (user, other_room)]
+        ):
+            Booking.objects.create(
+                user=owner,
+                room=booked,
+                date=datetime.date(2025, 5, 5),
+                start_time=datetime.time(9 + i),
+                end_time=datetime.time(10 + i),
+            )
+        with CaptureQueriesContext(connection) as ctx:
+            response = admin_client.get(
+                reverse("booking-list"), {"expand": "room,user,unknown"}
+            )
+        assert response.status_code == 200
+        first = response.data["results"][0]
+        assert first["room"]["name"] == "Main Room"
+        assert first["user"] == {
+            "id": user.id,
+            "username": "user",
+            "email": "user@example.com",
+        }
+        # аутентификация + брони + одна выборка комнат + одна пользователей
+        assert len(ctx.captured_queries) == 4
+        assert "password" not in ctx.captured_queries[-1]["sql"]
+
+    def test_create_booking_single_statement(self, auth_client, room, user):
+        url = reverse("booking-list")
+        data = {
+            "room": room.id,
+            "date": "2025-05-05",
+            "start_time": "10:00:00",
+            "end_time": "11:00:00",
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            response = auth_client.post(url, data, format="json")
+        assert response.status_code == 201
+        booking_queries = [
+            q for q in ctx.captured_queries if "booking_booking" in q["sql"]
+        ]
+        assert len(booking_queries) == 1
+        booking = Booking.objects.get(id=response.data["id"])
+        assert booking.user == user
+        assert response.data["start_time"] == "10:00:00"
+
+    def test_create_booking_unknown_room(self, auth_client, room):
+        url = reverse("booking-list")
+        data = {
+            "room": room.id + 100,
+            "date": "2025-05-05",
+            "start_time": "10:00:00",
+            "end_time": "11:00:00",
+        }
+        response = auth_client.post(url, data, format="json")
+        assert response.status_code == 400
+        assert "room" in response.data
+        assert not Booking.objects.exists()
+
+    def test_user_conflict_in_other_room(self, auth_client, room, user):
+        other_room = Room.objects.create(name="Other Room", capacity=4, floor=2)
+        Booking.objects.create(
+            user=user,
+            room=other_room,
+            date=datetime.date(2025, 5, 5),
+            start_time=datetime.time(10, 0),
+            end_time=datetime.time(11, 0),
+        )
+        url = reverse("booking-list")
+        data = {
+            "room": room.id,
+            "date": "2025-05-05",
+            "start_time": "10:30:00",
+            "end_time": "11:30:00",
+        }
+        response = auth_client.post(url, data, format="json")
+        assert response.status_code == 400
+        assert "different room" in response.data["non_field_errors"][0]
+
+    def test_partial_update_single_statement(self, auth_client, room, user):
+        booking = Booking.objects.create(
+            user=user,
+            room=room,
+            date=datetime.date(2025, 5, 5),
+            start_time=datetime.time(10, 0),
+            end_time=datetime.time(11, 0),
+        )
+        url = reverse("booking-detail", args=[booking.id])
+        with CaptureQueriesContext(connection) as ctx:
+            response = auth_client.patch(url, {"date": "2025-06-05"}, format="json")
+        assert response.status_code == 200
+        # выборка объекта для get_object + один запрос проверки и UPDATE
+        booking_queries = [
+            q for q in ctx.captured_queries if "booking_booking" in q["sql"]
+        ]
+        assert len(booking_queries) == 2
+        booking.refresh_from_db()
+        assert booking.date == datetime.date(2025, 6, 5)
+        assert booking.start_time == datetime.time(10, 0)
+
+
+@pytest.mark.django_db
+class TestIdempotentCreate:
+    def _post(self, client, room, key, start="10:00:00", end="11:00:00"):
+        data = {
+            "room": room.id,
+            "date": "2025-05-01",
+            "start_time": start,
+            "end_time": end,
+        }
+        return client.post(
+            reverse("booking-list"), data, format="json", HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_replays_original_response(self, auth_client, room):
+        first = self._post(auth_client, room, "retry-1")
+        assert first.status_code == 201
+        with CaptureQueriesContext(connection) as ctx:
+            retry = self._post(auth_client, room, "retry-1")
+        assert retry.status_code == 201
+        assert retry.data == first.data
+        assert retry["Idempotent-Replayed"] == "true"
+        assert not [q for q in ctx.captured_queries if "booking_booking" in q["sql"]]
+        assert Booking.objects.count() == 1
+
+    def test_key_reused_with_other_body(self, auth_client, room):
+        assert self._post(auth_client, room, "reused").status_code == 201
+        response = self._post(auth_client, room, "reused", "12:00:00", "13:00:00")
+        assert response.status_code == 422
+        assert Booking.objects.count() == 1
+
+    def test_failed_request_releases_key(self, auth_client, room):
+        response = self._post(auth_client, room, "failed", "12:00:00", "11:00:00")
+        assert response.status_code == 400
+        assert not IdempotencyKey.objects.exists()
+        assert self._post(auth_client, room, "failed").status_code == 201
+
+    def test_expired_keys_are_reused_and_pruned(self, settings, auth_client, room):
+        assert self._post(auth_client, room, "old").status_code == 201
+        settings.BOOKING_IDEMPOTENCY_TTL_SECONDS = -1
+        response = self._post(auth_client, room, "old", "12:00:00", "13:00:00")
+        assert response.status_code == 201
+        assert Booking.objects.count() == 2
+        cron.prune_idempotency_keys()
+        assert not IdempotencyKey.objects.exists()
+
+
+@pytest.mark.django_db
+class TestSlotHolds:
+    SLOT = {"date": "2025-05-01", "start_time": "10:00:00", "end_time": "11:00:00"}
+
+    @pytest.fixture
+    def other_client(self, create_user):
+        client = APIClient()
+        client.force_authenticate(create_user(username="other", password="x"))
+        return client
+
+    def _hold(self, client, room, **slot):
+        data = {"room": room.id, **self.SLOT, **slot}
+        return client.post(reverse("booking-hold"), data, format="json")
+
+    def test_held_slot_rejected_without_reading_bookings(
+        self, auth_client, other_client, room
+    ):
+        held = self._hold(auth_client, room)
+        assert held.status_code == 201
+        assert held.data["start_time"] == "10:00:00"
+        with CaptureQueriesContext(connection) as ctx:
+            loser = self._hold(other_client, room, start_time="10:30:00")
+            assert loser.status_code == 409
+            response = other_client.post(
+                reverse("booking-list"),
+                {"room": room.id, **self.SLOT},
+                format="json",
+            )
+        assert response.status_code == 409
+        assert response.data["detail"].code == "slot_held"
+        assert not [q for q in ctx.captured_queries if "booking_booking" in q["sql"]]
+        # соседний интервал свободен
+        assert (
+            self._hold(
+                other_client, room, start_time="11:00:00", end_time="12:00:00"
+            ).status_code
+            == 201
+        )
+
+    def test_free_rooms_hide_held_slots(self, auth_client, other_client, room):
+        self._hold(auth_client, room)
+        params = {**self.SLOT, "start_time": "10:30:00", "end_time": "12:00:00"}
+        rooms = other_client.get(reverse("room-free-rooms"), params).data["results"]
+        assert rooms == []
+        batch = other_client.post(
+            reverse("room-free-rooms-batch"), {"slots": [params]}, format="json"
+        )
+        assert batch.data == [{"rooms": []}]
+        # свой удержанный слот пользователь видит свободным
+        rooms = auth_client.get(reverse("room-free-rooms"), params).data["results"]
+        assert [r["id"] for r in rooms] == [room.id]
+
+    def test_confirm_turns_hold_into_booking(
+        self, auth_client, other_client, room, user
+    ):
+        hold_id = self._hold(auth_client, room).data["id"]
+        response = auth_client.post(reverse("booking-confirm-hold", args=[hold_id]))
+        assert response.status_code == 201
+        booking = Booking.objects.get(pk=response.data["id"])
+        assert (booking.user, booking.start_time) == (user, datetime.time(10))
+        # удержание снято; слот теперь занят бронью
+        assert (
+            auth_client.post(
+                reverse("booking-confirm-hold", args=[hold_id])
+            ).status_code
+            == 404
+        )
+        assert self._hold(other_client, room).status_code == 400
+
+    def test_hold_requires_active_room(self, auth_client, room):
+        missing = self._hold(auth_client, SimpleNamespace(id=room.id + 1000))
+        assert missing.status_code == 400
+        assert "room" in missing.data
+        Room.objects.filter(pk=room.pk).update(is_active=False)
+        assert self._hold(auth_client, room).status_code == 400
+
+    def test_batch_reads_holds_once_per_slot(
+        self, monkeypatch, auth_client, other_client, room
+    ):
+        Room.objects.create(name="Second Room", capacity=4, floor=1)
+        self._hold(auth_client, room)
+        calls = []
+
+        def counted(*args):
+            calls.append(args)
+            return holds.held_rooms(*args)
+
+        monkeypatch.setattr(views, "held_rooms", counted)
+        slots = [
+            self.SLOT,
+            {**self.SLOT, "start_time": "12:00:00", "end_time": "13:00:00"},
+        ]
+        response = other_client.post(
+            reverse("room-free-rooms-batch"), {"slots": slots}, format="json"
+        )
+        assert [len(result["rooms"]) for result in response.data] == [1, 2]
+        assert len(calls) == len(slots)
+
+    def test_hold_is_visible_to_other_workers(self, auth_client, room):
+        # удержание — строка основной БД, а не память процесса
+        hold_id = self._hold(auth_client, room).data["id"]
+        hold = SlotHold.objects.get(pk=hold_id)
+        assert (hold.room_id, hold.start_time) == (room.id, datetime.time(10))
+        cron.prune_expired_holds()
+        assert SlotHold.objects.filter(pk=hold_id).exists()
+        SlotHold.objects.filter(pk=hold_id).update(expires_at=timezone.now())
+        cron.prune_expired_holds()
+        assert not SlotHold.objects.exists()
+
+    def test_hold_expires_and_can_be_cancelled(
+        self, settings, auth_client, other_client, room
+    ):
+        hold_id = self._hold(auth_client, room).data["id"]
+        url = reverse("booking-cancel-hold", args=[hold_id])
+        assert other_client.delete(url).status_code == 404
+        assert auth_client.delete(url).status_code == 204
+        settings.BOOKING_HOLD_SECONDS = 0
+        hold_id = self._hold(other_client, room).data["id"]
+        assert self._hold(auth_client, room).status_code == 201
+        assert (
+            other_client.post(
+                reverse("booking-confirm-hold", args=[hold_id])
+            ).status_code
+            == 404
+        )
+
+
+@pytest.mark.django_db
+class TestAutoAssign:
+    SLOT = {"date": "2025-05-01", "start_time": "10:00:00", "end_time": "11:00:00"}
+
+    @pytest.fixture
+    def rooms(self, db):
+        return {
+            name: Room.objects.create(name=name, capacity=capacity, floor=1)
+            for name, capacity in [("Hall", 20), ("Tight", 4), ("Pair", 4), ("Six", 6)]
+        }
+
+    def _book(self, owner, room, start, end):
+        return Booking.objects.create(
+            user=owner,
+            room=room,
+            date=datetime.date(2025, 5, 1),
+            start_time=datetime.time(start),
+            end_time=datetime.time(end),
+        )
+
+    def _auto(self, client, **slot):
+        return client.post(
+            reverse("booking-auto-assign"), {**self.SLOT, **slot}, format="json"
+        )
+
+    def test_smallest_room_with_least_fragmentation(
+        self, auth_client, create_user, rooms, user
+    ):
+        other = create_user(username="other")
+        # Tight занята вплотную до 10:00, бронь в Pair разрезала бы 9:00–24:00
+        self._book(other, rooms["Tight"], 9, 10)
+        self._book(other, rooms["Pair"], 8, 9)
+        response = self._auto(auth_client, capacity=3)
+        assert response.status_code == 201
+        booking = Booking.objects.get(pk=response.data["id"])
+        assert (booking.room, booking.user) == (rooms["Tight"], user)
+        response = self._auto(
+            auth_client, capacity=5, start_time="12:00:00", end_time="13:00:00"
+        )
+        assert response.data["room"] == rooms["Six"].id
+
+    def test_fragmentation_score(self):
+        assert assignment.fragmentation([(540, 600)], 600, 660) == (0, 840)
+        assert assignment.fragmentation([(480, 540)], 600, 660) == (1, 900)
+        assert assignment.fragmentation([(540, 600), (660, 720)], 600, 660) == (-1, 60)
+
+    def test_retries_room_taken_after_search(
+        self, monkeypatch, settings, auth_client, create_user, rooms
+    ):
+        other = create_user(username="other")
+        search = assignment.free_rooms_batch
+
+        def racing_search(slots):
+            found = search(slots)
+            # между поиском и записью лучшую комнату бронирует другой
+            self._book(other, rooms["Tight"], 10, 11)
+            return found
+
+        monkeypatch.setattr(assignment, "free_rooms_batch", racing_search)
+        response = self._auto(auth_client, capacity=4)
+        assert response.status_code == 201
+        assert response.data["room"] == rooms["Pair"].id
+
+        settings.BOOKING_AUTO_ASSIGN_ATTEMPTS = 1
+        monkeypatch.setattr(assignment, "free_rooms_batch", search)
+        response = self._auto(auth_client, capacity=4, start_time="10:30:00")
+        assert response.status_code == 400  # пересечение с собственной бронью
+        response = self._auto(auth_client, capacity=50)
+        assert response.status_code == 409
+        assert response.data["detail"].code == "no_room_available"
+
+
+@pytest.mark.django_db(transaction=True)
+@override_settings(BOOKING_DELETE_CHUNK_SIZE=1)
+def test_user_purge_runs_after_delete_commits(monkeypatch, room, create_user):
+    member = create_user(username="leaving", password="leaving123")
+    for hour in (9, 10, 11):
+        Booking.objects.create(
+            user=member,
+            room=room,
+            date=datetime.date(2025, 5, 1),
+            start_time=datetime.time(hour),
+            end_time=datetime.time(hour + 1),
+        )
+    chunks = []
+    delete_bookings = purge.delete_bookings
+
+    def tracked(column, value, using="default"):
+        # вне транзакции удаления: каждая пачка коммитится сама
+        chunks.append(connections[using].in_atomic_block)
+        return delete_bookings(column, value, using)
+
+    monkeypatch.setattr(purge, "delete_bookings", tracked)
+    member_id = member.pk
+    with transaction.atomic():
+        member.delete()
+        assert Booking.objects.filter(user_id=member_id).count() == 3
+    assert chunks == [False]
+    assert not Booking.objects.filter(user_id=member_id).exists()
+
+
+# ---------------------------
+# Сериализация записей в комнату
+# ---------------------------
+@pytest.mark.django_db(transaction=True)
+class TestBookingRoomLocks:
+    @pytest.fixture(autouse=True)
+    def room_locks(self, settings):
+        settings.BOOKING_ROOM_LOCKS = True
+        settings.BOOKING_ROOM_LOCK_TIMEOUT_MS = 2000
+
+    def _post(self, token, data):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        started = time.monotonic()
+        try:
+            response = client.post(reverse("booking-list"), data, format="json")
+            return response.status_code, time.monotonic() - started
+        finally:
+            connections.close_all()
+
+    @pytest.mark.parametrize("advisory", [True, False])
+    def test_parallel_posts_do_not_overlap(self, settings, create_user, room, advisory):
+        # без BOOKING_ROOM_LOCKS записи упорядочивает блокировка строки комнаты
+        settings.BOOKING_ROOM_LOCKS = advisory
+        tokens = [
+            str(RefreshToken.for_user(create_user(username=f"racer{i}")).access_token)
+            for i in range(8)
+        ]
+        slots = [("09:00:00", "10:00:00"), ("09:30:00", "10:30:00")]
+        barrier = threading.Barrier(len(tokens))
+
+        def attempt(i):
+            start, end = slots[i % 2]
+            data = {
+                "room": room.id,
+                "date": "2025-05-05",
+                "start_time": start,
+                "end_time": end,
+            }
+            barrier.wait()
+            return self._post(tokens[i], data)
+
+        with ThreadPoolExecutor(max_workers=len(tokens)) as pool:
+            results = list(pool.map(attempt, range(len(tokens))))
+
+        statuses = [code for code, _ in results]
+        assert statuses.count(201) == 1
+        assert set(statuses) <= {201, 400}
+        assert Booking.objects.filter(room=room).count() == 1
+        # ожидание блокировки ограничено lock_timeout
+        assert max(elapsed for _, elapsed in results) < 2 + 3
+
+    def test_lock_timeout_returns_409(self, settings, user, room):
+        settings.BOOKING_ROOM_LOCK_TIMEOUT_MS = 200
+        date = datetime.date(2025, 5, 5)
+        token = str(RefreshToken.for_user(user).access_token)
+        data = {
+            "room": room.id,
+            "date": date.isoformat(),
+            "start_time": "09:00:00",
+            "end_time": "10:00:00",
+        }
+        # удерживаем блокировку комнаты в другой транзакции
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_advisory_xact_lock(%s, %s)",
+                    [room.id, date.toordinal()],
+                )
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                code, elapsed = pool.submit(self._post, token, data).result()
+        assert code == 409
+        assert elapsed < 2
+        assert not Booking.objects.exists()
+
+    def test_room_row_lock_timeout_returns_409(self, settings, user, room):
+        settings.BOOKING_ROOM_LOCK_TIMEOUT_MS = 200
+        token = str(RefreshToken.for_user(user).access_token)
+        data = {
+            "room": room.id,
+            "date": "2025-05-05",
+            "start_time": "09:00:00",
+            "end_time": "10:00:00",
+        }
+        # комнату выключают в другой транзакции: FOR KEY SHARE ждёт её
+        with transaction.atomic():
+            Room.objects.select_for_update().get(pk=room.pk)
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                code, elapsed = pool.submit(self._post, token, data).result()
+        assert code == 409
+        assert elapsed < 2
+        assert not Booking.objects.exists()
+
+
+# ---------------------------
+# Фоновая очередь задач
+# ---------------------------
+CALLS = []
+
+
+@jobs.job("test.record")
+def record_job(value):
+    CALLS.append(value)
+
+
+@jobs.job("test.fail")
+def failing_job():
+    raise RuntimeError("boom")
+
+
+@pytest.mark.django_db
+class TestJobQueue:
+    @pytest.fixture(autouse=True)
+    def clear_calls(self):
+        CALLS.clear()
+
+    def test_enqueued_job_runs_and_keeps_history(self):
+        queued = jobs.enqueue("test.record", value=42)
+        assert queued.status == Job.QUEUED
+        jobs.work(worker="test", once=True)
+        queued.refresh_from_db()
+        assert CALLS == [42]
+        assert queued.status == Job.DONE
+        assert queued.attempts == 1
+        assert queued.worker == "test"
+        assert queued.duration is not None
+        [run] = queued.runs.all()
+        assert (run.attempt, run.worker, run.outcome) == (1, "test", JobRun.DONE)
+        assert run.duration is not None
+
+    def test_failed_job_is_retried_then_marked_failed(self, settings):
+        settings.JOB_RETRY_DELAY_SECONDS = 0
+        queued = jobs.enqueue("test.fail", max_attempts=2)
+        jobs.work(worker="test", once=True)
+        queued.refresh_from_db()
+        assert queued.status == Job.FAILED
+        assert queued.attempts == 2
+        assert "boom" in queued.last_error
+        runs = list(queued.runs.all())
+        assert [run.attempt for run in runs] == [1, 2]
+        assert all(run.outcome == JobRun.FAILED for run in runs)
+        assert all("boom" in run.error for run in runs)
+
+    def test_retry_is_delayed(self):
+        queued = jobs.enqueue("test.fail", max_attempts=3)
+        jobs.work(worker="test", once=True)
+        queued.refresh_from_db()
+        assert queued.status == Job.QUEUED
+        assert queued.attempts == 1
+        assert jobs.claim("test") is None
+
+    def test_run_that_lost_its_lease_keeps_job_state(self, settings):
+        queued = jobs.enqueue("test.fail", max_attempts=1)
+        first = jobs.claim("first")
+        # аренда истекла, задачу перехватил другой воркер
+        Job.objects.filter(pk=queued.pk).update(
+            started_at=timezone.now()
+            - datetime.timedelta(seconds=settings.JOB_LEASE_SECONDS + 1)
+        )
+        assert jobs.claim("second").pk == queued.pk
+        jobs.run(first)
+
+        queued.refresh_from_db()
+        assert (queued.status, queued.worker) == (Job.RUNNING, "second")
+        assert queued.last_error == ""
+        assert [(run.worker, run.outcome) for run in queued.runs.all()] == [
+            ("first", JobRun.FAILED),
+            ("second", JobRun.RUNNING),
+        ]
+
+    def test_delayed_job_is_not_claimed(self):
+        jobs.enqueue("test.record", delay=60, value=1)
+        assert jobs.claim("test") is None
+
+    def test_unknown_job_rejected(self):
+        with pytest.raises(LookupError):
+            jobs.enqueue("test.missing")
+
+    def test_cron_entry_points_enqueue_once(self):
+        cron.run_partition_manager()
+        cron.run_partition_manager()
+        cron.db_maintenance()
+        assert sorted(Job.objects.values_list("name", flat=True)) == [
+            "db_maintenance",
+            "partition_manager",
+        ]
+
+    def test_cron_job_scheduled_once_per_window(self, settings):
+        scheduled = cron.schedule("events.prune")
+        jobs.work(worker="test", once=True)
+        scheduled.refresh_from_db()
+        assert scheduled.status == Job.DONE
+        # cron другого контейнера в тот же запуск задачу уже не ставит
+        assert cron.schedule("events.prune") is None
+        settings.CRON_SINGLE_RUN_WINDOW_SECONDS = 0
+        assert cron.schedule("events.prune") is not None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_job_claims_skip_locked_rows():
+    first = jobs.enqueue("test.record", value=1)
+    second = jobs.enqueue("test.record", value=2)
+    # первая задача заблокирована «другим воркером» в открытой транзакции
+    with transaction.atomic():
+        Job.objects.select_for_update().get(pk=first.pk)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+
+            def claim_in_thread():
+                try:
+                    return jobs.claim("other")
+                finally:
+                    connections.close_all()
+
+            claimed = pool.submit(claim_in_thread).result()
+    assert claimed.pk == second.pk
+
+
+@pytest.mark.django_db(transaction=True)
+def test_exclusive_job_skipped_while_running_elsewhere():
+    queued = jobs.enqueue("events.prune")
+    locked, release = threading.Event(), threading.Event()
+
+    def hold_lock():
+        # «другой воркер» выполняет ту же задачу
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_advisory_lock(%s)", [jobs.advisory_key("events.prune")]
+                )
+                locked.set()
+                release.wait(5)
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        holder = pool.submit(hold_lock)
+        assert locked.wait(5)
+        jobs.work(worker="test", once=True)
+        release.set()
+        holder.result()
+    queued.refresh_from_db()
+    assert queued.status == Job.SKIPPED
+    assert queued.finished_at is not None
+
+    again = jobs.enqueue("events.prune")
+    jobs.work(worker="test", once=True)
+    again.refresh_from_db()
+    assert again.status == Job.DONE
+
+
+# ---------------------------
+# Агрегаты загрузки комнат
+# ---------------------------
+@pytest.mark.django_db
+class TestUsageAggregates:
+    def _book(self, user, room, start, end, day=datetime.date(2025, 5, 6)):
+        return Booking.objects.create(
+            user=user,
+            room=room,
+            date=day,
+            start_time=datetime.time(*start),
+            end_time=datetime.time(*end),
+        )
+
+    def test_refresh_usage(self, create_user, room):
+        other_room = Room.objects.create(name="Floor 1 B", capacity=4, floor=1)
+        alice = create_user(username="alice")
+        bob = create_user(username="bob")
+        self._book(alice, room, (9, 0), (10, 30))
+        self._book(alice, room, (11, 0), (12, 0))
+        self._book(bob, other_room, (10, 0), (11, 0))
+        # начинается ровно в момент окончания — не пересекается
+        self._book(bob, other_room, (11, 0), (11, 15))
+        usage.refresh_usage(datetime.date(2025, 5, 1), datetime.date(2025, 5, 31))
+
+        minutes = dict(RoomDailyUsage.objects.values_list("room_id", "minutes_booked"))
+        assert minutes == {room.id: 150, other_room.id: 75}
+        peak = FloorDailyPeak.objects.get(floor=1, date=datetime.date(2025, 5, 6))
+        assert peak.peak_concurrency == 2
+
+    def test_booking_writes_schedule_refresh(self, auth_client, room):
+        data = {
+            "room": room.id,
+            "date": "2025-05-06",
+            "start_time": "10:00:00",
+            "end_time": "11:00:00",
+        }
+        response = auth_client.post(reverse("booking-list"), data, format="json")
+        assert response.status_code == 201
+        assert Job.objects.filter(name="usage.refresh_day").count() == 1
+        jobs.work(worker="test", once=True)
+        row = RoomDailyUsage.objects.get(room=room)
+        assert (row.minutes_booked, row.bookings) == (60, 1)
+
+        auth_client.delete(reverse("booking-detail", args=[response.data["id"]]))
+        jobs.work(worker="test", once=True)
+        assert not RoomDailyUsage.objects.exists()
+
+    def test_stats_endpoint_reads_only_aggregates(self, admin_client, room, user):
+        self._book(user, room, (9, 0), (10, 0))
+        usage.refresh_usage(datetime.date(2025, 5, 6), datetime.date(2025, 5, 6))
+        with CaptureQueriesContext(connection) as ctx:
+            response = admin_client.get(
+                reverse("room-usage-list"), {"date__gte": "2025-05-01"}
+            )
+        assert response.status_code == 200
+        assert response.data["results"] == [
+            {
+                "room": room.id,
+                "date": "2025-05-06",
+                "minutes_booked": 60,
+                "bookings": 1,
+            }
+        ]
+        assert not any('"booking_booking"' in q["sql"] for q in ctx.captured_queries)
+        response = admin_client.get(reverse("floor-peak-list"), {"floor": room.floor})
+        assert response.data["results"][0]["peak_concurrency"] == 1
+
+    def test_stats_endpoint_staff_only(self, auth_client):
+        response = auth_client.get(reverse("room-usage-list"))
+        assert response.status_code == 403
+
+
+@pytest.fixture
+def second_site_db():
+    """«БД площадки» — ещё одно соединение с тестовой БД: брони видны дважды."""
+    connections.settings["site_test"] = dict(connections["default"].settings_dict)
+    yield "site_test"
+    connections["site_test"].close()
+    del connections["site_test"]
+    del connections.settings["site_test"]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_usage_sums_every_booking_database(monkeypatch, second_site_db, user, room):
+    monkeypatch.setattr(usage, "booking_databases", lambda: ["default", second_site_db])
+    Booking.objects.create(
+        user=user,
+        room=room,
+        date=datetime.date(2025, 5, 6),
+        start_time=datetime.time(9),
+        end_time=datetime.time(10),
+    )
+    usage.refresh_usage(datetime.date(2025, 5, 6), datetime.date(2025, 5, 6))
+    row = RoomDailyUsage.objects.get(room=room)
+    assert (row.minutes_booked, row.bookings) == (120, 2)
+    # пик — по сумме одновременности всех БД, а не максимум пиков
+    assert FloorDailyPeak.objects.get(floor=room.floor).peak_concurrency == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_overlapping_usage_refreshes_run_one_at_a_time(user, room):
+    day = datetime.date(2025, 5, 6)
+    Booking.objects.create(
+        user=user,
+        room=room,
+        date=day,
+        start_time=datetime.time(9),
+        end_time=datetime.time(10),
+    )
+    locked, release = threading.Event(), threading.Event()
+
+    def refresh_day_elsewhere():
+        # пересчёт этого дня в другом воркере ещё не закоммичен
+        try:
+            with transaction.atomic():
+                usage._lock_days(day, day)
+                locked.set()
+                release.wait(5)
+        finally:
+            connections.close_all()
+
+    def refresh_month():
+        try:
+            usage.refresh_usage(day.replace(day=1), datetime.date(2025, 5, 31))
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        holder = pool.submit(refresh_day_elsewhere)
+        assert locked.wait(5)
+        month = pool.submit(refresh_month)
+        time.sleep(0.3)
+        assert not month.done()
+        release.set()
+        holder.result()
+        month.result(timeout=5)
+    assert RoomDailyUsage.objects.get(room=room, date=day).minutes_booked == 60
+
+
+# ---------------------------
+# Лента изменений броней
+# ---------------------------
+@pytest.mark.django_db
+class TestBookingEvents:
+    @pytest.fixture(autouse=True)
+    def fast_polling(self, settings):
+        settings.BOOKING_EVENTS_POLL_SECONDS = 0.01
+        settings.BOOKING_EVENTS_LONGPOLL_SECONDS = 0
+        settings.BOOKING_EVENTS_STREAM_SECONDS = 0.05
+
+    def _create(self, client, room, start="10:00:00", end="11:00:00"):
+        data = {
+            "room": room.id,
+            "date": "2025-05-07",
+            "start_time": start,
+            "end_time": end,
+        }
+        response = client.post(reverse("booking-list"), data, format="json")
+        assert response.status_code == 201
+        return response.data["id"]
+
+    def test_writes_are_logged(self, auth_client, room):
+        booking_id = self._create(auth_client, room)
+        url = reverse("booking-detail", args=[booking_id])
+        auth_client.patch(url, {"end_time": "11:30:00"}, format="json")
+        auth_client.delete(url)
+        events = list(BookingEvent.objects.values_list("booking_id", "action"))
+        assert events == [
+            (booking_id, BookingEvent.CREATED),
+            (booking_id, BookingEvent.UPDATED),
+            (booking_id, BookingEvent.DELETED),
+        ]
+        assert not Booking.objects.filter(id=booking_id).exists()
+
+    def test_rejected_write_is_not_logged(self, auth_client, room):
+        self._create(auth_client, room)
+        data = {
+            "room": room.id,
+            "date": "2025-05-07",
+            "start_time": "10:30:00",
+            "end_time": "11:30:00",
+        }
+        response = auth_client.post(reverse("booking-list"), data, format="json")
+        assert response.status_code == 400
+        assert BookingEvent.objects.count() == 1
+
+    def test_long_poll_returns_delta(self, auth_client, room):
+        first = self._create(auth_client, room)
+        since = BookingEvent.objects.get().id
+        second = self._create(auth_client, room, "12:00:00", "13:00:00")
+        response = auth_client.get(reverse("booking-events"), {"since": since})
+        assert response.status_code == 200
+        body = response.json()
+        assert [e["booking"] for e in body["results"]] == [second]
+        last = BookingEvent.objects.get(booking_id=second)
+        assert body["next_since"] == f"{last.txid}-{last.id}"
+        # пустая дельта после таймаута
+        response = auth_client.get(
+            reverse("booking-events"), {"since": body["next_since"]}
+        )
+        assert response.json() == {"results": [], "next_since": body["next_since"]}
+        assert first != second
+
+    def test_users_see_only_own_events(self, auth_client, room, admin):
+        own = self._create(auth_client, room)
+        staff_client = APIClient()
+        refresh = RefreshToken.for_user(admin)
+        staff_client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        self._create(staff_client, room, "12:00:00", "13:00:00")
+        response = auth_client.get(reverse("booking-events"), {"since": 0})
+        assert [e["booking"] for e in response.json()["results"]] == [own]
+        response = staff_client.get(reverse("booking-events"), {"since": 0})
+        assert len(response.json()["results"]) == 2
+
+    def test_requires_authentication(self, api_client):
+        response = api_client.get(reverse("booking-events"))
+        assert response.status_code == 401
+
+    @staticmethod
+    async def _consume(response):
+        return b"".join([chunk async for chunk in response.streaming_content]).decode()
+
+    def test_sse_stream(self, auth_client, room):
+        booking_id = self._create(auth_client, room)
+        response = auth_client.get(
+            reverse("booking-events-stream"), HTTP_LAST_EVENT_ID="0"
+        )
+        assert response["Content-Type"] == "text/event-stream"
+        body = async_to_sync(self._consume)(response)
+        event = BookingEvent.objects.get()
+        assert f"id: {event.txid}-{event.id}\nevent: created\n" in body
+        assert f'"booking": {booking_id}' in body
+
+
+@pytest.mark.django_db(transaction=True)
+def test_events_wait_for_earlier_uncommitted_writes(settings, auth_client, user, room):
+    settings.BOOKING_EVENTS_LONGPOLL_SECONDS = 0
+    started, finish = threading.Event(), threading.Event()
+
+    def slow_writer():
+        try:
+            with transaction.atomic():
+                create_booking(
+                    user,
+                    room.id,
+                    datetime.date(2025, 5, 8),
+                    datetime.time(9),
+                    datetime.time(10),
+                )
+                started.set()
+                finish.wait(5)
+        finally:
+            connections.close_all()
+
+    writer = threading.Thread(target=slow_writer)
+    writer.start()
+    try:
+        assert started.wait(5)
+        # событие с меньшим id ещё не закоммичено: более позднее не отдаём,
+        # иначе клиент прошёл бы мимо первого (другая комната — первая
+        # заблокирована записью, booking.services)
+        other = Room.objects.create(name="Other", capacity=4, floor=1)
+        later = create_booking(
+            user,
+            other.id,
+            datetime.date(2025, 5, 9),
+            datetime.time(11),
+            datetime.time(12),
+        )
+        body = auth_client.get(reverse("booking-events"), {"since": 0}).json()
+        assert body["results"] == []
+    finally:
+        finish.set()
+        writer.join()
+    body = auth_client.get(
+        reverse("booking-events"), {"since": body["next_since"]}
+    ).json()
+    assert [e["start_time"] for e in body["results"]] == ["09:00:00", "11:00:00"]
+    assert body["results"][1]["booking"] == later.id
+
+
+@pytest.mark.django_db(transaction=True)
+def test_events_read_every_booking_database(
+    monkeypatch, settings, second_site_db, auth_client, user, room
+):
+    settings.BOOKING_EVENTS_LONGPOLL_SECONDS = 0
+    monkeypatch.setattr(
+        events, "booking_databases", lambda: ["default", second_site_db]
+    )
+    booking = create_booking(
+        user, room.id, datetime.date(2025, 5, 8), datetime.time(9), datetime.time(10)
+    )
+    body = auth_client.get(reverse("booking-events"), {"since": 0}).json()
+    assert [e["booking"] for e in body["results"]] == [booking.id, booking.id]
+    event = BookingEvent.objects.get()
+    position = f"{event.txid}-{event.id}"
+    assert body["next_since"] == f"{position},{second_site_db}:{position}"
+    body = auth_client.get(
+        reverse("booking-events"), {"since": body["next_since"]}
+    ).json()
+    assert body["results"] == []
+
+
+# ---------------------------
+# Инкрементальная синхронизация
+# ---------------------------
+@pytest.mark.django_db
+class TestBookingSync:
+    def _book(self, user, room, hour):
+        return Booking.objects.create(
+            user=user,
+            room=room,
+            date=datetime.date(2025, 5, 8),
+            start_time=datetime.time(hour),
+            end_time=datetime.time(hour + 1),
+        )
+
+    def _sync(self, client, token=None):
+        params = {"since": token} if token else {}
+        response = client.get(reverse("booking-sync"), params)
+        assert response.status_code == 200
+        return response.data
+
+    def test_sync_returns_only_changes(self, auth_client, user, room):
+        first = self._book(user, room, 9)
+        second = self._book(user, room, 10)
+        data = self._sync(auth_client)
+        assert [b["id"] for b in data["results"]] == [first.id, second.id]
+        assert data["deleted"] == []
+        assert not data["has_more"]
+
+        token = data["next"]
+        assert self._sync(auth_client, token)["results"] == []
+
+        second.end_time = datetime.time(11, 30)
+        second.save()
+        first_id = first.id
+        first.delete()
+        data = self._sync(auth_client, token)
+        assert [b["id"] for b in data["results"]] == [second.id]
+        assert data["results"][0]["end_time"] == "11:30:00"
+        assert data["deleted"] == [first_id]
+
+    def test_sync_is_scoped_to_user(self, auth_client, create_user, user, room):
+        other = create_user(username="other")
+        self._book(other, room, 9).delete()
+        self._book(other, room, 12)
+        own = self._book(user, room, 14)
+        data = self._sync(auth_client)
+        assert [b["id"] for b in data["results"]] == [own.id]
+        assert data["deleted"] == []
+
+    def test_sync_pages_with_continuation(self, settings, auth_client, user, room):
+        settings.BOOKING_SYNC_PAGE_SIZE = 2
+        ids = [self._book(user, room, hour).id for hour in (8, 9, 10)]
+        page = self._sync(auth_client)
+        assert page["has_more"]
+        rest = self._sync(auth_client, page["next"])
+        assert not rest["has_more"]
+        assert [b["id"] for b in page["results"] + rest["results"]] == ids
+
+    def _move_to_july(self, booking):
+        # смена даты переносит строку в другую партицию (DELETE + INSERT)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS booking_booking_2025_jul "
+                "PARTITION OF booking_booking "
+                "FOR VALUES FROM ('2025-07-01') TO ('2025-08-01')"
+            )
+        Booking.objects.filter(pk=booking.pk).update(date=datetime.date(2025, 7, 1))
+        assert BookingTombstone.objects.filter(booking_id=booking.pk).exists()
+
+    def test_moved_booking_is_not_reported_deleted(self, auth_client, user, room):
+        booking = self._book(user, room, 9)
+        token = self._sync(auth_client)["next"]
+        self._move_to_july(booking)
+        data = self._sync(auth_client, token)
+        assert [b["id"] for b in data["results"]] == [booking.id]
+        assert data["deleted"] == []
+
+    def test_moved_booking_tombstone_on_next_page(
+        self, settings, auth_client, user, room
+    ):
+        settings.BOOKING_SYNC_PAGE_SIZE = 1
+        booking = self._book(user, room, 9)
+        token = self._sync(auth_client)["next"]
+        self._move_to_july(booking)
+        page = self._sync(auth_client, token)
+        assert [b["id"] for b in page["results"]] == [booking.id]
+        assert page["has_more"]
+        # tombstone переноса — на следующей странице
+        rest = self._sync(auth_client, page["next"])
+        assert (rest["results"], rest["deleted"]) == ([], [])
+        assert not rest["has_more"]
+
+    def test_invalid_and_expired_tokens(self, settings, auth_client):
+        response = auth_client.get(reverse("booking-sync"), {"since": "garbage"})
+        assert response.status_code == 400
+        token = self._sync(auth_client)["next"]
+        settings.BOOKING_SYNC_RETENTION_DAYS = -1
+        response = auth_client.get(reverse("booking-sync"), {"since": token})
+        assert response.status_code == 410
+
+
+@pytest.mark.django_db(transaction=True)
+def test_sync_waits_for_earlier_uncommitted_versions(auth_client, user, room):
+    started, finish = threading.Event(), threading.Event()
+
+    def slow_writer():
+        try:
+            with transaction.atomic():
+                Booking.objects.create(
+                    user=user,
+                    room=room,
+                    date=datetime.date(2025, 5, 8),
+                    start_time=datetime.time(9),
+                    end_time=datetime.time(10),
+                )
+                started.set()
+                finish.wait(5)
+        finally:
+            connections.close_all()
+
+    writer = threading.Thread(target=slow_writer)
+    writer.start()
+    try:
+        assert started.wait(5)
+        # меньшая версия ещё не закоммичена: более позднюю бронь не отдаём,
+        # иначе клиент прошёл бы мимо первой
+        later = Booking.objects.create(
+            user=user,
+            room=room,
+            date=datetime.date(2025, 5, 8),
+            start_time=datetime.time(11),
+            end_time=datetime.time(12),
+        )
+        data = auth_client.get(reverse("booking-sync")).data
+        assert data["results"] == []
+    finally:
+        finish.set()
+        writer.join()
+    data = auth_client.get(reverse("booking-sync"), {"since": data["next"]}).data
+    assert [b["start_time"] for b in data["results"]] == ["09:00:00", "11:00:00"]
+    assert data["results"][1]["id"] == later.id
+
+
+@pytest.mark.django_db(transaction=True)
+def test_sync_reads_every_booking_database(
+    monkeypatch, second_site_db, auth_client, user, room
+):
+    monkeypatch.setattr(sync, "booking_databases", lambda: ["default", second_site_db])
+    booking = Booking.objects.create(
+        user=user,
+        room=room,
+        date=datetime.date(2025, 5, 8),
+        start_time=datetime.time(9),
+        end_time=datetime.time(10),
+    )
+    data = auth_client.get(reverse("booking-sync")).data
+    assert [b["id"] for b in data["results"]] == [booking.id, booking.id]
+    # позиция продолжения — для каждой БД
+    assert set(sync.read_token(data["next"])) == {"default", second_site_db}
+    data = auth_client.get(reverse("booking-sync"), {"since": data["next"]}).data
+    assert data["results"] == []
+
+
+# ---------------------------
+# План запроса списка бронирований
+# ---------------------------
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def _partition_indexes(index_name):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [index_name],
+        )
+        return {row[0] for row in cursor.fetchall()} | {index_name}
+
+
+@pytest.mark.django_db
+def test_closed_partitions_switch_to_brin():
+    partition = "booking_booking_2020_jan"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE {partition} PARTITION OF booking_booking "
+            "FOR VALUES FROM ('2020-01-01') TO ('2020-02-01')"
+        )
+    # DEFAULT-партиция уже в горячем профиле (миграция), новая — получает его
+    changed = indexes.apply_index_profiles(today=datetime.date(2020, 1, 15))
+    assert changed == {partition: indexes.HOT}
+    assert indexes.existing_indexes(partition) == set(indexes.PROFILES[indexes.HOT])
+
+    assert indexes.apply_index_profiles() == {partition: indexes.CLOSED}
+    assert indexes.existing_indexes(partition) == {"date_brin"}
+
+    out = io.StringIO()
+    call_command("partition_index_report", rows=500, stdout=out)
+    report = out.getvalue()
+    assert f"{partition:<32} closed" in report
+    assert "экономия индексов" in report
+    assert "индексы те же, что до профилей" in report
+
+    out = io.StringIO()
+    with override_settings(BOOKING_COMPACT_TIME=True):
+        call_command("partition_index_report", rows=500, stdout=out)
+    assert "мкс с индексами до профилей" in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_check_partitions_health_report(user, room, tmp_path):
+    # бронь на месяц без партиции попадает в DEFAULT
+    Booking.objects.create(
+        user=user,
+        room=room,
+        date=datetime.date.today(),
+        start_time=datetime.time(10),
+        end_time=datetime.time(11),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE booking_booking")
+    # вторая бронь после ANALYZE: reltuples её ещё не видит
+    Booking.objects.create(
+        user=user,
+        room=room,
+        date=datetime.date.today(),
+        start_time=datetime.time(11),
+        end_time=datetime.time(12),
+    )
+    with pytest.raises(CommandError, match="Не найдено"):
+        call_command("check_partitions", stdout=io.StringIO())
+
+    out = io.StringIO()
+    call_command("check_partitions", format="json", stdout=out)
+    (report,) = json.loads(out.getvalue())
+    assert report["database"] == "default"
+    assert len(report["missing_months"]) == 3
+    (default,) = report["partitions"]
+    assert default["kind"] == "default"
+    assert default["rows"] == report["default_rows"] == 2
+    assert default["table_bytes"] > 0 and default["index_bytes"] > 0
+
+    month = datetime.date.today().replace(day=1)
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM booking_booking")
+        for i in range(3):
+            lower = month + relativedelta(months=i)
+            cursor.execute(
+                f"CREATE TABLE booking_booking_{lower:%Y_%b}".lower()
+                + " PARTITION OF booking_booking "
+                f"FOR VALUES FROM ('{lower}') TO ('{lower + relativedelta(months=1)}')"
+            )
+        cursor.execute("ANALYZE booking_booking")
+    out = io.StringIO()
+    call_command("check_partitions", stdout=out)
+    assert "Партиции в порядке" in out.getvalue()
+
+    path = tmp_path / "partitions.prom"
+    call_command("check_partitions", format="prometheus", output=str(path))
+    metrics = path.read_text()
+    assert 'booking_partition_default_rows{database="default"} 0' in metrics
+    horizon = (month + relativedelta(months=3) - datetime.date.today()).days
+    assert f'booking_partition_horizon_days{{database="default"}} {horizon}' in metrics
+    assert 'booking_partition_missing_months{database="default"} 0' in metrics
+    assert metrics.count("booking_partition_rows{") == 4
+
+
+# ---------------------------
+# Компактное время (минуты суток)
+# ---------------------------
+@pytest.mark.django_db
+class TestCompactTime:
+    def _post(self, client, room, start, end, day="2025-05-06"):
+        data = {"room": room.id, "date": day, "start_time": start, "end_time": end}
+        return client.post(reverse("booking-list"), data, format="json")
+
+    def test_trigger_rounds_seconds_outwards(self, user, room):
+        booking = Booking.objects.create(
+            user=user,
+            room=room,
+            date=datetime.date(2025, 5, 6),
+            start_time=datetime.time(9, 0, 30),
+            end_time=datetime.time(10, 0, 30),
+        )
+        minutes = Booking.objects.values_list("start_minute", "end_minute")
+        assert minutes.get(pk=booking.pk) == (540, 601)
+
+    def test_checks_filter_by_minutes_and_stay_exact(self, settings, auth_client, room):
+        settings.BOOKING_COMPACT_TIME = True
+        assert self._post(auth_client, room, "09:00:00", "10:00:30").status_code == 201
+        # та же минута 10:00, но интервалы не пересекаются
+        with CaptureQueriesContext(connection) as ctx:
+            response = self._post(auth_client, room, "10:00:30", "11:00:00")
+        assert response.status_code == 201
+        (insert,) = [q["sql"] for q in ctx.captured_queries if "checks AS" in q["sql"]]
+        assert "start_minute <" in insert
+        assert response.data["start_time"] == "10:00:30"
+        assert "start_minute" not in response.data
+        assert self._post(auth_client, room, "10:00:00", "10:00:40").status_code == 400
+
+        slot = {"date": "2025-05-06", "start_time": "09:30:00", "end_time": "09:45:00"}
+        response = auth_client.get(reverse("room-free-rooms"), slot)
+        assert response.data["results"] == []
+        response = auth_client.post(
+            reverse("room-free-rooms-batch"), {"slots": [slot]}, format="json"
+        )
+        assert response.data == [{"rooms": []}]
+
+    def test_hot_partitions_switch_to_minute_indexes(self, settings):
+        partition = "booking_booking_2020_jan"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE {partition} PARTITION OF booking_booking "
+                "FOR VALUES FROM ('2020-01-01') TO ('2020-02-01')"
+            )
+        settings.BOOKING_COMPACT_TIME = True
+        today = datetime.date(2020, 1, 15)
+        indexes.apply_index_profiles(today=today)
+        assert indexes.existing_indexes(partition) == set(indexes.COMPACT_HOT)
+        assert indexes.cluster_suffix() == "date_minutes_room"
+
+    def test_backfill_keeps_sync_versions(self, user, room):
+        booking = Booking.objects.create(
+            user=user,
+            room=room,
+            date=datetime.date(2025, 5, 6),
+            start_time=datetime.time(9),
+            end_time=datetime.time(10),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ALTER TABLE booking_booking DISABLE TRIGGER USER")
+            cursor.execute("UPDATE booking_booking SET start_minute = NULL")
+            cursor.execute("ALTER TABLE booking_booking ENABLE TRIGGER USER")
+        version = Booking.objects.values_list("version", flat=True).get(pk=booking.pk)
+
+        migration = importlib.import_module(
+            "booking.migrations.0013_backfill_booking_minutes"
+        )
+        migration.backfill_minutes(None, SimpleNamespace(connection=connection))
+        row = Booking.objects.values("start_minute", "end_minute", "version").get(
+            pk=booking.pk
+        )
+        assert row == {"start_minute": 540, "end_minute": 600, "version": version}
+
+
+@pytest.mark.django_db
+class TestBookingListPlan:
+    @pytest.fixture
+    def bookings(self, user, admin):
+        rooms = [
+            Room.objects.create(name=f"Plan Room {i}", capacity=4, floor=i % 3)
+            for i in range(5)
+        ]
+        Booking.objects.bulk_create(
+            Booking(
+                user=user if i % 2 else admin,
+                room=rooms[i % 5],
+                date=datetime.date(2025, 5, 1) + datetime.timedelta(days=i // 50),
+                start_time=datetime.time(8 + (i % 50) // 5),
+                end_time=datetime.time(9 + (i % 50) // 5),
+            )
+            for i in range(2000)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Booking._meta.db_table}")
+
+    def _list_plan(self, client):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(reverse("booking-list"))
+        assert response.status_code == 200
+        assert len(response.data["results"]) == 20
+        sql = next(
+            q["sql"] for q in ctx.captured_queries if "booking_booking" in q["sql"]
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+            raw = cursor.fetchone()[0]
+        plan = raw if isinstance(raw, list) else json.loads(raw)
+        return list(_plan_nodes(plan[0]["Plan"]))
+
+    def _assert_ordered_by_index(self, nodes, index_name):
+        assert not any(n["Node Type"] in ("Sort", "Incremental Sort") for n in nodes)
+        booking_scans = [
+            n for n in nodes if n.get("Relation Name", "").startswith("booking_booking")
+        ]
+        assert booking_scans
+        allowed = _partition_indexes(index_name)
+        for node in booking_scans:
+            assert node["Node Type"] in ("Index Scan", "Index Only Scan")
+            assert node["Index Name"] in allowed
+
+    def test_user_list_uses_cover_index(self, auth_client, bookings):
+        nodes = self._list_plan(auth_client)
+        self._assert_ordered_by_index(nodes, "idx_user_date_start_id_cover")
+
+    def test_staff_list_uses_cover_index(self, admin_client, bookings):
+        nodes = self._list_plan(admin_client)
+        self._assert_ordered_by_index(nodes, "idx_date_start_id_cover")
+
+    def test_cursor_pages_are_disjoint(self, auth_client, bookings):
+        seen = []
+        url = reverse("booking-list")
+        for _ in range(3):
+            response = auth_client.get(url)
+            seen.extend(b["id"] for b in response.data["results"])
+            url = response.data["next"]
+        assert len(seen) == len(set(seen)) == 60
+
+
+@pytest.mark.django_db
+class TestAdmissionControl:
+    @pytest.fixture(autouse=True)
+    def throttling(self):
+        locmem = "django.core.cache.backends.locmem.LocMemCache"
+        rest_framework = {
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": {
+                **settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"],
+                "free_rooms": "2/min",
+            },
+        }
+        with override_settings(
+            CACHES={
+                "default": {"BACKEND": locmem},
+                "throttle": {"BACKEND": locmem, "LOCATION": "test-throttle"},
+            },
+            REST_FRAMEWORK=rest_framework,
+        ):
+            yield
+
+    def test_free_rooms_token_bucket(self, auth_client, room, admin):
+        url = reverse("room-free-rooms")
+        params = {"date": "2030-01-01", "start_time": "09:00", "end_time": "10:00"}
+        assert auth_client.get(url, params).status_code == 200
+        assert auth_client.get(url, params).status_code == 200
+        response = auth_client.get(url, params)
+        assert response.status_code == 429
+        assert int(response["Retry-After"]) > 0
+        # другие действия ведро free_rooms не расходуют
+        assert auth_client.get(reverse("room-list")).status_code == 200
+
+        staff = APIClient()
+        staff.force_authenticate(admin)
+        counts = staff.get(reverse("rejection-stats")).data
+        assert counts["free_rooms"] == 1
+        assert counts["overload"] == 0
+
+    def test_overload_sheds_with_503(self):
+        from booking.middleware import ConcurrencyLimitMiddleware
+
+        responses = []
+
+        def view(request):
+            # второй запрос приходит, пока первый ещё выполняется
+            responses.append(middleware(RequestFactory().get("/api/rooms/")))
+            return HttpResponse("ok")
+
+        with override_settings(BOOKING_MAX_CONCURRENT_REQUESTS=1):
+            middleware = ConcurrencyLimitMiddleware(view)
+            first = middleware(RequestFactory().get("/api/rooms/"))
+            exempt = middleware(RequestFactory().get("/api/bookings/events/"))
+
+        assert first.status_code == 200
+        assert responses[0].status_code == 503
+        assert responses[0]["Retry-After"] == "1"
+        assert exempt.status_code == 200
+
+    def test_overload_limit_is_shared_between_workers(self):
+        from booking.middleware import ConcurrencyLimitMiddleware
+
+        responses = []
+
+        def view(request):
+            # другой воркер с тем же кэшем получает запрос, пока этот выполняется
+            responses.append(other(RequestFactory().get("/api/rooms/")))
+            return HttpResponse("ok")
+
+        with override_settings(BOOKING_MAX_CONCURRENT_REQUESTS=1):
+            worker = ConcurrencyLimitMiddleware(view)
+            other = ConcurrencyLimitMiddleware(lambda request: HttpResponse("ok"))
+            assert worker(RequestFactory().get("/api/rooms/")).status_code == 200
+            # счётчик освобождён: следующий запрос проходит
+            after = other(RequestFactory().get("/api/rooms/"))
+
+        assert responses[0].status_code == 503
+        assert after.status_code == 200
+
+    def test_overload_sheds_async_requests(self):
+        from booking.middleware import ConcurrencyLimitMiddleware
+
+        responses = []
+
+        async def view(request):
+            responses.append(await middleware(RequestFactory().get("/api/rooms/")))
+            return HttpResponse("ok")
+
+        with override_settings(BOOKING_MAX_CONCURRENT_REQUESTS=1):
+            middleware = ConcurrencyLimitMiddleware(view)
+            first = async_to_sync(middleware)(RequestFactory().get("/api/rooms/"))
+
+        assert first.status_code == 200
+        assert responses[0].status_code == 503
+
+
+@pytest.mark.django_db
+class TestPrimaryFailover:
+    @pytest.fixture(autouse=True)
+    def primary_up(self):
+        yield
+        failover.mark_primary_up()
+
+    def test_reads_degrade_and_writes_fail_fast(self, api_client, user, room):
+        failover.mark_primary_down()
+        assert ReadReplicaRouter().db_for_read(Room) == "replica"
+        assert ReadReplicaRouter().db_for_write(Booking) == "default"
+
+        api_client.force_authenticate(user)
+        data = {
+            "room": room.id,
+            "date": "2025-05-05",
+            "start_time": "10:00:00",
+            "end_time": "11:00:00",
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            response = api_client.post(reverse("booking-list"), data, format="json")
+        assert response.status_code == 503
+        assert response["Retry-After"] == str(settings.DB_PRIMARY_RETRY_SECONDS)
+        assert not ctx.captured_queries
+
+    def test_lost_primary_connection_returns_503(self, monkeypatch):
+        monkeypatch.setattr(failover, "_primary_reachable", lambda: False)
+        response = failover.exception_handler(OperationalError("server closed"), {})
+        assert response.status_code == 503
+        assert not failover.primary_available()
+        assert failover.read_db() == "replica"
+
+
+@pytest.mark.django_db
+class TestSlowQueries:
+    def test_fingerprint_ignores_literals_and_list_lengths(self):
+        assert slow_queries.fingerprint(
+            "SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'a'"
+        ) == slow_queries.fingerprint(
+            "SELECT  *  FROM t WHERE id IN (%s) AND name = 'b'"
+        )
+        assert slow_queries.fingerprint("SELECT 1") != slow_queries.fingerprint(
+            "SELECT * FROM t"
+        )
+
+    @override_settings(SLOW_QUERY_MS=0.0001, SLOW_QUERY_EXPLAIN_SAMPLE_RATE=1.0)
+    def test_slow_queries_are_aggregated_with_plan(
+        self, auth_client, room, django_capture_on_commit_callbacks
+    ):
+        params = {"date": "2025-05-01", "start_time": "10:00", "end_time": "11:00"}
+        for _ in range(2):
+            with django_capture_on_commit_callbacks(execute=True):
+                response = auth_client.get(reverse("room-free-rooms"), params)
+            assert response.status_code == 200
+
+        recorded = SlowQuery.objects.filter(
+            view="room-free-rooms", sql__contains="booking_booking"
+        )
+        assert recorded
+        for query in recorded:
+            assert query.alias == "default"
+            assert query.calls == 2
+            assert query.max_ms >= query.last_ms > 0
+            assert "Scan" in query.plan
+            assert "%s" not in query.sql
+
+    @override_settings(SLOW_QUERY_MS=0.0001, SLOW_QUERY_EXPLAIN_SAMPLE_RATE=0)
+    def test_recording_waits_for_caller_commit(
+        self, room, django_capture_on_commit_callbacks
+    ):
+        with django_capture_on_commit_callbacks() as callbacks:
+            with CaptureQueriesContext(connection) as ctx:
+                assert Room.objects.filter(pk=room.pk).exists()
+        # в транзакции вызывающего кода журнал не пишется
+        assert not [q for q in ctx.captured_queries if "booking_slowquery" in q["sql"]]
+        assert not SlowQuery.objects.exists()
+        for callback in callbacks:
+            callback()
+        assert SlowQuery.objects.filter(sql__contains="booking_room").exists()
+
+    @pytest.mark.skipif(not settings.ADMIN_ENABLED, reason="ADMIN_ENABLED=False")
+    @override_settings(
+        STORAGES={
+            "staticfiles": {
+                "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+            }
+        }
+    )
+    def test_admin_lists_slow_queries(self, admin):
+        SlowQuery.objects.create(
+            fingerprint="f" * 40,
+            alias="default",
+            sql="SELECT ?",
+            calls=2,
+            total_ms=500,
+            max_ms=300,
+        )
+        client = Client()
+        client.force_login(admin)
+        response = client.get(reverse("admin:booking_slowquery_changelist"))
+        assert response.status_code == 200
+        assert b"f" * 40 in response.content
+
+
+@pytest.mark.django_db
+class TestSiteSharding:
+    @pytest.fixture(autouse=True)
+    def clear_room_sites(self):
+        sharding._room_sites.clear()
+        yield
+        sharding._room_sites.clear()
+
+    def test_merged_pages_match_single_table_order(self, user):
+        rooms = [
+            Room.objects.create(name=f"Shard {i}", capacity=4, floor=1)
+            for i in range(2)
+        ]
+        for day in (5, 6):
+            for hour in (9, 10, 11):
+                for room in rooms:
+                    Booking.objects.create(
+                        user=user,
+                        room=room,
+                        date=datetime.date(2025, 5, day),
+                        start_time=datetime.time(hour),
+                        end_time=datetime.time(hour + 1),
+                    )
+        bookings = Booking.objects.all()
+        merged = sharding.ShardedQuerySet(bookings.filter(room=room) for room in rooms)
+        expected = list(bookings.order_by("date", "start_time", "id"))
+
+        paginator = CustomCursorPagination()
+        paginator.page_size = 5
+        request = Request(APIRequestFactory().get("/api/bookings/"))
+        seen = []
+        while True:
+            seen += paginator.paginate_queryset(merged, request)
+            next_link = paginator.get_next_link()
+            if next_link is None:
+                break
+            request = Request(APIRequestFactory().get(next_link))
+        assert seen == expected
+
+    def test_bookings_are_routed_by_room_site(self, db):
+        room = Room.objects.create(name="Berlin", capacity=6, floor=2, site="berlin")
+        with override_settings(BOOKING_SITE_DATABASES={"berlin": "site_berlin"}):
+            router = SiteShardRouter()
+            assert router.db_for_write(Booking, room=room.id) == "site_berlin"
+            assert router.db_for_read(Room) != "site_berlin"
+            offset = sharding.site_id_offset("berlin")
+            assert sharding.db_for_booking_id(offset + 5) == "site_berlin"
+            assert sharding.db_for_booking_id(5) == "default"
+
+    def test_site_id_offsets_must_differ(self):
+        # crc32 имён совпадает по модулю 2**20
+        sites = {"site855": "site_site855", "site60200": "site_site60200"}
+        assert sharding.site_id_offset("site855") == sharding.site_id_offset(
+            "site60200"
+        )
+        with override_settings(BOOKING_SITE_DATABASES=sites):
+            errors = sharding.check_site_id_offsets(None)
+        assert [error.id for error in errors] == ["booking.E001"]
+        assert sharding.check_site_id_offsets(None) == []
+
+    def test_room_site_cannot_change(self, admin_client, room):
+        url = reverse("room-detail", args=[room.id])
+        response = admin_client.patch(url, {"site": "berlin"}, format="json")
+        assert response.status_code == 400
+        assert "site" in response.data
+
+
+@pytest.mark.skipif(not settings.API_DOCS_ENABLED, reason="API_DOCS_ENABLED=False")
+@pytest.mark.django_db
+def test_api_schema_is_served(api_client):
+    response = api_client.get(reverse("schema-swagger-ui"), {"format": "openapi"})
+    assert response.status_code == 200
+    assert "/bookings/" in response.json()["paths"]
+
+
+@pytest.mark.skipif(not settings.API_DOCS_ENABLED, reason="API_DOCS_ENABLED=False")
+@pytest.mark.django_db
+def test_exported_schema_is_served_from_static(monkeypatch, api_client, tmp_path):
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    from project.urls import docs_view
+
+    call_command(
+        "export_openapi", output_dir=tmp_path / "openapi", stdout=io.StringIO()
+    )
+    schema = json.loads((tmp_path / "openapi" / "booking-api-v1.json").read_text())
+    assert "/bookings/" in schema["paths"]
+    assert (tmp_path / "openapi" / "booking-api-v1.yaml").exists()
+
+    storages = {
+        **settings.STORAGES,
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+        },
+    }
+
+    def generate(*args, **kwargs):
+        raise AssertionError("schema must not be generated")
+
+    # страница UI не генерирует схему даже при первом обращении
+    monkeypatch.setattr(OpenAPISchemaGenerator, "get_schema", generate)
+    docs_view.cache_clear()
+    try:
+        with override_settings(STATIC_ROOT=tmp_path, STORAGES=storages):
+            swagger = api_client.get(reverse("schema-swagger-ui"))
+            redoc = api_client.get(reverse("schema-redoc"))
+    finally:
+        docs_view.cache_clear()
+    assert (swagger.status_code, redoc.status_code) == (200, 200)
+    # UI ссылается на статический файл, а не на ?format=openapi
+    for response in (swagger, redoc):
+        content = response.content.decode()
+        assert '"url": "/static/openapi/booking-api-v1.json"' in content
+    assert "<title>Booking API</title>" in swagger.content.decode()
+
 
 @pytest.mark.django_db
 def test_unauthenticated_access(api_client):
@@ -0,0 +1,347 @@
+"""
+Регрессии планов горячих запросов: свободные комнаты, проверки пересечений
+(Booking.clean и запись через booking.services) и списки броней.
+
+Данные — несколько месячных партиций с профилями индексов на фиксированную
+дату (PLAN_TODAY), после ANALYZE. Для каждого запроса проверяются свойства
+плана (какой индекс, сколько партиций, нет ли сортировки) и сравнение с
+эталоном из tests/plans/<имя>.json. Эталоны хранятся по мажорным версиям
+PostgreSQL; копии индексов на партициях записываются именем индекса
+родительской таблицы, а не сгенерированным PostgreSQL. Снять эталон своей
+версии или обновить его после осознанного изменения плана:
+
+    UPDATE_PLAN_BASELINES=1 pytest tests/test_query_plans.py
+"""
+
+import datetime
+import json
+import os
+from pathlib import Path
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from booking.models import Booking, Room
+from booking.partitioning import indexes
+from booking.services import create_booking
+
+BASELINE_DIR = Path(__file__).parent / "plans"
+UPDATE_BASELINES = os.getenv("UPDATE_PLAN_BASELINES") == "1"
+
+# апрель и май закрыты (BRIN), июнь–август — горячие
+PLAN_TODAY = datetime.date(2025, 7, 15)
+MONTHS = [
+    datetime.date(2025, 4, 1),
+    datetime.date(2025, 6, 1),
+    datetime.date(2025, 7, 1),
+    datetime.date(2025, 8, 1),
+]
+DAY = datetime.date(2025, 7, 14)
+ROOMS = 40
+USERS = 20
+DAYS_PER_MONTH = 10
+SLOTS = [(8, 9), (9, 10), (11, 12), (13, 15), (16, 17)]
+
+
+def _partition_name(month):
+    return f"{Booking._meta.db_table}_{month.year}_{month.strftime('%b').lower()}"
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def _parent_index(index_name):
+    """
+    Индекс родительской таблицы для копии на партиции: имя копии PostgreSQL
+    генерирует сам (усечение, суффиксы при совпадении), имя родителя задано
+    в моделях. Индексы профилей (booking.partitioning.indexes) родителя не
+    имеют, их имена задаёт index_name.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT p.relname FROM pg_inherits i "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE i.inhrelid = %s::regclass",
+            [index_name],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else index_name
+
+
+def _normalize(plan):
+    """Форма плана без оценок стоимости: узлы, таблицы, индексы."""
+    node = {"node": plan["Node Type"]}
+    for key, name in (
+        ("Relation Name", "relation"),
+        ("Index Name", "index"),
+        ("Join Type", "join"),
+    ):
+        if key in plan:
+            node[name] = plan[key]
+    if "index" in node:
+        node["index"] = _parent_index(node["index"])
+    if plan.get("Plans"):
+        node["plans"] = [_normalize(child) for child in plan["Plans"]]
+    return node
+
+
+def _explain(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+        raw = cursor.fetchone()[0]
+    plan = raw if isinstance(raw, list) else json.loads(raw)
+    return plan[0]["Plan"]
+
+
+def _booking_query(ctx, marker="booking_booking"):
+    return [q["sql"] for q in ctx.captured_queries if marker in q["sql"]]
+
+
+def _booking_scans(plan):
+    return [
+        node
+        for node in _plan_nodes(plan)
+        if node.get("Relation Name") in _booking_tables()
+    ]
+
+
+def _booking_tables():
+    table = Booking._meta.db_table
+    return {table} | {name for name, _, _ in indexes.booking_partitions()}
+
+
+def _index_names(partition, *suffixes):
+    return {indexes.index_name(partition, suffix) for suffix in suffixes}
+
+
+def _partition_indexes(index_name):
+    """Индекс родительской таблицы и его копии на партициях."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [index_name],
+        )
+        return {row[0] for row in cursor.fetchall()} | {index_name}
+
+
+def _unique_index(partition):
+    # unique_together (room, date, start_time, end_time) — те же колонки,
+    # что room_date_time, планировщик вправе выбрать любой из них
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT i.relname FROM pg_index x "
+            "JOIN pg_class i ON i.oid = x.indexrelid "
+            "WHERE x.indrelid = %s::regclass AND x.indisunique "
+            "AND NOT x.indisprimary",
+            [partition],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _date_indexes(partition):
+    # поиск по дате и времени: горячий B-tree партиции или покрывающий
+    # индекс списка (date, start_time, id) INCLUDE (end_time, room, user)
+    return _index_names(partition, "date_start_end_room") | _partition_indexes(
+        "idx_date_start_id_cover"
+    )
+
+
+def _room_indexes(partition):
+    return (
+        _index_names(partition, "room_date_time")
+        | _unique_index(partition)
+        | _date_indexes(partition)
+    )
+
+
+def _user_indexes(partition):
+    return (
+        _index_names(partition, "user_date_time")
+        | _partition_indexes("idx_user_date_start_id_cover")
+        | _date_indexes(partition)
+    )
+
+
+def assert_index_scans(plan, partition, allowed):
+    """Брони читаются только из partition и только индексами из allowed."""
+    scans = [n for n in _booking_scans(plan) if n["Node Type"] != "ModifyTable"]
+    assert scans
+    assert {node["Relation Name"] for node in scans} == {partition}
+    for node in scans:
+        if node["Node Type"] == "Bitmap Heap Scan":
+            used = {
+                child["Index Name"]
+                for child in _plan_nodes(node)
+                if child["Node Type"] == "Bitmap Index Scan"
+            }
+        else:
+            assert node["Node Type"] in ("Index Scan", "Index Only Scan"), node
+            used = {node["Index Name"]}
+        assert used <= allowed, used
+
+
+def assert_matches_baseline(name, plan):
+    """
+    Сравнивает форму плана с эталоном своей мажорной версии PostgreSQL, а
+    если его нет — ближайшей снятой версии (планировщик меняется между
+    версиями, но соседние обычно выбирают одинаково).
+    """
+    path = BASELINE_DIR / f"{name}.json"
+    version = connection.pg_version // 10000
+    shape = _normalize(plan)
+    baselines = json.loads(path.read_text())["postgres"] if path.exists() else {}
+    if UPDATE_BASELINES:
+        baselines[str(version)] = shape
+        path.parent.mkdir(exist_ok=True)
+        current = {"postgres": dict(sorted(baselines.items(), key=lambda i: int(i[0])))}
+        path.write_text(json.dumps(current, indent=2, ensure_ascii=False) + "\n")
+        return
+    if not baselines:
+        # пропавший или переименованный эталон не должен молча проходить
+        pytest.fail(
+            f"Нет эталона плана {path.name}: снимите эталоны "
+            "UPDATE_PLAN_BASELINES=1 и добавьте tests/plans/ в коммит"
+        )
+    nearest = min(baselines, key=lambda captured: abs(int(captured) - version))
+    assert shape == baselines[nearest], (
+        f"План {name} на PostgreSQL {version} отличается от эталона "
+        f"PostgreSQL {nearest}; если это ожидаемо — UPDATE_PLAN_BASELINES=1 "
+        "и проверьте diff tests/plans/"
+    )
+
+
+@pytest.fixture
+def dataset(db):
+    with connection.cursor() as cursor:
+        for month in MONTHS:
+            upper = (month + datetime.timedelta(days=32)).replace(day=1)
+            cursor.execute(
+                f"CREATE TABLE {_partition_name(month)} "
+                f"PARTITION OF {Booking._meta.db_table} "
+                f"FOR VALUES FROM ('{month}') TO ('{upper}')"
+            )
+    indexes.apply_index_profiles(today=PLAN_TODAY)
+
+    rooms = Room.objects.bulk_create(
+        Room(name=f"Plan {i}", capacity=2 + i % 10, floor=i % 4) for i in range(ROOMS)
+    )
+    users = User.objects.bulk_create(
+        User(username=f"planner{i}", password="!") for i in range(USERS)
+    )
+    bookings = []
+    for month in MONTHS:
+        for day in range(DAYS_PER_MONTH):
+            date = month + datetime.timedelta(days=day * 3)
+            for r, room in enumerate(rooms):
+                for s, (start, end) in enumerate(SLOTS):
+                    bookings.append(
+                        Booking(
+                            user=users[(r * len(SLOTS) + s) % USERS],
+                            room=room,
+                            date=date,
+                            start_time=datetime.time(start),
+                            end_time=datetime.time(end),
+                        )
+                    )
+    Booking.objects.bulk_create(bookings, batch_size=2000)
+    with connection.cursor() as cursor:
+        # статистика комнат тоже своя: иначе план зависит от того, что
+        # оставили в booking_room предыдущие тесты
+        cursor.execute(f"ANALYZE {Booking._meta.db_table}, {Room._meta.db_table}")
+    return {"rooms": rooms, "users": users}
+
+
+def _client(user):
+    client = APIClient()
+    client.defaults["HTTP_HOST"] = "testserver"
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.mark.django_db
+class TestHotQueryPlans:
+    def test_free_rooms(self, dataset):
+        client = _client(dataset["users"][0])
+        params = {"date": DAY, "start_time": "10:00:00", "end_time": "11:00:00"}
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(reverse("room-free-rooms"), params)
+        assert response.status_code == 200
+        plan = _explain(_booking_query(ctx)[-1])
+
+        # равенство по date отсекает все партиции, кроме нужного месяца
+        partition = _partition_name(DAY.replace(day=1))
+        assert_index_scans(plan, partition, _date_indexes(partition))
+        assert_matches_baseline("free_rooms", plan)
+
+    def test_clean_conflict_checks(self, dataset):
+        room, user = dataset["rooms"][3], dataset["users"][5]
+        booking = Booking(
+            user=user,
+            room=room,
+            date=DAY,
+            start_time=datetime.time(10),
+            end_time=datetime.time(11),
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            booking.clean()
+        room_sql, user_sql = _booking_query(ctx)
+        partition = _partition_name(DAY.replace(day=1))
+
+        room_plan = _explain(room_sql)
+        assert_index_scans(room_plan, partition, _room_indexes(partition))
+        assert_matches_baseline("clean_room_conflict", room_plan)
+
+        user_plan = _explain(user_sql)
+        assert_index_scans(user_plan, partition, _user_indexes(partition))
+        assert_matches_baseline("clean_user_conflict", user_plan)
+
+    def test_create_booking_checks(self, dataset):
+        room, user = dataset["rooms"][7], dataset["users"][2]
+        with CaptureQueriesContext(connection) as ctx:
+            create_booking(
+                user=user,
+                room=room.id,
+                date=DAY + datetime.timedelta(days=1),
+                start_time=datetime.time(10),
+                end_time=datetime.time(11),
+            )
+        plan = _explain(_booking_query(ctx, "INSERT INTO")[0])
+        # обе проверки пересечений — индексами одной партиции
+        partition = _partition_name(DAY.replace(day=1))
+        assert_index_scans(
+            plan, partition, _room_indexes(partition) | _user_indexes(partition)
+        )
+        assert_matches_baseline("create_booking", plan)
+
+    @pytest.mark.parametrize(
+        "staff, index",
+        [
+            (False, "idx_user_date_start_id_cover"),
+            (True, "idx_date_start_id_cover"),
+        ],
+    )
+    def test_booking_list(self, dataset, staff, index):
+        user = dataset["users"][1]
+        user.is_staff = staff
+        user.save(update_fields=["is_staff"])
+        with CaptureQueriesContext(connection) as ctx:
+            response = _client(user).get(reverse("booking-list"))
+        assert response.status_code == 200
+        plan = _explain(_booking_query(ctx)[0])
+
+        nodes = list(_plan_nodes(plan))
+        # порядок курсорной пагинации дают индексы (Merge Append), не сортировка
+        assert not [n for n in nodes if n["Node Type"] in ("Sort", "Incremental Sort")]
+        for node in _booking_scans(plan):
+            assert node["Node Type"] in ("Index Scan", "Index Only Scan")
+            assert node["Index Name"] in _partition_indexes(index)
+        assert_matches_baseline(f"booking_list_{'staff' if staff else 'user'}", plan)